@@ -1,6 +1,12 @@
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from sonisense.filter_design import design_filter
+
 # Generate a random array of amplitude values (input signal)
 input_signal = np.random.randn(1000)
 
@@ -8,10 +14,9 @@ input_signal = np.random.randn(1000)
 N = 21  # Number of taps (filter order + 1)
 f_c = 0.1  # Normalized cutoff frequency (e.g., 0.1 for low-pass)
 
-# Generate the filter coefficients using the window method (e.g., Hamming window)
-n = np.arange(N)
-h = np.sinc(2 * f_c * (n - (N - 1) / 2)) * np.hamming(N)
-h = h / np.sum(h)  # Normalize to ensure unity gain at DC
+# Windowed-sinc (Hamming) coefficients, normalized to unity gain at DC.
+# design_filter takes the cutoff relative to Nyquist, hence 2 * f_c.
+h = design_filter('sinc_hamming', num_taps=N, cutoff=2 * f_c)
 
 # Apply the FIR filter to the input signal using convolution
 filtered_signal = np.convolve(input_signal, h, mode='same')
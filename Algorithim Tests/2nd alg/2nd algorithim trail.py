@@ -1,6 +1,12 @@
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.signal import firwin, lfilter
+from scipy.signal import lfilter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from sonisense.filter_design import design_filter
 
 # Generate a random array of amplitude values (input signal)
 input_signal = np.random.randn(1000)
@@ -11,7 +17,7 @@ f_c = 0.1  # Normalized cutoff frequency (e.g., 0.1 for low-pass)
 beta = 8.6  # Beta parameter for the Kaiser window (controls shape)
 
 # Design the FIR filter using the Kaiser window and desired cutoff frequency
-h = firwin(N, cutoff=f_c, window=('kaiser', beta), pass_zero=True)
+h = design_filter('kaiser', num_taps=N, cutoff=f_c, beta=beta)
 
 # Apply the FIR filter to the input signal using convolution
 filtered_signal = lfilter(h, 1.0, input_signal)
@@ -1,23 +1,22 @@
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.fft import ifft
 from scipy.signal import lfilter
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from sonisense.filter_design import design_filter
+
 # Generate a random array of amplitude values (input signal)
 input_signal = np.random.randn(1000)
 
 # Define the number of filter taps
 N = 51  # Number of taps (filter length)
 
-# Define the desired frequency response
-# For a simple low-pass filter, define the frequency response as 1 in the passband and 0 in the stopband
-freq_response = np.zeros(N, dtype=complex)
-passband_end = int(0.2 * (N // 2))  # 0.2 * Nyquist frequency
-freq_response[:passband_end] = 1
-freq_response[-passband_end:] = 1  # Symmetric for real coefficients
-
-# Compute the FIR filter coefficients using inverse DFT
-h = np.real(ifft(freq_response))
+# Desired low-pass response: 1 up to 0.2 * Nyquist and 0 in the stopband,
+# turned into FIR coefficients with an inverse DFT
+h = design_filter('frequency_sampling', num_taps=N, cutoff=0.2)
 
 # Apply the FIR filter to the input signal using convolution
 filtered_signal = lfilter(h, 1.0, input_signal)
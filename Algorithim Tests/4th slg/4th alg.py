@@ -1,15 +1,18 @@
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.signal import lfilter
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from sonisense.filter_design import design_filter
+
 input_signal = np.random.randn(1000)
 N = 21 
 std_dev = 3 
 
-n = np.arange(0, N) - (N - 1) / 2
-gaussian_window = np.exp(-0.5 * (n / std_dev) ** 2)
-
-gaussian_window /= np.sum(gaussian_window)
+gaussian_window = design_filter('gaussian', num_taps=N, std_dev=std_dev)
 filtered_signal = lfilter(gaussian_window, 1.0, input_signal)
 plt.figure(figsize=(15, 10))
 plt.subplot(3, 1, 1)
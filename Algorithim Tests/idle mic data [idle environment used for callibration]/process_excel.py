@@ -1,31 +1,43 @@
-import pandas as pd
+import os
+import sys
 
-def process_excel(file_path, output_file_path):
-    # Load the Excel file
-    df = pd.read_excel(file_path, usecols=[0], header=None, names=['Data'])
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from sonisense.calibration import CalibrationProfile
+from sonisense.ingest import export_excel, ingest, load_column
 
-    # Drop empty cells
-    df = df.dropna()
+# Fallback band used before a calibration profile exists
+DEFAULT_LOWER = 1100
+DEFAULT_UPPER = 1500
 
-    # Convert the 'Data' column to numeric, coercing errors into NaN
-    df['Data'] = pd.to_numeric(df['Data'], errors='coerce')
+def process_excel(file_path, output_file_path, lower=DEFAULT_LOWER, upper=DEFAULT_UPPER):
+    """
+    Extracts the in-band mic values from column A of a capture sheet.
 
-    # Drop rows with non-numeric data (NaN values after conversion)
-    df = df.dropna()
+    The column is streamed in chunks into a binary .npy file next to
+    output_file_path (empty, non-numeric and out-of-band cells are dropped on
+    the way, chronology is kept). An Excel copy is only written when
+    output_file_path ends in .xlsx, for humans to look at.
 
-    # Filter out numbers under 10 or over 5000
-    df = df[(df['Data'] >= 1100) & (df['Data'] <= 1500)]
+    Returns the path of the .npy file.
+    """
+    binary_path = os.path.splitext(output_file_path)[0] + '.npy'
+    ingest(file_path, binary_path, column=0, lower=lower, upper=upper)
 
-    # Reset index to maintain chronology in the new file
-    df = df.reset_index(drop=True)
-
-    # Save the processed data to a new Excel file
-    df.to_excel(output_file_path, index=False, header=False)
+    # Optional human-readable export; long captures stay binary only
+    if output_file_path.lower().endswith('.xlsx'):
+        export_excel(load_column(binary_path), output_file_path)
+    return binary_path
 
 if __name__ == "__main__":
     # Define the input file path and output file path
     file_path = r"C:\Users\anees\Desktop\idle mic data\data.xlsx"
     output_file_path = r"C:\Users\anees\Desktop\idle mic data\filtered data.xlsx"
 
+    # Take the band from the idle calibration profile when one is given
+    # (python -m sonisense.calibration profile.json <idle captures>)
+    lower, upper = DEFAULT_LOWER, DEFAULT_UPPER
+    if len(sys.argv) > 1:
+        lower, upper = CalibrationProfile.load(sys.argv[1]).clip_range(0)
+
     # Process the Excel file
-    process_excel(file_path, output_file_path)
+    process_excel(file_path, output_file_path, lower, upper)
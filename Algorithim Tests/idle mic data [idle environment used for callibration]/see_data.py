@@ -1,12 +1,21 @@
+import os
+import sys
+
 import pandas as pd
 import matplotlib.pyplot as plt
 
-# Step 1: Load the Excel file
-file_path = r'C:\Users\anees\Desktop\idle mic data\filtered_data.xlsx'
-data = pd.read_excel(file_path)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from sonisense.ingest import load_column
+
+# Step 1: Load the processed data, preferring the binary file written by process_excel.py
+file_path = r'C:\Users\anees\Desktop\idle mic data\filtered_data.npy'
+excel_path = r'C:\Users\anees\Desktop\idle mic data\filtered_data.xlsx'
 
 # Step 2: Extract data from Column A
-column_a = data.iloc[:, 0]  # Assuming column A is the first column
+if os.path.exists(file_path):
+    column_a = load_column(file_path)
+else:
+    column_a = pd.read_excel(excel_path, header=None).iloc[:, 0]  # Column A is the first column
 
 # Step 3: Plot the data
 plt.figure(figsize=(10, 6))
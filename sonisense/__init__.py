@@ -0,0 +1,53 @@
+"""
+Signal processing and localisation tools for the SoniSense microphone array.
+
+Submodules are imported on first use of one of their names, so
+`python -m sonisense.<module>` runs the only copy of that module and
+`import sonisense` stays cheap.
+"""
+
+import importlib
+
+_EXPORTS = {
+    'acquisition': ('Acquisition', 'FrameDecoder', 'ReplaySource', 'RingBuffer', 'SerialSource'),
+    'adaptive': ('ADAPTIVE_FILTERS', 'BlockNLMS', 'FrequencyDomainLMS', 'adaptive_canceller', 'seed_weights'),
+    'alignment': ('ChannelAlignment', 'align_channels', 'align_directory', 'estimate_lag'),
+    'batch': ('frame_view', 'localise_archive', 'localise_array', 'write_table'),
+    'calibration': ('CalibrationProfile', 'calibrate_captures'),
+    'decimation': ('MultistageDecimator', 'PolyphaseDecimator'),
+    'detection': ('EventDetector', 'StaLta', 'detect_events'),
+    'filter_design': ('FILTER_DESIGNS', 'clear_filter_cache', 'design_filter'),
+    'fixed_point': ('QuantizedFIR', 'quantize_taps', 'reference_check'),
+    'geometry': ('SPEED_OF_SOUND', 'triangle_positions'),
+    'ingest': ('export_excel', 'ingest', 'load_column'),
+    'instrumentation': ('REGISTRY', 'instrument', 'measure'),
+    'localisation': ('AzimuthLeastSquares', 'AzimuthLookup', 'Localiser', 'LocalisationResult', 'gcc_phat'),
+    'pipeline': ('AdaptiveStage', 'EventStage', 'Pipeline', 'RingSource', 'Stage', 'TrackerStage', 'default_stages'),
+    'recording': ('Recording', 'convert_csv_captures', 'write_recording'),
+    'report': ('FigureJob', 'default_jobs', 'plot_stability_heatmap', 'plot_stability_surface', 'render_report'),
+    'simulator': ('generate_corpus', 'load_corpus', 'simulate_frames', 'simulate_recording'),
+    'spectral': ('analyze_sweep', 'response_surface', 'stft_batch', 'welch_batch'),
+    'srp': ('SrpSearch', 'delay_table'),
+    'streaming': ('StreamingFIR',),
+    'sweep': ('SweepDataset', 'default_dataset'),
+    'sweep_loader': ('SweepCache', 'load_sweep'),
+    'sweep_stats': ('compute_sweep_metrics', 'sweep_tensor'),
+    'timebase': ('ClockModel', 'fit_clock', 'repair_timestamps', 'resample_uniform'),
+    'tones': ('alias_frequency', 'periodogram', 'spectral_features'),
+    'tracking': ('BearingTracker', 'Track'),
+}
+_ORIGINS = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_ORIGINS)
+
+
+def __getattr__(name):
+    if name not in _ORIGINS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{_ORIGINS[name]}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
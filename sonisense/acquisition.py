@@ -0,0 +1,417 @@
+"""
+Live sample acquisition for the SoniSense boards.
+
+The ESP32-S3 streams the mic channels as fixed-layout binary frames:
+
+    offset  size  field
+    0       2     sync word 0xA5 0x5A
+    2       2     sequence number (uint16, wraps)
+    4       2     samples per channel L (uint16)
+    6       1     channel count C (uint8)
+    7       1     reserved (0)
+    8       4     device time of the first sample in us (uint32, wraps)
+    12      2*C*L samples, uint16 little-endian, interleaved by channel
+    12+2CL  2     CRC-16/CCITT of bytes 2..12+2CL
+
+`FrameDecoder` turns a byte stream into (C, L) arrays with `np.frombuffer`,
+and `RingBuffer` holds the most recent samples in one preallocated array.
+There is a single writer (the acquisition thread) and any number of
+readers. The writer claims the slots it is about to overwrite before
+touching them and publishes its position only after the data is in place.
+Readers check the claim again after copying and drop anything that was,
+or may have been, overwritten meanwhile, so they never need a lock.
+
+`ReplaySource` streams the idle calibration CSVs at real-time speed, either
+directly or through a pseudo-terminal that `SerialSource` can open like a
+board. This lets the whole pipeline be load-tested without hardware.
+
+Usage:
+    python -m sonisense.acquisition replay --seconds 10
+    python -m sonisense.acquisition serial /dev/ttyACM0 --sample-rate 1000
+"""
+
+import argparse
+import binascii
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+SYNC = b'\xa5\x5a'
+HEADER = struct.Struct('<2sHHBBI')
+CRC = struct.Struct('<H')
+MAX_FRAME_SAMPLES = 4096
+DEFAULT_BLOCK_SIZE = 32
+DEFAULT_BAUDRATE = 921600
+DEFAULT_RING_SECONDS = 30.0
+
+IDLE_CAPTURES = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'idle callibration', 'readings', name)
+    for name in ('mic#1_raw_dile_data.csv', 'mic#2_raw_idle_data.csv', 'mic#3_raw_idle_data.csv')
+]
+
+
+def encode_frame(samples, sequence, device_time_us):
+    """
+    Packs a (channels, samples) uint16 block into one wire frame.
+    """
+    samples = np.asarray(samples)
+    channels, length = samples.shape
+    header = HEADER.pack(SYNC, sequence & 0xFFFF, length, channels, 0, int(device_time_us) & 0xFFFFFFFF)
+    payload = header[2:] + np.ascontiguousarray(samples.T, dtype='<u2').tobytes()
+    return SYNC + payload + CRC.pack(binascii.crc_hqx(payload, 0xFFFF))
+
+
+class FrameDecoder:
+    """
+    Incremental decoder for the frame format above.
+
+    Bytes are fed in whatever pieces the port returns. Corrupt frames are
+    counted and skipped by searching for the next sync word.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.frames = 0
+        self.crc_errors = 0
+        self.dropped_frames = 0
+        self._last_sequence = None
+
+    def feed(self, data):
+        """
+        Adds received bytes and returns a list of complete frames as
+        (sequence, device_time_us, samples) with samples of shape (C, L).
+        """
+        self._buffer += data
+        frames = []
+        buffer = self._buffer
+        start = 0
+        while True:
+            start = buffer.find(SYNC, start)
+            if start < 0:
+                # Keep a possible partial sync word at the end
+                start = max(len(buffer) - 1, 0)
+                break
+            if len(buffer) - start < HEADER.size:
+                break
+            _, sequence, length, channels, _, device_time = HEADER.unpack_from(buffer, start)
+            if length == 0 or channels == 0 or length > MAX_FRAME_SAMPLES:
+                start += 1
+                continue
+            end = start + HEADER.size + 2 * channels * length + CRC.size
+            if len(buffer) < end:
+                break
+            payload = bytes(buffer[start + 2:end - CRC.size])
+            if binascii.crc_hqx(payload, 0xFFFF) != CRC.unpack_from(buffer, end - CRC.size)[0]:
+                self.crc_errors += 1
+                start += 1
+                continue
+
+            samples = np.frombuffer(payload, dtype='<u2', offset=HEADER.size - 2).reshape(length, channels).T
+            if self._last_sequence is not None:
+                self.dropped_frames += (sequence - self._last_sequence - 1) & 0xFFFF
+            self._last_sequence = sequence
+            self.frames += 1
+            frames.append((sequence, device_time, samples))
+            start = end
+        del buffer[:start]
+        return frames
+
+
+class RingBuffer:
+    """
+    Fixed-size multi-channel sample ring with one writer and lock-free readers.
+
+    Parameters:
+    - channels: Number of channels.
+    - capacity: Samples kept per channel.
+    - dtype: Sample dtype, uint16 for raw ADC codes.
+
+    Positions are absolute sample counts since the start of acquisition, so
+    a reader keeps its own position and can tell when it has been overrun.
+    """
+
+    def __init__(self, channels, capacity, dtype=np.uint16):
+        self.channels = channels
+        self.capacity = int(capacity)
+        self._samples = np.zeros((channels, self.capacity), dtype=dtype)
+        self._timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self.position = 0
+        self._claimed = 0  # Position the write in progress will publish; equals position between writes
+
+    def write(self, samples, timestamps):
+        """
+        Appends a (channels, L) block and its L timestamps in ms.
+        """
+        end = self.position + samples.shape[1]
+        if samples.shape[1] > self.capacity:
+            samples, timestamps = samples[:, -self.capacity:], timestamps[-self.capacity:]
+        length = samples.shape[1]
+        # Claim before overwriting, so a reader copying the oldest slots can tell they were torn
+        self._claimed = end
+        start = (end - length) % self.capacity
+        first = min(length, self.capacity - start)
+        self._samples[:, start:start + first] = samples[:, :first]
+        self._timestamps[start:start + first] = timestamps[:first]
+        if first < length:
+            self._samples[:, :length - first] = samples[:, first:]
+            self._timestamps[:length - first] = timestamps[first:]
+        # Publish only after the data is in place
+        self.position = end
+
+    @property
+    def oldest(self):
+        """
+        Absolute position of the oldest sample still held, excluding the
+        slots a write in progress is overwriting.
+        """
+        return max(0, self._claimed - self.capacity)
+
+    def read(self, start, stop=None):
+        """
+        Copies the samples in absolute range [start, stop).
+
+        Returns (samples, timestamps, start); start is moved forward when the
+        requested range has already been overwritten.
+        """
+        stop = self.position if stop is None else min(stop, self.position)
+        start = max(start, self.oldest)
+        if stop <= start:
+            return np.empty((self.channels, 0), self._samples.dtype), np.empty(0), start
+        i, j = start % self.capacity, stop % self.capacity
+        if i < j or j == 0:
+            end = j or self.capacity
+            samples, timestamps = self._samples[:, i:end].copy(), self._timestamps[i:end].copy()
+        else:
+            samples = np.concatenate([self._samples[:, i:], self._samples[:, :j]], axis=1)
+            timestamps = np.concatenate([self._timestamps[i:], self._timestamps[:j]])
+        # The writer may have lapped us while copying; drop everything its claim covers
+        overrun = min(self.oldest - start, samples.shape[1])
+        if overrun > 0:
+            samples, timestamps, start = samples[:, overrun:], timestamps[overrun:], start + overrun
+        return samples, timestamps, start
+
+    def latest(self, count):
+        """
+        Copies the most recent `count` samples, returning (samples, timestamps).
+        """
+        samples, timestamps, _ = self.read(self.position - count)
+        return samples, timestamps
+
+
+class SerialSource:
+    """
+    Reads frames from a serial port (needs pyserial).
+
+    Parameters:
+    - port: Device path such as /dev/ttyACM0, COM3 or a replay pty.
+    - sample_rate: Per-channel sample rate in Hz, used to stamp each sample.
+    - baudrate: Port speed; ignored by USB CDC and ptys.
+    """
+
+    def __init__(self, port, sample_rate, baudrate=DEFAULT_BAUDRATE, timeout=0.1):
+        try:
+            import serial
+        except ImportError:
+            raise ImportError("Serial acquisition needs pyserial (pip install pyserial)")
+        self.sample_rate = float(sample_rate)
+        self.decoder = FrameDecoder()
+        self._port = serial.Serial(port, baudrate=baudrate, timeout=timeout)
+        self._wrap_us = 0
+        self._last_time = None
+
+    def blocks(self, stop_event=None):
+        """
+        Yields (samples, timestamps_ms) blocks until `stop_event` is set.
+        """
+        step = 1000.0 / self.sample_rate
+        while stop_event is None or not stop_event.is_set():
+            data = self._port.read(max(self._port.in_waiting, 1))
+            for _, device_time, samples in self.decoder.feed(data):
+                # Unwrap the 32-bit microsecond counter (~71 minutes)
+                if self._last_time is not None and device_time < self._last_time:
+                    self._wrap_us += 1 << 32
+                self._last_time = device_time
+                start = (device_time + self._wrap_us) / 1000.0
+                yield samples, start + np.arange(samples.shape[1]) * step
+
+    def close(self):
+        self._port.close()
+
+
+class ReplaySource:
+    """
+    Replays per-mic capture CSVs as a live multi-channel stream.
+
+    Parameters:
+    - paths: One CSV per mic, defaulting to the idle calibration captures.
+    - sample_rate: Replay rate in Hz; estimated from the timestamps by default.
+    - block_size: Samples per channel in each block (one wire frame).
+    - speed: 1.0 for real time, 2.0 for double speed, 0 for as fast as possible.
+    - loop: Restart from the beginning at the end of the captures.
+    """
+
+    def __init__(self, paths=None, sample_rate=None, block_size=DEFAULT_BLOCK_SIZE, speed=1.0, loop=False):
+        from .calibration import iter_csv_chunks
+        from .timebase import fit_clock
+
+        paths = IDLE_CAPTURES if paths is None else paths
+        columns = [[np.concatenate(parts) for parts in zip(*iter_csv_chunks(path))] for path in paths]
+        length = min(len(values) for _, values in columns)
+        self.samples = np.stack([values[:length] for _, values in columns]).astype(np.uint16)
+        self.sample_rate = sample_rate or fit_clock(columns[0][0]).sample_rate
+        self.block_size = block_size
+        self.speed = speed
+        self.loop = loop
+
+    @property
+    def channels(self):
+        return self.samples.shape[0]
+
+    def blocks(self, stop_event=None):
+        """
+        Yields (samples, timestamps_ms) blocks paced to the replay speed.
+        """
+        step = 1000.0 / self.sample_rate
+        length = self.samples.shape[1]
+        sent = 0
+        started = time.perf_counter()
+        while stop_event is None or not stop_event.is_set():
+            offset = sent % length
+            if offset + self.block_size > length:
+                if not self.loop:
+                    return
+                sent += length - offset
+                continue
+            if self.speed:
+                delay = started + (sent + self.block_size) / (self.sample_rate * self.speed) - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            yield self.samples[:, offset:offset + self.block_size], (sent + np.arange(self.block_size)) * step
+            sent += self.block_size
+
+    def serve_pty(self, stop_event=None):
+        """
+        Writes the replay as wire frames to a new pseudo-terminal from a
+        background thread and returns (device_path, thread). Open the path
+        with `SerialSource` to exercise the real serial code path.
+        """
+        import tty
+
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        device = os.ttyname(slave)
+
+        def run():
+            try:
+                for sequence, (samples, timestamps) in enumerate(self.blocks(stop_event)):
+                    os.write(master, encode_frame(samples, sequence, timestamps[0] * 1000.0))
+            finally:
+                os.close(master)
+
+        thread = threading.Thread(target=run, name='sonisense-replay', daemon=True)
+        thread.start()
+        return device, thread
+
+    def close(self):
+        pass
+
+
+class Acquisition:
+    """
+    Background thread that copies blocks from a source into a `RingBuffer`.
+
+    Parameters:
+    - source: `SerialSource`, `ReplaySource` or any object with a
+      `blocks(stop_event)` generator of (samples, timestamps_ms).
+    - channels: Channel count of the source.
+    - capacity: Ring size in samples per channel.
+    """
+
+    def __init__(self, source, channels, capacity):
+        self.source = source
+        self.ring = RingBuffer(channels, capacity)
+        self.blocks = 0
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        try:
+            for samples, timestamps in self.source.blocks(self._stop):
+                self.ring.write(samples, timestamps)
+                self.blocks += 1
+        except Exception as e:
+            self.error = e
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sonisense-acquisition', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.source.close()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Acquire SoniSense samples from a board or a replay.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    replay = subparsers.add_parser('replay', help="Replay capture CSVs (the idle captures by default)")
+    replay.add_argument('paths', nargs='*')
+    replay.add_argument('--speed', type=float, default=1.0, help="1 for real time, 0 for as fast as possible")
+    replay.add_argument('--pty', action='store_true', help="Route the replay through a pty and the serial decoder")
+
+    serial_port = subparsers.add_parser('serial', help="Read frames from a serial port")
+    serial_port.add_argument('port')
+    serial_port.add_argument('--sample-rate', type=float, required=True)
+    serial_port.add_argument('--channels', type=int, default=3)
+    serial_port.add_argument('--baudrate', type=int, default=DEFAULT_BAUDRATE)
+
+    for sub in (replay, serial_port):
+        sub.add_argument('--seconds', type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    stop_replay = threading.Event()
+    if args.command == 'replay':
+        source = ReplaySource(args.paths or None, speed=args.speed, loop=True)
+        channels, sample_rate = source.channels, source.sample_rate
+        if args.pty:
+            device, _ = source.serve_pty(stop_replay)
+            source = SerialSource(device, sample_rate)
+    else:
+        source = SerialSource(args.port, args.sample_rate, args.baudrate)
+        channels, sample_rate = args.channels, args.sample_rate
+
+    acquisition = Acquisition(source, channels, int(sample_rate * DEFAULT_RING_SECONDS))
+    started = time.perf_counter()
+    with acquisition:
+        while time.perf_counter() - started < args.seconds and acquisition.running:
+            time.sleep(1.0)
+            ring = acquisition.ring
+            elapsed = time.perf_counter() - started
+            print(f"{elapsed:5.1f} s: {ring.position} samples/channel ({ring.position / elapsed:.1f} Hz), "
+                  f"{acquisition.blocks} blocks")
+    stop_replay.set()
+    if acquisition.error is not None:
+        raise acquisition.error
+
+
+if __name__ == "__main__":
+    main()
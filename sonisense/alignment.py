@@ -0,0 +1,254 @@
+"""
+Cross-mic alignment for multi-channel recordings.
+
+Every channel is aligned to a reference mic in two steps: an FFT
+cross-correlation of decimated copies finds the coarse lag cheaply, then a
+few direct dot products at full rate around it, plus a parabolic fit, give
+the sub-sample lag. Comparing the lag at the start and end of a recording
+gives the relative clock drift. `align_directory` runs this over a folder of
+`.ssr` recordings in a process pool.
+
+Usage:
+    python -m sonisense.alignment captures/ aligned/
+"""
+
+import argparse
+import glob
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.fft import irfft, next_fast_len, rfft
+from scipy.signal import decimate
+
+from .timebase import interpolate_at, resample_uniform
+
+DEFAULT_DECIMATION = 8
+DRIFT_SEGMENT_FRACTION = 0.25
+
+ChannelAlignment = namedtuple('ChannelAlignment', ['lag', 'drift_ppm', 'peak'])
+
+
+def fft_xcorr(ref, other, max_lag=None):
+    """
+    Normalised cross-correlation via FFT.
+
+    Parameters:
+    - ref, other: 1-D signals (means are removed).
+    - max_lag: Largest |lag| to return, defaults to the full range.
+
+    Returns (lags, correlation); a peak at lag d means other[n] ~ ref[n - d].
+    """
+    ref = np.asarray(ref, dtype=float) - np.mean(ref)
+    other = np.asarray(other, dtype=float) - np.mean(other)
+    n_fft = next_fast_len(len(ref) + len(other) - 1)
+    cc = irfft(rfft(other, n_fft) * np.conj(rfft(ref, n_fft)), n_fft)
+    cc /= max(np.sqrt(np.sum(ref ** 2) * np.sum(other ** 2)), 1e-12)
+
+    max_lag = min(max_lag if max_lag is not None else n_fft, len(other) - 1, len(ref) - 1)
+    correlation = np.concatenate([cc[-max_lag:], cc[:max_lag + 1]]) if max_lag > 0 else cc[:1]
+    return np.arange(-max_lag, max_lag + 1), correlation
+
+
+def _direct_xcorr(ref, other, lags):
+    """
+    Correlation at a handful of integer lags by direct dot products over the overlap.
+    """
+    values = np.empty(len(lags))
+    for i, lag in enumerate(lags):
+        if lag >= 0:
+            a, b = ref[:len(ref) - lag], other[lag:]
+        else:
+            a, b = ref[-lag:], other[:len(other) + lag]
+        m = min(len(a), len(b))
+        values[i] = np.dot(a[:m], b[:m]) / max(m, 1)
+    return values
+
+
+def estimate_lag(ref, other, decimation=DEFAULT_DECIMATION, max_lag=None):
+    """
+    Estimates the sub-sample lag of `other` relative to `ref`.
+
+    Parameters:
+    - ref, other: 1-D signals at the same sample rate.
+    - decimation: Factor for the coarse search; 1 searches at full rate.
+    - max_lag: Largest |lag| in full-rate samples to consider.
+
+    Returns (lag, peak): the lag in samples (positive when `other` is late)
+    and the normalised correlation peak of the coarse search.
+    """
+    ref = np.asarray(ref, dtype=float) - np.mean(ref)
+    other = np.asarray(other, dtype=float) - np.mean(other)
+
+    if decimation > 1 and min(len(ref), len(other)) > 64 * decimation:
+        coarse_ref = decimate(ref, decimation, ftype='fir', zero_phase=True)
+        coarse_other = decimate(other, decimation, ftype='fir', zero_phase=True)
+        coarse_max = None if max_lag is None else int(np.ceil(max_lag / decimation))
+        lags, correlation = fft_xcorr(coarse_ref, coarse_other, coarse_max)
+        best = int(np.argmax(correlation))
+        coarse = lags[best] * decimation
+        search = np.arange(coarse - 2 * decimation, coarse + 2 * decimation + 1)
+    else:
+        lags, correlation = fft_xcorr(ref, other, max_lag)
+        best = int(np.argmax(correlation))
+        search = np.arange(lags[best] - 2, lags[best] + 3)
+    peak = float(correlation[best])
+
+    # Full-rate refinement around the coarse peak
+    if max_lag is not None:
+        search = search[np.abs(search) <= max_lag]
+    values = _direct_xcorr(ref, other, search)
+    i = int(np.argmax(values))
+    lag = float(search[i])
+    if 0 < i < len(values) - 1:
+        denom = values[i - 1] - 2 * values[i] + values[i + 1]
+        if denom < 0:
+            lag += 0.5 * (values[i - 1] - values[i + 1]) / denom
+    return float(lag), peak
+
+
+def estimate_alignment(ref, other, decimation=DEFAULT_DECIMATION, max_lag=None):
+    """
+    Estimates lag, drift and correlation peak of `other` relative to `ref`.
+
+    Drift is measured from the lag over the first and last quarter of the
+    overlap and reported in parts per million of the sample clock.
+    """
+    lag, peak = estimate_lag(ref, other, decimation, max_lag)
+
+    n = min(len(ref), len(other))
+    segment = int(n * DRIFT_SEGMENT_FRACTION)
+    drift_ppm = 0.0
+    if segment > 256 * max(decimation, 1):
+        search = int(abs(lag)) + 4 * max(decimation, 1) if max_lag is None else max_lag
+        head, _ = estimate_lag(ref[:segment], other[:segment], decimation, search)
+        tail, _ = estimate_lag(ref[n - segment:n], other[n - segment:n], decimation, search)
+        drift_ppm = float((tail - head) / (n - segment) * 1e6)
+    return ChannelAlignment(lag, drift_ppm, peak)
+
+
+def align_channels(signals, reference=0, decimation=DEFAULT_DECIMATION, max_lag=None):
+    """
+    Time-aligns every channel to the reference channel.
+
+    Each channel is re-evaluated at n + lag(n), where lag(n) follows the
+    measured lag and drift, with the band-limited interpolator from
+    `timebase`. The output covers only the span where every channel has data.
+
+    Parameters:
+    - signals: List or (channels, samples) array of 1-D signals.
+    - reference: Index of the reference channel.
+
+    Returns (aligned, alignments, start): a (channels, samples) array, one
+    ChannelAlignment per channel (the reference has zero lag) and the index
+    of the first output sample in the reference channel.
+    """
+    signals = [np.asarray(signal, dtype=float) for signal in signals]
+    ref = signals[reference]
+    alignments = [
+        ChannelAlignment(0.0, 0.0, 1.0) if i == reference else estimate_alignment(ref, signal, decimation, max_lag)
+        for i, signal in enumerate(signals)
+    ]
+
+    n = len(ref)
+    index = np.arange(n, dtype=float)
+    positions = [index + a.lag + a.drift_ppm * 1e-6 * (index - n / 2) for a in alignments]
+
+    # Keep only reference samples that map inside every channel
+    valid = np.ones(n, dtype=bool)
+    for signal, pos in zip(signals, positions):
+        valid &= (pos >= 0) & (pos <= len(signal) - 1)
+    keep = np.nonzero(valid)[0]
+    if len(keep) == 0:
+        raise ValueError("Channels do not overlap after alignment")
+    span = slice(keep[0], keep[-1] + 1)
+
+    aligned = np.stack([
+        signal[span] if i == reference else interpolate_at(signal, pos[span])
+        for i, (signal, pos) in enumerate(zip(signals, positions))
+    ])
+    return aligned, alignments, int(keep[0])
+
+
+def align_recording(path, output_path, reference=0, decimation=DEFAULT_DECIMATION, max_lag=None):
+    """
+    Aligns one `.ssr` recording and writes the result as a new recording
+    with a single shared timestamp column.
+
+    Recordings whose channels carry their own clocks are first resampled
+    onto a common grid with `resample_uniform`, so the correlation only has
+    to remove the residual offset.
+
+    Returns a dict with the alignment of every channel.
+    """
+    from .recording import Recording, write_recording
+
+    with Recording(path) as recording:
+        header = recording.header
+        channels = recording.channels
+        if header['timestamps'] == 'per_channel':
+            timestamps, signals = resample_uniform(
+                [recording.channel(name) for name in channels],
+                [recording.timestamps(name) for name in channels],
+            )
+            sample_rate = 1000.0 / np.median(np.diff(timestamps))
+        else:
+            signals = np.asarray(recording.samples, dtype=float)
+            timestamps = np.array(recording.timestamps())
+            sample_rate = recording.sample_rate
+
+    aligned, alignments, start = align_channels(signals, reference, decimation, max_lag)
+    timestamps = timestamps[start:start + aligned.shape[1]]
+
+    metadata = dict(header.get('metadata', {}))
+    metadata['aligned_from'] = os.path.basename(path)
+    metadata['alignment'] = {name: a._asdict() for name, a in zip(channels, alignments)}
+    samples = np.clip(np.rint(aligned), 0, np.iinfo(np.uint16).max)
+    write_recording(output_path, samples, timestamps, sample_rate, header['board'], header['channel_map'], metadata)
+    return metadata['alignment']
+
+
+def _align_job(args):
+    path, output_path, reference, decimation, max_lag = args
+    return path, align_recording(path, output_path, reference, decimation, max_lag)
+
+
+def align_directory(directory, output_directory, reference=0, decimation=DEFAULT_DECIMATION, max_lag=None,
+                    max_workers=None):
+    """
+    Aligns every `.ssr` recording in `directory` in a process pool.
+
+    Returns a dict of input path to per-channel alignment.
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    jobs = [
+        (path, os.path.join(output_directory, os.path.basename(path)), reference, decimation, max_lag)
+        for path in sorted(glob.glob(os.path.join(directory, '*.ssr')))
+    ]
+    if not jobs:
+        return {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return dict(pool.map(_align_job, jobs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time-align the channels of SoniSense recordings.")
+    parser.add_argument('input_directory')
+    parser.add_argument('output_directory')
+    parser.add_argument('--reference', type=int, default=0)
+    parser.add_argument('--decimation', type=int, default=DEFAULT_DECIMATION)
+    parser.add_argument('--max-lag', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    results = align_directory(args.input_directory, args.output_directory, args.reference, args.decimation,
+                              args.max_lag, args.workers)
+    for path, alignment in results.items():
+        summary = ', '.join(f"{name}: lag {a['lag']:+.2f}, drift {a['drift_ppm']:+.1f} ppm"
+                            for name, a in alignment.items())
+        print(f"{os.path.basename(path)}: {summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Offline localisation of recording archives.
+
+`Localiser.process` handles one live frame at a time. Reprocessing days of
+`.ssr` captures that way spends most of its time in Python overhead.
+`localise_array` pre-filters each channel in one pass and frames all
+channels at once with a strided view, so no frame is copied. It then runs
+GCC-PHAT (or SRP) and the solver on thousands of frames per call as (F, M, N)
+array operations.
+
+`localise_archive` splits a stack of recordings into segments of whole
+frames and runs them in a process pool, one `Localiser` per worker.
+Recordings are memory-mapped by every worker, so they share the page cache.
+In-memory arrays are copied once into a `multiprocessing.shared_memory`
+block that the workers attach to. Each segment starts the pre-filter a few
+samples early, so the output does not depend on how the archive was split.
+
+Results are columns of recording index, timestamp (ms, frame centre),
+azimuth and confidence; `write_table` stores them as Parquet (with
+pyarrow), CSV or `.npz`.
+
+Usage:
+    python -m sonisense.batch archive/*.ssr -o azimuths.parquet --frame-size 1024 --workers 8
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from .instrumentation import instrument
+from .localisation import Localiser
+from .recording import Recording
+
+DEFAULT_FRAME_SIZE = 1024
+DEFAULT_CHUNK_FRAMES = 256  # Frames per vectorised call; bounds the correlation buffers
+DEFAULT_SEGMENT_FRAMES = 16384  # Frames per pool task
+COLUMNS = ('recording', 'timestamp', 'azimuth', 'confidence')
+
+_worker = {}
+
+
+def frame_view(samples, frame_size, hop=None):
+    """
+    Frames (M, S) samples as a (F, M, frame_size) strided view without copying.
+
+    Parameters:
+    - samples: Array of shape (channels, samples).
+    - frame_size: Samples per frame.
+    - hop: Samples between frame starts, defaults to `frame_size`.
+    """
+    hop = frame_size if hop is None else hop
+    if samples.shape[-1] < frame_size:
+        return np.empty((0, samples.shape[0], frame_size), dtype=samples.dtype)
+    windows = np.lib.stride_tricks.sliding_window_view(samples, frame_size, axis=-1)  # (M, S', N)
+    return windows[:, ::hop].transpose(1, 0, 2)
+
+
+def num_frames(length, frame_size, hop=None):
+    hop = frame_size if hop is None else hop
+    return max(0, (length - frame_size) // hop + 1)
+
+
+@instrument('localise.batch', samples_arg=1)
+def localise_array(localiser, samples, frame_size=DEFAULT_FRAME_SIZE, hop=None, start_frame=0, stop_frame=None,
+                   chunk_frames=DEFAULT_CHUNK_FRAMES):
+    """
+    Localises every frame of one continuous capture.
+
+    Parameters:
+    - localiser: A configured `Localiser`.
+    - samples: (M, S) samples, e.g. a memory-mapped recording.
+    - frame_size, hop: Framing in samples.
+    - start_frame, stop_frame: Frame range to process. The pre-filter
+      starts up to len(taps) - 1 samples before the first frame, so a range
+      gives the same results as the whole capture.
+    - chunk_frames: Frames localised per array operation.
+
+    Returns (azimuth, confidence) arrays of shape (F,).
+    """
+    hop = frame_size if hop is None else hop
+    total = num_frames(samples.shape[-1], frame_size, hop)
+    stop_frame = total if stop_frame is None else min(stop_frame, total)
+    if stop_frame <= start_frame:
+        return np.empty(0), np.empty(0)
+
+    first = start_frame * hop
+    last = (stop_frame - 1) * hop + frame_size
+    warmup = 0 if localiser.prefilter is None else min(localiser.prefilter.overlap, first)
+    segment = np.asarray(samples[:, first - warmup:last], dtype=float)
+    if localiser.dc_offsets is not None:
+        segment -= localiser.dc_offsets
+    if localiser.prefilter is not None:
+        # Primed as the whole capture would be at its start, then run through the warm-up samples
+        localiser.prefilter.reset(segment[:, 0])
+        segment = localiser.prefilter.process(segment)[:, warmup:]
+
+    frames = frame_view(segment, frame_size, hop)
+    azimuths = np.empty(len(frames))
+    confidences = np.empty(len(frames))
+    for chunk in range(0, len(frames), chunk_frames):
+        block = frames[chunk:chunk + chunk_frames]
+        block = block - block.mean(axis=-1, keepdims=True)
+        azimuth, _, confidence = localiser.locate(block)
+        azimuths[chunk:chunk + len(block)] = azimuth
+        confidences[chunk:chunk + len(block)] = confidence
+    return azimuths, confidences
+
+
+def _init_worker(sample_rate, localiser_params):
+    _worker['localiser'] = Localiser(sample_rate, **localiser_params)
+    _worker['buffers'] = {}
+
+
+def _attach(source):
+    # Recordings are memory-mapped, arrays come from a named shared-memory block
+    key = source[1]
+    buffers = _worker['buffers']
+    if key not in buffers:
+        if source[0] == 'recording':
+            recording = Recording(key)
+            buffers[key] = (recording, recording.samples)
+        else:
+            _, name, shape, dtype = source
+            block = shared_memory.SharedMemory(name=name)
+            buffers[key] = (block, np.ndarray(shape, dtype=dtype, buffer=block.buf))
+    return buffers[key][1]
+
+
+def _segment_job(args):
+    source, index, start_frame, stop_frame, frame_size, hop, chunk_frames = args
+    samples = _attach(source)
+    if samples.ndim == 3:
+        samples = samples[index]
+    azimuth, confidence = localise_array(_worker['localiser'], samples, frame_size, hop, start_frame, stop_frame,
+                                         chunk_frames)
+    return index, start_frame, azimuth, confidence
+
+
+def localise_archive(archive, sample_rate=None, frame_size=DEFAULT_FRAME_SIZE, hop=None,
+                     segment_frames=DEFAULT_SEGMENT_FRAMES, chunk_frames=DEFAULT_CHUNK_FRAMES, max_workers=None,
+                     **localiser_params):
+    """
+    Localises every frame of a stack of recordings in a process pool.
+
+    Parameters:
+    - archive: List of `.ssr` paths, or an array of shape (M, S) or (R, M, S)
+      holding R equal-length captures.
+    - sample_rate: Required for arrays; recordings use their header's rate,
+      which must be the same for the whole stack.
+    - frame_size, hop: Framing in samples.
+    - segment_frames: Frames per pool task.
+    - chunk_frames: Frames per vectorised call inside a task.
+    - max_workers: Worker processes; defaults to the CPU count.
+    - localiser_params: `Localiser` arguments (solver, prefilter, calibration, ...).
+
+    Returns a DataFrame with the COLUMNS, one row per frame, in recording
+    and time order. Array timestamps count from the first sample.
+    """
+    hop = frame_size if hop is None else hop
+    block = None
+    if isinstance(archive, np.ndarray):
+        if sample_rate is None:
+            raise ValueError("sample_rate is required for array input")
+        stack = archive[None] if archive.ndim == 2 else archive
+        # One copy into shared memory; workers map it instead of receiving pickled slices
+        block = shared_memory.SharedMemory(create=True, size=max(stack.nbytes, 1))
+        shared = np.ndarray(stack.shape, dtype=stack.dtype, buffer=block.buf)
+        shared[:] = stack
+        del shared
+        sources = [('shared', block.name, stack.shape, stack.dtype.str)] * len(stack)
+        lengths = [stack.shape[-1]] * len(stack)
+        timestamps = [None] * len(stack)
+    else:
+        sources, lengths, timestamps, rates = [], [], [], set()
+        for path in archive:
+            with Recording(path) as recording:
+                lengths.append(len(recording))
+                rates.add(recording.sample_rate)
+                timestamps.append(np.array(recording.timestamps()))
+            sources.append(('recording', path))
+        if len(rates) > 1:
+            raise ValueError(f"Recordings mix sample rates {sorted(rates)}; localise them separately")
+        sample_rate = sample_rate or (rates.pop() if rates else 1.0)
+
+    jobs = []
+    for index, (source, length) in enumerate(zip(sources, lengths)):
+        for start in range(0, num_frames(length, frame_size, hop), segment_frames):
+            jobs.append((source, index, start, start + segment_frames, frame_size, hop, chunk_frames))
+
+    results = {}
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(sample_rate, localiser_params)) as pool:
+            for index, start, azimuth, confidence in pool.map(_segment_job, jobs):
+                results[index, start] = (azimuth, confidence)
+    finally:
+        if block is not None:
+            block.close()
+            block.unlink()
+
+    columns = {name: [] for name in COLUMNS}
+    for index, length in enumerate(lengths):
+        count = num_frames(length, frame_size, hop)
+        centres = np.arange(count) * hop + frame_size // 2
+        if timestamps[index] is None:
+            stamps = centres / sample_rate * 1000.0
+        else:
+            stamps = timestamps[index][centres]
+        starts = range(0, count, segment_frames)
+        columns['recording'].append(np.full(count, index))
+        columns['timestamp'].append(stamps)
+        columns['azimuth'].append(np.concatenate([results[index, start][0] for start in starts] or [np.empty(0)]))
+        columns['confidence'].append(np.concatenate([results[index, start][1] for start in starts]
+                                                    or [np.empty(0)]))
+    return pd.DataFrame({name: np.concatenate(values) if values else np.empty(0)
+                         for name, values in columns.items()})
+
+
+@instrument('export.table')
+def write_table(table, path):
+    """
+    Writes a results table; `.parquet` needs pyarrow, `.csv` is plain text,
+    anything else is an `.npz` of the columns.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.parquet':
+        try:
+            table.to_parquet(path, index=False)
+        except ImportError:
+            raise ImportError("Parquet output needs pyarrow (pip install pyarrow); use .csv or .npz instead")
+    elif extension == '.csv':
+        table.to_csv(path, index=False)
+    else:
+        np.savez(path, **{name: table[name].to_numpy() for name in table.columns})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Localise every frame of SoniSense recordings in parallel.")
+    parser.add_argument('recordings', nargs='+')
+    parser.add_argument('-o', '--output', default='azimuths.csv')
+    parser.add_argument('--frame-size', type=int, default=DEFAULT_FRAME_SIZE)
+    parser.add_argument('--hop', type=int, default=None)
+    parser.add_argument('--solver', default='lookup')
+    parser.add_argument('--prefilter', default='kaiser', help="filter_design method, or 'none'")
+    parser.add_argument('--calibration', default=None, help="Calibration profile JSON")
+    parser.add_argument('--segment-frames', type=int, default=DEFAULT_SEGMENT_FRAMES)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    calibration = None
+    if args.calibration:
+        from .calibration import CalibrationProfile
+
+        calibration = CalibrationProfile.load(args.calibration)
+    start = time.perf_counter()
+    table = localise_archive(args.recordings, frame_size=args.frame_size, hop=args.hop,
+                             segment_frames=args.segment_frames, max_workers=args.workers, solver=args.solver,
+                             prefilter=None if args.prefilter == 'none' else args.prefilter,
+                             calibration=calibration)
+    elapsed = time.perf_counter() - start
+    write_table(table, args.output)
+    print(f"{len(table)} frames from {len(args.recordings)} recordings in {elapsed:.1f} s "
+          f"({len(table) / elapsed:.0f} frames/s), written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
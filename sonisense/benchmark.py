@@ -0,0 +1,216 @@
+"""
+Benchmark harness for the FIR designs in `filter_design`.
+
+Runs every design through `StreamingFIR` across signal lengths, tap counts,
+channel counts and convolution engines, and records throughput, per-block
+latency percentiles, peak memory and the frequency-domain quality of the
+taps. Results are written as JSON and/or CSV so runs can be compared over
+time.
+
+Usage:
+    python -m sonisense.benchmark --output results.json --csv results.csv
+    python -m sonisense.benchmark --lengths 1e3 1e5 --taps 51 --channels 3
+    python -m sonisense.benchmark --lengths 1e6 1e7 --designs kaiser
+
+The default grid stops at 1e5 samples so a full run takes minutes; longer
+signals are opt-in through --lengths.
+"""
+
+import argparse
+import csv
+import json
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+from scipy.signal import freqz
+
+from .filter_design import FILTER_DESIGNS, design_filter
+from .streaming import StreamingFIR
+
+DEFAULT_LENGTHS = [1e3, 1e4, 1e5]
+DEFAULT_TAPS = [21, 51, 101]
+DEFAULT_CHANNELS = [1, 3]
+DEFAULT_ENGINES = ['direct', 'fft']
+DEFAULT_BLOCK_SIZE = 1024
+
+# Every design is built at one cutoff (fraction of Nyquist) and judged against a spec scaled from it;
+# at the default cutoff the passband ends at 0.05 and the stopband starts at 0.3
+DEFAULT_CUTOFF = 0.2
+PASSBAND_RATIO = 0.25
+STOPBAND_RATIO = 1.5
+
+
+def design_at_cutoff(method, num_taps, cutoff=DEFAULT_CUTOFF):
+    """
+    Designs `method` with its cutoff at `cutoff` of Nyquist, so the quality
+    columns compare like with like instead of each design's own default.
+
+    The Gaussian kernel has no cutoff parameter; its width is chosen so its
+    gain falls to one half (-6 dB, the firwin convention) at `cutoff`.
+    """
+    if method == 'gaussian':
+        return design_filter(method, num_taps=num_taps, std_dev=np.sqrt(2 * np.log(2)) / (np.pi * cutoff))
+    return design_filter(method, num_taps=num_taps, cutoff=cutoff)
+
+
+def response_metrics(taps, passband_edge=DEFAULT_CUTOFF * PASSBAND_RATIO, stopband_edge=DEFAULT_CUTOFF * STOPBAND_RATIO,
+                     num_points=8192):
+    """
+    Frequency-domain quality of a low-pass FIR.
+
+    Parameters:
+    - taps: FIR coefficients.
+    - passband_edge: End of the passband as a fraction of Nyquist.
+    - stopband_edge: Start of the stopband as a fraction of Nyquist.
+
+    Returns a dict with the peak-to-peak passband ripple in dB, the minimum
+    stopband attenuation in dB and the -3 dB cutoff as a fraction of Nyquist.
+    """
+    freqs, response = freqz(taps, worN=num_points)
+    freqs = freqs / np.pi
+    magnitude = np.abs(response)
+    dc_gain = max(magnitude[0], 1e-12)
+    magnitude_db = 20 * np.log10(np.maximum(magnitude / dc_gain, 1e-12))
+
+    passband = magnitude_db[freqs <= passband_edge]
+    stopband = magnitude_db[freqs >= stopband_edge]
+    below_3db = np.nonzero(magnitude_db < -3.0)[0]
+
+    return {
+        'passband_ripple_db': float(passband.max() - passband.min()),
+        'stopband_attenuation_db': float(-stopband.max()),
+        'cutoff_3db': float(freqs[below_3db[0]]) if len(below_3db) else 1.0,
+    }
+
+
+def _run_blocks(fir, signal, block_size):
+    """
+    Streams `signal` through `fir` and returns the per-block wall times.
+    """
+    timings = np.empty(-(-signal.shape[1] // block_size))
+    for i, start in enumerate(range(0, signal.shape[1], block_size)):
+        t0 = time.perf_counter()
+        fir.process(signal[:, start:start + block_size])
+        timings[i] = time.perf_counter() - t0
+    return timings
+
+
+def benchmark_case(method, num_taps, channels, length, engine, block_size=DEFAULT_BLOCK_SIZE,
+                   measure_memory=True, seed=0, cutoff=DEFAULT_CUTOFF):
+    """
+    Benchmarks one (design, taps, channels, length, engine) combination.
+
+    Returns a flat dict of results suitable for a CSV row.
+    """
+    taps = design_at_cutoff(method, num_taps, cutoff)
+    signal = np.random.default_rng(seed).standard_normal((channels, int(length)))
+
+    timings = _run_blocks(StreamingFIR(taps, method=engine), signal, block_size)
+    total = timings.sum()
+
+    peak_memory = None
+    if measure_memory:
+        # Separate pass so tracemalloc overhead does not skew the timings
+        tracemalloc.start()
+        _run_blocks(StreamingFIR(taps, method=engine), signal, block_size)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    result = {
+        'design': method,
+        'num_taps': num_taps,
+        'channels': channels,
+        'length': int(length),
+        'engine': engine,
+        'block_size': block_size,
+        'cutoff': cutoff,
+        'samples_per_sec': channels * int(length) / total if total > 0 else float('inf'),
+        'latency_p50_us': float(np.percentile(timings, 50) * 1e6),
+        'latency_p90_us': float(np.percentile(timings, 90) * 1e6),
+        'latency_p99_us': float(np.percentile(timings, 99) * 1e6),
+        'latency_max_us': float(timings.max() * 1e6),
+        'peak_memory_bytes': peak_memory,
+    }
+    result.update(response_metrics(taps, cutoff * PASSBAND_RATIO, cutoff * STOPBAND_RATIO))
+    return result
+
+
+def run_benchmarks(designs=None, lengths=DEFAULT_LENGTHS, taps=DEFAULT_TAPS, channels=DEFAULT_CHANNELS,
+                   engines=DEFAULT_ENGINES, block_size=DEFAULT_BLOCK_SIZE, measure_memory=True, verbose=False,
+                   cutoff=DEFAULT_CUTOFF):
+    """
+    Runs the full grid of benchmark cases and returns a list of result dicts.
+    """
+    results = []
+    for method in designs or sorted(FILTER_DESIGNS):
+        for num_taps in taps:
+            for num_channels in channels:
+                for length in lengths:
+                    for engine in engines:
+                        result = benchmark_case(method, num_taps, num_channels, length, engine,
+                                                block_size, measure_memory, cutoff=cutoff)
+                        results.append(result)
+                        if verbose:
+                            print(f"{method:>18} taps={num_taps:<4} ch={num_channels} n={int(length):<9} "
+                                  f"{engine:>6}: {result['samples_per_sec'] / 1e6:8.2f} MS/s, "
+                                  f"p99 {result['latency_p99_us']:8.1f} us")
+    return results
+
+
+def write_json(results, path):
+    """
+    Writes results to `path` together with the environment they were measured in.
+    """
+    document = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+        },
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
+
+
+def write_csv(results, path):
+    """
+    Writes results to `path` as one CSV row per benchmark case. No results
+    give an empty file.
+    """
+    with open(path, 'w', newline='') as f:
+        if not results:
+            return
+        writer = csv.DictWriter(f, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the SoniSense FIR designs.")
+    parser.add_argument('--designs', nargs='+', choices=sorted(FILTER_DESIGNS), default=None)
+    parser.add_argument('--lengths', nargs='+', type=float, default=DEFAULT_LENGTHS)
+    parser.add_argument('--taps', nargs='+', type=int, default=DEFAULT_TAPS)
+    parser.add_argument('--channels', nargs='+', type=int, default=DEFAULT_CHANNELS)
+    parser.add_argument('--engines', nargs='+', choices=DEFAULT_ENGINES, default=DEFAULT_ENGINES)
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE)
+    parser.add_argument('--cutoff', type=float, default=DEFAULT_CUTOFF, help="Common cutoff, fraction of Nyquist")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass")
+    parser.add_argument('--output', help="JSON results file")
+    parser.add_argument('--csv', help="CSV results file")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.designs, args.lengths, args.taps, args.channels, args.engines,
+                             args.block_size, not args.no_memory, verbose=True, cutoff=args.cutoff)
+    if args.output:
+        write_json(results, args.output)
+    if args.csv:
+        write_csv(results, args.csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Streaming idle-noise calibration for the SoniSense mics.
+
+`ChannelCalibrator` makes a single pass over an idle recording of any length,
+one chunk at a time, and accumulates:
+
+- the DC offset and noise variance (Welford, merged chunk by chunk),
+- the noise-floor PSD (running Welch average, carrying partial segments
+  across chunk boundaries),
+- an exact histogram of the integer ADC codes, from which percentile clip
+  thresholds are read.
+
+The result is a `CalibrationProfile` saved as JSON, which the processing
+stages load at startup instead of hard-coded constants such as the
+1100-1500 band in `process_excel.py`.
+
+Usage:
+    python -m sonisense.calibration profile.json mic1.csv mic2.csv mic3.csv
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+from scipy.fft import rfft, rfftfreq
+from scipy.signal import get_window
+
+from .instrumentation import instrument
+from .timebase import fit_clock
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+DEFAULT_SEGMENT_LENGTH = 256
+DEFAULT_PERCENTILES = (0.1, 99.9)
+ADC_MAX = np.iinfo(np.uint16).max
+
+
+class ChannelCalibrator:
+    """
+    Single-pass accumulator for one mic channel.
+
+    Parameters:
+    - sample_rate: Sample rate in Hz, used to scale the PSD.
+    - nperseg: Welch segment length; segments overlap by half.
+    """
+
+    def __init__(self, sample_rate, nperseg=DEFAULT_SEGMENT_LENGTH):
+        self.sample_rate = float(sample_rate)
+        self.nperseg = nperseg
+        self.hop = nperseg // 2
+        self.window = get_window('hann', nperseg)
+        # Same one-sided density scaling as scipy.signal.welch
+        self._psd_scale = 1.0 / (self.sample_rate * np.sum(self.window ** 2))
+
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._histogram = np.zeros(4096, dtype=np.int64)
+        self._psd_sum = np.zeros(nperseg // 2 + 1)
+        self._segments = 0
+        self._tail = np.empty(0)
+
+    def update(self, chunk):
+        """
+        Folds the next chunk of samples into the running statistics.
+        """
+        chunk = np.asarray(chunk, dtype=float).ravel()
+        n = len(chunk)
+        if n == 0:
+            return
+
+        # Welford/Chan merge of the chunk's moments into the running ones
+        chunk_mean = chunk.mean()
+        chunk_m2 = np.sum((chunk - chunk_mean) ** 2)
+        total = self.count + n
+        delta = chunk_mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += chunk_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+        codes = np.clip(np.rint(chunk), 0, ADC_MAX).astype(np.int64)
+        counts = np.bincount(codes)
+        if len(counts) > len(self._histogram):
+            self._histogram = np.pad(self._histogram, (0, len(counts) - len(self._histogram)))
+        self._histogram[:len(counts)] += counts
+
+        # Welch: every complete segment in (leftover + chunk), batched through one rfft
+        data = np.concatenate([self._tail, chunk])
+        if len(data) >= self.nperseg:
+            segments = np.lib.stride_tricks.sliding_window_view(data, self.nperseg)[::self.hop]
+            segments = segments - segments.mean(axis=1, keepdims=True)
+            self._psd_sum += np.sum(np.abs(rfft(segments * self.window, axis=1)) ** 2, axis=0)
+            self._segments += len(segments)
+            data = data[len(segments) * self.hop:]
+        self._tail = data
+
+    @property
+    def variance(self):
+        return self._m2 / self.count if self.count else 0.0
+
+    def percentiles(self, q):
+        """
+        Exact percentiles of the integer ADC codes seen so far.
+        """
+        cdf = np.cumsum(self._histogram)
+        targets = np.asarray(q, dtype=float) / 100.0 * (cdf[-1] - 1)
+        return np.searchsorted(cdf, targets, side='right').astype(float)
+
+    def psd(self):
+        """
+        Returns (freqs, psd) for the averaged noise floor.
+        """
+        freqs = rfftfreq(self.nperseg, 1.0 / self.sample_rate)
+        if self._segments == 0:
+            return freqs, np.zeros_like(freqs)
+        psd = self._psd_sum / self._segments * self._psd_scale
+        psd[1:-1] *= 2  # One-sided
+        return freqs, psd
+
+    def result(self, percentiles=DEFAULT_PERCENTILES):
+        """
+        Returns this channel's calibration as a plain dictionary.
+        """
+        freqs, psd = self.psd()
+        low, high = self.percentiles(percentiles)
+        return {
+            'samples': int(self.count),
+            'dc_offset': float(self.mean),
+            'noise_std': float(np.sqrt(self.variance)),
+            'clip_low': float(low),
+            'clip_high': float(high),
+            'clip_percentiles': list(percentiles),
+            'psd_freqs': freqs.tolist(),
+            'psd': psd.tolist(),
+        }
+
+
+class CalibrationProfile:
+    """
+    Per-mic idle calibration loaded by the live pipeline at startup.
+
+    Parameters:
+    - channels: Dictionary of channel name to the dict from `ChannelCalibrator.result`.
+    - sample_rate: Sample rate the profile was measured at, in Hz.
+    """
+
+    def __init__(self, channels, sample_rate):
+        self.channels = channels
+        self.sample_rate = sample_rate
+
+    @property
+    def names(self):
+        return list(self.channels)
+
+    def dc_offsets(self):
+        """
+        Returns the DC offset of every channel as an array, in channel order.
+        """
+        return np.array([self.channels[name]['dc_offset'] for name in self.channels])
+
+    def noise_std(self):
+        """
+        Returns the idle noise standard deviation of every channel, in channel order.
+        """
+        return np.array([self.channels[name]['noise_std'] for name in self.channels])
+
+    def clip_range(self, channel):
+        """
+        Returns the (low, high) ADC codes outside which samples are treated as clipped.
+        """
+        entry = self.channels[channel] if isinstance(channel, str) else list(self.channels.values())[channel]
+        return entry['clip_low'], entry['clip_high']
+
+    def psd(self, channel):
+        """
+        Returns (freqs, psd) of the idle noise floor for one channel.
+        """
+        entry = self.channels[channel] if isinstance(channel, str) else list(self.channels.values())[channel]
+        return np.array(entry['psd_freqs']), np.array(entry['psd'])
+
+    def psd_at(self, channel, freqs):
+        """
+        Idle noise PSD of one channel at physical frequencies in Hz, for
+        stages that run at another sample rate. Above the profile's Nyquist
+        the PSD continues at its high-frequency floor, the median of the top
+        octave.
+        """
+        profile_freqs, psd = self.psd(channel)
+        floor = np.median(psd[profile_freqs >= profile_freqs[-1] / 2])
+        return np.interp(freqs, profile_freqs, psd, right=floor)
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'sample_rate': self.sample_rate, 'channels': self.channels}, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            document = json.load(f)
+        return cls(document['channels'], document['sample_rate'])
+
+
+def iter_csv_chunks(path, chunksize=DEFAULT_CHUNK_SIZE, value_column='Mic Value', time_column='Time (ms)'):
+    """
+    Yields (timestamps, values) arrays from a capture CSV, one chunk at a time.
+    """
+    import pandas as pd
+
+    reader = pd.read_csv(path, usecols=[time_column, value_column], chunksize=chunksize,
+                         dtype={time_column: np.float64, value_column: np.float64})
+    for chunk in reader:
+        yield chunk[time_column].values, chunk[value_column].values
+
+
+def _estimate_csv_rate(path):
+    """
+    Estimates the sample rate of a capture CSV with the robust clock fit of
+    `timebase.fit_clock`. The burst-stamped startup backlog would bias a
+    first/last-stamp estimate by several percent. Only the timestamp column
+    is kept, the values are streamed past.
+    """
+    timestamps = np.concatenate([stamps for stamps, _ in iter_csv_chunks(path)] or [np.empty(0)])
+    if len(timestamps) < 2:
+        return 0.0
+    return fit_clock(timestamps).sample_rate
+
+
+@instrument('load.calibration')
+def calibrate_captures(captures, sample_rate=None, chunksize=DEFAULT_CHUNK_SIZE, nperseg=DEFAULT_SEGMENT_LENGTH,
+                       percentiles=DEFAULT_PERCENTILES):
+    """
+    Builds a calibration profile from idle captures in one streaming pass each.
+
+    Parameters:
+    - captures: Either a list of per-mic CSV paths (named mic1..micN), a
+      dictionary of channel name to CSV path, or a `Recording`.
+    - sample_rate: Sample rate in Hz. Taken from the recording header, or
+      estimated from the CSV timestamps, when omitted.
+    - chunksize: Samples read per chunk.
+    - nperseg: Welch segment length.
+    - percentiles: (low, high) percentiles used for the clip thresholds.
+    """
+    from .recording import Recording
+
+    if isinstance(captures, Recording):
+        sample_rate = sample_rate or captures.sample_rate
+        channels = {}
+        for name in captures.channels:
+            calibrator = ChannelCalibrator(sample_rate, nperseg)
+            data = captures.channel(name)
+            for start in range(0, len(data), chunksize):
+                calibrator.update(data[start:start + chunksize])
+            channels[name] = calibrator.result(percentiles)
+        return CalibrationProfile(channels, sample_rate)
+
+    if not isinstance(captures, dict):
+        captures = {f'mic{i + 1}': path for i, path in enumerate(captures)}
+    if sample_rate is None:
+        sample_rate = _estimate_csv_rate(next(iter(captures.values())))
+
+    channels = {}
+    for name, path in captures.items():
+        calibrator = ChannelCalibrator(sample_rate, nperseg)
+        for _, values in iter_csv_chunks(path, chunksize):
+            calibrator.update(values)
+        channels[name] = calibrator.result(percentiles)
+    return CalibrationProfile(channels, sample_rate)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a SoniSense idle calibration profile.")
+    parser.add_argument('output', help="Profile JSON to write")
+    parser.add_argument('inputs', nargs='+', help="Idle capture CSVs (one per mic) or one .ssr recording")
+    parser.add_argument('--sample-rate', type=float, default=None)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--nperseg', type=int, default=DEFAULT_SEGMENT_LENGTH)
+    args = parser.parse_args(argv)
+
+    if len(args.inputs) == 1 and os.path.splitext(args.inputs[0])[1] == '.ssr':
+        from .recording import Recording
+        captures = Recording(args.inputs[0])
+    else:
+        captures = args.inputs
+
+    profile = calibrate_captures(captures, args.sample_rate, args.chunk_size, args.nperseg)
+    profile.save(args.output)
+    for name, entry in profile.channels.items():
+        print(f"{name}: dc {entry['dc_offset']:.1f}, noise std {entry['noise_std']:.2f}, "
+              f"clip [{entry['clip_low']:.0f}, {entry['clip_high']:.0f}]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Multi-stage polyphase decimation ahead of localisation.
+
+The FIR designs in `filter_design` keep only the bottom 10-20% of the band
+(cutoffs of 0.1-0.2 of Nyquist), so most of the samples the later stages
+process carry nothing but out-of-band noise. `MultistageDecimator` lowers
+the rate by 4-10x before those stages run. Each stage pairs a
+low-pass from `filter_design` (the Kaiser `firwin` design or the windowed
+sinc) with a downsampler. The filter is only evaluated at the output
+instants that are kept, which is the polyphase form of the same
+computation. Several cheap stages replace one long filter at the full rate.
+
+Each stage's transition band is placed so that nothing it lets through can
+fold into the final passband. By default the passband is 0.1 of the input
+Nyquist, narrowed to 80% of the output Nyquist for factors above 8. `aliasing` measures the residual aliasing
+from the combined response, so the loss is a known quantity.
+
+Usage:
+    python -m sonisense.decimation --factor 8 --passband 0.1
+"""
+
+import argparse
+
+import numpy as np
+from scipy.signal import freqz, kaiserord
+
+from .filter_design import design_filter
+from .instrumentation import instrument
+
+DECIMATION_DESIGNS = ('kaiser', 'sinc_hamming')
+DEFAULT_PASSBAND = 0.1  # Fraction of the input Nyquist kept, the default `kaiser` cutoff
+MAX_PASSBAND = 0.8  # Widest default passband as a fraction of the output Nyquist
+DEFAULT_ATTENUATION = 60.0  # Stopband attenuation in dB for the Kaiser design
+HAMMING_TRANSITION = 3.3  # Hamming-window transition width in cycles/sample x taps
+
+
+class PolyphaseDecimator:
+    """
+    One FIR-plus-downsample stage for blocks of shape (channels, samples).
+
+    Output n is the filter output at input sample n * factor (counted from
+    the last reset), so the filter runs at the output rate. The last
+    len(taps) - 1 input samples and the position of the next kept sample
+    carry across blocks, so any block split gives the same output.
+
+    Parameters:
+    - taps: 1-D array of FIR coefficients.
+    - factor: Integer decimation factor.
+    """
+
+    def __init__(self, taps, factor):
+        self.taps = np.asarray(taps, dtype=float)
+        if self.taps.ndim != 1 or len(self.taps) == 0:
+            raise ValueError("taps must be a non-empty 1-D array")
+        if int(factor) != factor or factor < 1:
+            raise ValueError(f"The decimation factor must be a positive integer, got {factor}")
+        self.factor = int(factor)
+        self.overlap = len(self.taps) - 1
+        self._reversed = self.taps[::-1].copy()
+        self._history = None
+        self._offset = 0
+
+    def reset(self, initial=None):
+        """
+        Clears the history, or fills it with a per-channel value held forever
+        to avoid a step transient on signals with a large DC offset.
+        """
+        self._offset = 0
+        if initial is None:
+            self._history = None
+            return
+        initial = np.atleast_1d(np.asarray(initial, dtype=float))[:, None]
+        self._history = np.repeat(initial, self.overlap, axis=1)
+
+    def process(self, block):
+        """
+        Filters and downsamples the next block.
+
+        Parameters:
+        - block: Array of shape (channels, samples), or (samples,) for a single channel.
+
+        Returns the kept output samples, shape (channels, outputs).
+        """
+        block = np.asarray(block, dtype=float)
+        squeeze = block.ndim == 1
+        if squeeze:
+            block = block[None, :]
+
+        if self._history is None:
+            self._history = np.zeros((block.shape[0], self.overlap))
+        elif self._history.shape[0] != block.shape[0]:
+            raise ValueError(f"Expected {self._history.shape[0]} channels, got {block.shape[0]}")
+
+        buffer = np.concatenate([self._history, block], axis=1)
+        length = block.shape[1]
+        count = max(0, -(-(length - self._offset) // self.factor))
+        if count:
+            # Windows ending at the kept samples only; one matrix product for all channels
+            windows = np.lib.stride_tricks.sliding_window_view(buffer, len(self.taps), axis=-1)
+            out = windows[:, self._offset::self.factor][:, :count] @ self._reversed
+        else:
+            out = np.empty((block.shape[0], 0))
+        self._offset += count * self.factor - length
+        self._history = buffer[:, buffer.shape[1] - self.overlap:].copy()
+        return out[0] if squeeze else out
+
+
+def plan_stages(factor):
+    """
+    Splits a decimation factor into stage factors, largest first.
+
+    Any factorisation is valid; putting the largest factor first keeps the
+    number of taps run at the full input rate lowest.
+    """
+    if int(factor) != factor or factor < 1:
+        raise ValueError(f"The decimation factor must be a positive integer, got {factor}")
+    factor = int(factor)
+    stages = []
+    divisor = 2
+    while factor > 1:
+        while factor % divisor == 0:
+            stages.append(divisor)
+            factor //= divisor
+        divisor += 1
+    return sorted(stages, reverse=True) or [1]
+
+
+def default_passband(factor):
+    """
+    Passband used when none is given: `DEFAULT_PASSBAND`, or `MAX_PASSBAND`
+    of the output Nyquist when that is narrower.
+    """
+    return min(DEFAULT_PASSBAND, MAX_PASSBAND / factor)
+
+
+def design_stage(factor, passband, method='kaiser', attenuation=DEFAULT_ATTENUATION):
+    """
+    Anti-aliasing low-pass for one stage.
+
+    Parameters:
+    - factor: The stage's decimation factor.
+    - passband: Edge of the final passband as a fraction of this stage's input Nyquist.
+    - method: 'kaiser' (length and beta from `kaiserord`) or 'sinc_hamming'
+      (fixed ~53 dB stopband, length from the Hamming transition width).
+    - attenuation: Stopband attenuation in dB for the Kaiser design.
+
+    The stopband starts at 2 / factor - passband, the lowest frequency that
+    folds back onto the passband after downsampling. Anything between the
+    passband and that edge folds onto the transition band only, which the
+    later stages remove.
+    """
+    if method not in DECIMATION_DESIGNS:
+        raise ValueError(f"Unknown decimation filter '{method}', expected one of {list(DECIMATION_DESIGNS)}")
+    if factor == 1:
+        return np.ones(1)
+    stopband = 2.0 / factor - passband
+    if stopband <= passband:
+        raise ValueError(f"A passband of {passband:.3g} x Nyquist does not survive decimation by {factor}")
+    cutoff = (passband + stopband) / 2
+    width = stopband - passband
+    if method == 'kaiser':
+        num_taps, beta = kaiserord(attenuation, width)
+        return design_filter('kaiser', num_taps=num_taps | 1, cutoff=cutoff, beta=beta)
+    num_taps = int(np.ceil(2 * HAMMING_TRANSITION / width)) | 1
+    return design_filter('sinc_hamming', num_taps=num_taps, cutoff=cutoff)
+
+
+class MultistageDecimator:
+    """
+    Cascade of `PolyphaseDecimator` stages with a combined decimation factor.
+
+    Parameters:
+    - factor: Overall decimation factor.
+    - passband: Band kept, as a fraction of the input Nyquist. It must stay
+      below the output Nyquist (passband * factor < 1). Defaults to
+      `default_passband(factor)`.
+    - method: Low-pass design, 'kaiser' or 'sinc_hamming'.
+    - attenuation: Stopband attenuation in dB for the Kaiser stages.
+    - stages: Explicit stage factors; by default from `plan_stages`.
+    """
+
+    def __init__(self, factor, passband=None, method='kaiser', attenuation=DEFAULT_ATTENUATION, stages=None):
+        stages = plan_stages(factor) if stages is None else [int(s) for s in stages]
+        if int(np.prod(stages)) != factor:
+            raise ValueError(f"Stage factors {stages} do not multiply to {factor}")
+        passband = default_passband(factor) if passband is None else passband
+        if passband * factor >= 1:
+            raise ValueError(f"A passband of {passband:.3g} x Nyquist does not fit below the output Nyquist "
+                             f"after decimation by {factor}")
+        self.factor = int(factor)
+        self.passband = passband
+        self.stages = []
+        scale = 1
+        for stage_factor in stages:
+            taps = design_stage(stage_factor, passband * scale, method, attenuation)
+            self.stages.append(PolyphaseDecimator(taps, stage_factor))
+            scale *= stage_factor
+
+    @property
+    def delay(self):
+        """
+        Group delay of the cascade in input samples (all stages are linear phase).
+        """
+        delay, scale = 0.0, 1
+        for stage in self.stages:
+            delay += stage.overlap / 2 * scale
+            scale *= stage.factor
+        return delay
+
+    def reset(self, initial=None):
+        for stage in self.stages:
+            stage.reset(initial)
+
+    @instrument('filter.decimation', samples_arg=1)
+    def process(self, block):
+        """
+        Decimates the next block of shape (channels, samples) or (samples,).
+        """
+        for stage in self.stages:
+            block = stage.process(block)
+        return block
+
+    def response(self, freqs):
+        """
+        Combined response of the cascade at the input rate.
+
+        Parameters:
+        - freqs: Frequencies as a fraction of the input Nyquist.
+
+        Returns the complex response; by the noble identity, stage s acts as
+        its filter evaluated at freqs times the factors before it.
+        """
+        freqs = np.asarray(freqs, dtype=float)
+        response = np.ones(freqs.shape, dtype=complex)
+        scale = 1
+        for stage in self.stages:
+            _, h = freqz(stage.taps, worN=np.pi * ((freqs * scale) % 2.0))
+            response *= h
+            scale *= stage.factor
+        return response
+
+    def aliasing(self, num_points=4096):
+        """
+        Measured quality of the cascade.
+
+        Returns a dict with 'aliasing_db', the worst gain (relative to DC)
+        of any input frequency that lands in the output passband after
+        downsampling, 'passband_ripple_db', the peak-to-peak gain variation
+        over the passband, and 'delay', the group delay in input samples.
+        """
+        passband = np.linspace(0.0, self.passband, num_points)
+        dc = abs(self.response(np.zeros(1))[0])
+        gain = np.abs(self.response(passband)) / dc
+        # Frequencies folding onto the passband: 2k / factor +- f, up to the input Nyquist
+        centres = 2.0 * np.arange(1, self.factor // 2 + 1) / self.factor
+        images = np.concatenate([centres[:, None] - passband, centres[:, None] + passband]).ravel()
+        images = images[images <= 1.0]
+        worst = np.max(np.abs(self.response(images))) / dc if len(images) else 0.0
+        return {
+            'aliasing_db': float(20 * np.log10(max(worst, 1e-15))),
+            'passband_ripple_db': float(20 * np.log10(gain.max() / gain.min())),
+            'delay': self.delay,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Design a multi-stage decimator and check its aliasing.")
+    parser.add_argument('--factor', type=int, default=8)
+    parser.add_argument('--passband', type=float, default=None,
+                        help="Fraction of the input Nyquist kept (default: from the factor)")
+    parser.add_argument('--method', choices=DECIMATION_DESIGNS, default='kaiser')
+    parser.add_argument('--attenuation', type=float, default=DEFAULT_ATTENUATION)
+    parser.add_argument('--block-size', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    decimator = MultistageDecimator(args.factor, args.passband, args.method, args.attenuation)
+    passband = decimator.passband
+    quality = decimator.aliasing()
+    print(f"Stages {[stage.factor for stage in decimator.stages]} with "
+          f"{[len(stage.taps) for stage in decimator.stages]} taps, delay {quality['delay']:.1f} samples")
+    print(f"Predicted aliasing {quality['aliasing_db']:.1f} dB, passband ripple "
+          f"{quality['passband_ripple_db']:.3f} dB")
+
+    # Check the prediction with tones: one in the passband, one at its worst image
+    n = 1 << 16
+    t = np.arange(n)
+    in_band = 0.5 * passband
+    image = 2.0 / args.factor - in_band
+    signals = np.stack([np.cos(np.pi * in_band * t), np.cos(np.pi * image * t)])
+    out = np.concatenate([decimator.process(signals[:, start:start + args.block_size])
+                          for start in range(0, n, args.block_size)], axis=1)
+    settled = out[:, int(decimator.delay / args.factor) + 1:]
+    levels = np.sqrt(2 * np.mean(settled ** 2, axis=1))
+    print(f"Tone at {image:.4f} x Nyquist folds to {in_band:.4f}: measured "
+          f"{20 * np.log10(levels[1] / levels[0]):.1f} dB relative to the passband tone")
+
+    # Same output however the input is split
+    decimator.reset()
+    whole = decimator.process(signals)
+    print(f"Block-split output matches single pass: {np.allclose(whole, out)}")
+
+
+if __name__ == "__main__":
+    main()
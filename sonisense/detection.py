@@ -0,0 +1,284 @@
+"""
+Sound-event detection ahead of localisation.
+
+`StaLta` keeps a short-term and a long-term average of the signal energy for
+every mic. Both are one-pole recursive filters run through `lfilter`, so the
+cost per sample is constant and the state carries across blocks. The long
+term average starts from the idle noise variance in the calibration
+profile, and the DC offset is taken from the same profile, so the detector
+is usable from the first block. Without a profile the first LTA window of
+samples is a warm-up: the DC offset and both averages are seeded from it
+and nothing triggers until it has passed, so the result does not depend
+on how the stream is cut into blocks.
+
+`EventDetector` turns the STA/LTA ratio into events with hysteresis
+(trigger above `on`, release below `off`), merges events that are close
+together and only reports an event once its post-roll has been recorded.
+`pipeline.EventStage` plugs this into the pipeline (`--detector stalta`):
+it cuts each event, with pre- and post-roll, out of the acquisition ring
+buffer, so the localiser only runs on candidate windows.
+
+Usage:
+    python -m sonisense.detection --calibration profile.json mic1.csv mic2.csv mic3.csv
+"""
+
+import argparse
+from collections import namedtuple
+
+import numpy as np
+from scipy.signal import lfilter
+
+from .instrumentation import instrument
+
+DEFAULT_STA = 0.05
+DEFAULT_LTA = 5.0
+DEFAULT_ON = 4.0
+DEFAULT_OFF = 1.5
+DEFAULT_PRE_ROLL = 0.1
+DEFAULT_POST_ROLL = 0.2
+DEFAULT_MAX_DURATION = 2.0
+
+Event = namedtuple('Event', ['start', 'stop', 'peak_ratio'])
+
+
+class _Average:
+    """
+    Per-channel exponential average y[n] = a x[n] + (1 - a) y[n - 1].
+    """
+
+    def __init__(self, samples, initial):
+        self.alpha = 1.0 / max(samples, 1.0)
+        self.b = np.array([self.alpha])
+        self.a = np.array([1.0, self.alpha - 1.0])
+        self.value = np.asarray(initial, dtype=float).reshape(-1, 1)
+
+    def update(self, x):
+        if x.shape[-1] == 0:
+            return x  # lfilter hands back an uninitialised state for empty input
+        y, zf = lfilter(self.b, self.a, x, axis=-1, zi=(1.0 - self.alpha) * self.value)
+        self.value = zf / (1.0 - self.alpha) if self.alpha < 1.0 else y[:, -1:]
+        return y
+
+
+class StaLta:
+    """
+    Recursive STA/LTA energy ratio for multi-channel blocks.
+
+    Parameters:
+    - sample_rate: Sample rate in Hz.
+    - channels: Number of mics.
+    - sta, lta: Short- and long-term averaging times in seconds.
+    - calibration: Optional `CalibrationProfile`; its DC offsets are removed
+      and its noise variance seeds the long-term average. Without one, the
+      DC offset is tracked with the long-term time constant and it and both
+      averages are seeded from the first `lta` seconds, over which the ratio
+      is held at 1.
+    """
+
+    def __init__(self, sample_rate, channels, sta=DEFAULT_STA, lta=DEFAULT_LTA, calibration=None):
+        self.sample_rate = float(sample_rate)
+        self.channels = channels
+        self._sta_samples = sta * self.sample_rate
+        self._lta_samples = lta * self.sample_rate
+        self._dc = None
+        self._sta = self._lta = None
+        self._warmup = max(int(round(self._lta_samples)), 1)
+        self._held = []  # Warm-up blocks kept until one LTA window has been seen
+        if calibration is not None:
+            self.dc_offsets = calibration.dc_offsets()[:, None]
+            noise = calibration.noise_std() ** 2
+            self._sta = _Average(self._sta_samples, noise)
+            self._lta = _Average(self._lta_samples, noise)
+        else:
+            self.dc_offsets = None
+
+    def process(self, block):
+        """
+        Returns the STA/LTA ratio (mean over mics) for every sample of a
+        (channels, samples) block.
+        """
+        block = np.asarray(block, dtype=float)
+        if self.dc_offsets is not None:
+            return self._ratio(block - self.dc_offsets)
+        if self._dc is not None:
+            return self._ratio(block - self._dc.update(block))
+
+        self._held.append(block)
+        held = sum(part.shape[1] for part in self._held)
+        if held < self._warmup:
+            return np.ones(block.shape[1])
+        # The window is complete: seed from it, run it through the averages and carry on with the rest
+        samples = np.concatenate(self._held, axis=1)
+        self._held = []
+        warmup, rest = samples[:, :self._warmup], samples[:, self._warmup:]
+        self._dc = _Average(self._lta_samples, warmup.mean(axis=1))
+        energy = (warmup - self._dc.update(warmup)) ** 2
+        initial = np.maximum(energy.mean(axis=1), 1e-12)
+        self._sta = _Average(self._sta_samples, initial)
+        self._lta = _Average(self._lta_samples, initial)
+        self._sta.update(energy)
+        self._lta.update(energy)
+        in_block = block.shape[1] - rest.shape[1]
+        return np.concatenate([np.ones(in_block), self._ratio(rest - self._dc.update(rest))])
+
+    def _ratio(self, centred):
+        energy = centred ** 2
+        sta = self._sta.update(energy)
+        lta = self._lta.update(energy)
+        return np.mean(sta / np.maximum(lta, 1e-12), axis=0)
+
+
+class EventDetector:
+    """
+    Hysteresis trigger on the STA/LTA ratio with pre/post-roll bookkeeping.
+
+    Parameters:
+    - sample_rate: Sample rate in Hz.
+    - channels: Number of mics.
+    - calibration: Optional `CalibrationProfile` for the baseline.
+    - sta, lta: Averaging times in seconds.
+    - on, off: Trigger and release thresholds on the ratio.
+    - pre_roll, post_roll: Seconds kept before the trigger and after the release.
+    - min_duration: Events shorter than this (seconds) are discarded.
+    - max_duration: Events are cut at this length (seconds).
+
+    Positions are absolute sample counts, matching `RingBuffer.position`.
+    """
+
+    def __init__(self, sample_rate, channels, calibration=None, sta=DEFAULT_STA, lta=DEFAULT_LTA, on=DEFAULT_ON,
+                 off=DEFAULT_OFF, pre_roll=DEFAULT_PRE_ROLL, post_roll=DEFAULT_POST_ROLL, min_duration=0.0,
+                 max_duration=DEFAULT_MAX_DURATION):
+        if off > on:
+            raise ValueError("The release threshold must not exceed the trigger threshold")
+        self.sample_rate = float(sample_rate)
+        self.sta_lta = StaLta(sample_rate, channels, sta, lta, calibration)
+        self.on = on
+        self.off = off
+        self.pre_roll = int(round(pre_roll * self.sample_rate))
+        self.post_roll = int(round(post_roll * self.sample_rate))
+        self.min_length = int(round(min_duration * self.sample_rate))
+        self.max_length = int(round(max_duration * self.sample_rate))
+        self.position = 0
+        self._start = None
+        self._peak = 0.0
+        self._pending = []
+
+    def _close(self, stop):
+        if stop - self._start >= self.min_length:
+            previous = self._pending[-1] if self._pending else None
+            if (previous is not None and self._start - previous.stop <= self.pre_roll + self.post_roll
+                    and stop - previous.start <= self.max_length):
+                # Close enough that the windows would overlap: report one event
+                self._pending[-1] = Event(previous.start, stop, max(previous.peak_ratio, self._peak))
+            else:
+                self._pending.append(Event(self._start, stop, self._peak))
+        self._start = None
+        self._peak = 0.0
+
+    @instrument('detect.events', samples_arg=1)
+    def process(self, block, position=None):
+        """
+        Feeds the next (channels, samples) block.
+
+        Parameters:
+        - block: Raw samples.
+        - position: Absolute position of the first sample; defaults to
+          continuing from the previous block.
+
+        Returns the events whose post-roll is now complete.
+        """
+        if position is not None:
+            self.position = position
+        ratio = self.sta_lta.process(block)
+        base = self.position
+        n = len(ratio)
+
+        # Jump from transition to transition rather than stepping per sample
+        i = 0
+        while i < n:
+            if self._start is None:
+                above = np.flatnonzero(ratio[i:] > self.on)
+                if len(above) == 0:
+                    break
+                i += int(above[0])
+                self._start = base + i
+            limit = min(n, self._start + self.max_length - base)
+            below = np.flatnonzero(ratio[i:limit] < self.off)
+            end = i + int(below[0]) if len(below) else limit
+            self._peak = max(self._peak, float(ratio[i:end].max(initial=0.0)))
+            if end == n and len(below) == 0:
+                break  # Still active at the end of the block
+            self._close(base + end)
+            i = end
+        self.position = base + n
+
+        ready = [event for event in self._pending if event.stop + self.post_roll <= self.position]
+        if ready and len(ready) == len(self._pending) and self._start is not None:
+            if self._start - ready[-1].stop <= self.pre_roll + self.post_roll:
+                ready.pop()  # May still merge with the open event
+        self._pending = self._pending[len(ready):]
+        return ready
+
+    def flush(self):
+        """
+        Ends the stream: closes an open event and returns every event still
+        waiting for its post-roll.
+        """
+        if self._start is not None:
+            self._close(self.position)
+        ready, self._pending = self._pending, []
+        return ready
+
+    def window(self, event):
+        """
+        Returns the absolute [start, stop) range of an event including pre/post-roll.
+        """
+        return max(event.start - self.pre_roll, 0), event.stop + self.post_roll
+
+
+def detect_events(signals, sample_rate, calibration=None, block_size=4096, **params):
+    """
+    Runs the detector over whole (channels, samples) arrays.
+
+    Returns a list of Events with positions in samples.
+    """
+    signals = np.asarray(signals, dtype=float)
+    detector = EventDetector(sample_rate, signals.shape[0], calibration, **params)
+    events = []
+    for start in range(0, signals.shape[1], block_size):
+        events.extend(detector.process(signals[:, start:start + block_size]))
+    events.extend(detector.flush())
+    return events
+
+
+def main(argv=None):
+    from .calibration import CalibrationProfile, iter_csv_chunks
+    from .timebase import fit_clock
+
+    parser = argparse.ArgumentParser(description="Find sound events in per-mic capture CSVs.")
+    parser.add_argument('inputs', nargs='*', help="One CSV per mic (the idle captures by default)")
+    parser.add_argument('--calibration', default=None, help="Calibration profile JSON for the baseline")
+    parser.add_argument('--on', type=float, default=DEFAULT_ON)
+    parser.add_argument('--off', type=float, default=DEFAULT_OFF)
+    parser.add_argument('--sta', type=float, default=DEFAULT_STA)
+    parser.add_argument('--lta', type=float, default=DEFAULT_LTA)
+    args = parser.parse_args(argv)
+
+    if not args.inputs:
+        from .acquisition import IDLE_CAPTURES
+        args.inputs = IDLE_CAPTURES
+    columns = [[np.concatenate(parts) for parts in zip(*iter_csv_chunks(path))] for path in args.inputs]
+    length = min(len(values) for _, values in columns)
+    signals = np.stack([values[:length] for _, values in columns])
+    sample_rate = fit_clock(columns[0][0]).sample_rate
+    calibration = CalibrationProfile.load(args.calibration) if args.calibration else None
+
+    events = detect_events(signals, sample_rate, calibration, on=args.on, off=args.off, sta=args.sta, lta=args.lta)
+    print(f"{len(events)} events in {length / sample_rate:.1f} s at {sample_rate:.1f} Hz")
+    for event in events:
+        print(f"  {event.start / sample_rate:8.3f} s - {event.stop / sample_rate:8.3f} s, "
+              f"peak STA/LTA {event.peak_ratio:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+FIR low-pass designs used across the SoniSense processing chain.
+
+These are the four designs trialled in `Algorithim Tests/` lifted out of the
+plotting scripts so the live pipeline can reuse them. Cutoffs are given as a
+fraction of the Nyquist frequency (the scipy convention), and each method's
+defaults reproduce the coefficients of the original script exactly.
+
+`design_filter` is the single entry point. Designs are memoized in memory and
+in an on-disk `.npz` cache keyed by the method and its full parameter set, so
+sweeps and pipeline restarts never redesign a filter that was already built.
+"""
+
+import functools
+import hashlib
+import inspect
+import os
+
+import numpy as np
+from scipy.fft import ifft
+from scipy.signal import firwin
+
+
+def sinc_hamming(num_taps=21, cutoff=0.2):
+    """
+    Windowed-sinc low-pass (1st algorithm).
+
+    Parameters:
+    - num_taps: Number of taps (filter order + 1).
+    - cutoff: Cutoff as a fraction of Nyquist. The script's f_c = 0.1 was in
+      cycles/sample, which is 0.2 of Nyquist.
+    """
+    f_c = cutoff / 2.0
+    n = np.arange(num_taps)
+    h = np.sinc(2 * f_c * (n - (num_taps - 1) / 2)) * np.hamming(num_taps)
+    return h / np.sum(h)  # Unity gain at DC
+
+
+def kaiser(num_taps=51, cutoff=0.1, beta=8.6):
+    """
+    Kaiser-window low-pass designed with firwin (2nd algorithm).
+
+    Parameters:
+    - num_taps: Number of taps.
+    - cutoff: Cutoff as a fraction of Nyquist.
+    - beta: Kaiser window shape parameter.
+    """
+    return firwin(num_taps, cutoff=cutoff, window=('kaiser', beta), pass_zero=True)
+
+
+def frequency_sampling(num_taps=51, cutoff=0.2):
+    """
+    Frequency-sampling low-pass via an inverse DFT (3rd algorithm).
+
+    The response is 1 for the first `cutoff * (num_taps // 2)` bins (mirrored
+    for real coefficients) and 0 elsewhere. As in the original script the
+    taps are not circularly shifted, so the impulse response is zero-phase
+    wrapped around index 0.
+
+    Parameters:
+    - num_taps: Number of taps (filter length).
+    - cutoff: Passband edge as a fraction of Nyquist.
+    """
+    freq_response = np.zeros(num_taps, dtype=complex)
+    passband_end = int(cutoff * (num_taps // 2))
+    freq_response[:passband_end] = 1
+    freq_response[-passband_end:] = 1  # Symmetric for real coefficients
+    return np.real(ifft(freq_response))
+
+
+def gaussian(num_taps=21, std_dev=3.0):
+    """
+    Normalised Gaussian smoothing kernel (4th algorithm).
+
+    Parameters:
+    - num_taps: Number of taps.
+    - std_dev: Standard deviation of the kernel in samples.
+    """
+    n = np.arange(0, num_taps) - (num_taps - 1) / 2
+    window = np.exp(-0.5 * (n / std_dev) ** 2)
+    return window / np.sum(window)
+
+
+FILTER_DESIGNS = {
+    'sinc_hamming': sinc_hamming,
+    'kaiser': kaiser,
+    'frequency_sampling': frequency_sampling,
+    'gaussian': gaussian,
+}
+
+
+# On-disk cache location, overridable for tests or read-only installs
+CACHE_DIR = os.environ.get(
+    'SONISENSE_FILTER_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'sonisense', 'filters'),
+)
+MEMORY_CACHE_SIZE = 256
+
+
+def _cache_key(method, params):
+    """
+    Binds the parameters against the design signature so that defaults and
+    spelling (0.1 vs 0.10, 51 vs 51.0) do not produce distinct cache entries.
+    """
+    try:
+        design = FILTER_DESIGNS[method]
+    except KeyError:
+        raise ValueError(f"Unknown filter design '{method}', expected one of {sorted(FILTER_DESIGNS)}")
+    bound = inspect.signature(design).bind(**params)
+    bound.apply_defaults()
+
+    items = []
+    for name, value in bound.arguments.items():
+        if name == 'num_taps':
+            value = int(value)
+        elif isinstance(value, (int, float, np.number)):
+            value = float(value)
+        items.append((name, value))
+    return tuple(items)
+
+
+def _cache_path(method, key):
+    digest = hashlib.sha1(repr((method, key)).encode()).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f"{method}_{digest}.npz")
+
+
+@functools.lru_cache(maxsize=MEMORY_CACHE_SIZE)
+def _design_cached(method, key, use_disk):
+    path = _cache_path(method, key)
+    if use_disk and os.path.exists(path):
+        try:
+            with np.load(path) as cached:
+                taps = cached['taps']
+        except (OSError, ValueError, KeyError):
+            taps = None  # Corrupt or foreign file, redesign and overwrite it
+        if taps is not None:
+            taps.setflags(write=False)
+            return taps
+
+    taps = np.asarray(FILTER_DESIGNS[method](**dict(key)), dtype=float)
+    taps.setflags(write=False)
+
+    if use_disk:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+            np.savez(tmp_path, taps=taps, method=method, params=repr(key))
+            os.replace(tmp_path, path)  # Atomic, so concurrent writers never leave a torn file
+        except OSError:
+            pass  # The disk cache is an optimisation only
+    return taps
+
+
+def design_filter(method, cache=True, **params):
+    """
+    Returns the FIR taps for one of the `FILTER_DESIGNS` methods.
+
+    The returned array is shared between callers and is read-only; copy it
+    before modifying.
+
+    Parameters:
+    - method: Name of the design (e.g. 'kaiser').
+    - cache: 'memory' to skip the on-disk cache, False to always redesign.
+    - params: Keyword arguments forwarded to the design function. Anything
+      left out takes the default of the original algorithm script.
+    """
+    key = _cache_key(method, params)
+    if not cache:
+        return np.asarray(FILTER_DESIGNS[method](**dict(key)), dtype=float)
+    return _design_cached(method, key, cache != 'memory')
+
+
+def clear_filter_cache(disk=False):
+    """
+    Empties the in-memory design cache, and the on-disk one when `disk` is True.
+    """
+    _design_cached.cache_clear()
+    if disk and os.path.isdir(CACHE_DIR):
+        for name in os.listdir(CACHE_DIR):
+            if name.endswith('.npz'):
+                os.remove(os.path.join(CACHE_DIR, name))
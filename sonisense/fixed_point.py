@@ -0,0 +1,265 @@
+"""
+Fixed-point FIR filtering that mirrors the integer arithmetic of the ESP32.
+
+The mics deliver 12-bit ADC codes (0-4095), and the reference output in
+`Algorithim Tests/.../original_filter.csv` is integer too, while the
+designs in `filter_design` are float64. `quantize_taps` converts any of
+the designs to Q15 or Q31 coefficients. `QuantizedFIR` then runs the
+filter the way firmware does: an integer multiply-accumulate into an int32
+(Q15) or int64 (Q31) accumulator, one vectorised pass per tap over every
+channel, then a shift back to the sample scale. The simulation is exact
+for the integer model, so any difference from the device comes from the
+model itself, not from floating-point noise.
+
+The integer path is there to be bit-exact with the device, not to be
+fast: numpy widens every block to the accumulator type, so on the host it
+runs at about the speed of the float64 `StreamingFIR`.
+
+`reference_check` replays `original_filter.csv` through the engine and
+reports how many samples it reproduces exactly. The reference matches the
+windowed-sinc design with 21 taps and a cutoff of 0.1 x Nyquist (the
+script's f_c halved), with the output one sample ahead of the input.
+
+Usage:
+    python -m sonisense.fixed_point
+    python -m sonisense.fixed_point --method kaiser --q 31
+"""
+
+import argparse
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from .filter_design import FILTER_DESIGNS, design_filter
+from .instrumentation import instrument
+
+ORIGINAL_FILTER_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Algorithim Tests',
+                                   'idle mic data [idle environment used for callibration]', 'original_filter.csv')
+# The firmware filter recovered from original_filter.csv
+REFERENCE_DESIGN = ('sinc_hamming', {'num_taps': 21, 'cutoff': 0.1})
+ADC_MAX = 4095
+FORMATS = {15: (np.int16, np.int32), 31: (np.int32, np.int64)}  # Q -> (tap dtype, accumulator dtype)
+ROUNDING = ('floor', 'round')
+CHUNK_SIZE = 4096  # Samples per channel accumulated at a time
+
+ReferenceMatch = namedtuple('ReferenceMatch', ['method', 'params', 'q', 'rounding', 'lag', 'exact', 'max_error',
+                                               'rms_error'])
+
+
+def quantize_taps(taps, q=15):
+    """
+    Rounds float taps to signed Qq integers (q = 15 or 31).
+
+    Raises ValueError when a tap falls outside the [-1, 1) range of the format.
+    """
+    if q not in FORMATS:
+        raise ValueError(f"Unsupported Q format Q{q}, expected one of {sorted(FORMATS)}")
+    tap_dtype = FORMATS[q][0]
+    scaled = np.round(np.asarray(taps, dtype=float) * (1 << q))
+    info = np.iinfo(tap_dtype)
+    if scaled.min() < info.min or scaled.max() > info.max:
+        raise ValueError(f"Taps outside the Q{q} range [-1, 1)")
+    return scaled.astype(tap_dtype)
+
+
+class QuantizedFIR:
+    """
+    Stateful integer FIR for blocks of shape (channels, samples).
+
+    Parameters:
+    - taps: Float taps (quantized here) or a `filter_design` method name.
+    - q: 15 (int16 taps, int32 accumulator) or 31 (int32 taps, int64 accumulator).
+    - rounding: 'floor' (arithmetic shift, what a bare `>>` does) or 'round'
+      (add half an LSB before the shift).
+    - input_max: Largest input magnitude, used to prove the accumulator
+      cannot overflow. Defaults to the 12-bit ADC range.
+    - out_dtype: Output integer type; results are saturated to its range.
+    - params: Design parameters when `taps` is a method name.
+    """
+
+    def __init__(self, taps, q=15, rounding='floor', input_max=ADC_MAX, out_dtype=np.int16, **params):
+        if isinstance(taps, str):
+            taps = design_filter(taps, **params)
+        if rounding not in ROUNDING:
+            raise ValueError(f"Unknown rounding '{rounding}', expected one of {list(ROUNDING)}")
+        self.float_taps = np.asarray(taps, dtype=float)
+        self.taps = quantize_taps(self.float_taps, q)
+        self.q = q
+        self.rounding = rounding
+        self.acc_dtype = FORMATS[q][1]
+        self.out_dtype = np.dtype(out_dtype)
+        self.overlap = len(self.taps) - 1
+
+        # Worst case |sum h x| must fit the accumulator, as on the device
+        bound = int(input_max) * int(np.abs(self.taps.astype(np.int64)).sum())
+        if bound > np.iinfo(self.acc_dtype).max:
+            raise ValueError(f"Inputs up to {input_max} can overflow the {np.dtype(self.acc_dtype).name} "
+                             f"accumulator of Q{q}")
+        self._taps_acc = self.taps.astype(self.acc_dtype)
+        self._half = self.acc_dtype(1 << (q - 1)) if rounding == 'round' else self.acc_dtype(0)
+        # (tap, mirrored tap or None) for every non-zero tap
+        symmetric = np.array_equal(self.taps, self.taps[::-1])
+        taps = range((len(self.taps) + 1) // 2) if symmetric else range(len(self.taps))
+        self._schedule = [(k, len(self.taps) - 1 - k if symmetric and 2 * k != self.overlap else None)
+                          for k in taps if self.taps[k]]
+        self._history = None
+
+    @property
+    def quantization_error(self):
+        """
+        Largest absolute difference between the float and quantized taps.
+        """
+        return float(np.abs(self.taps / float(1 << self.q) - self.float_taps).max())
+
+    def reset(self, initial=None):
+        """
+        Clears the history, or fills it with a per-channel integer value held forever.
+        """
+        if initial is None:
+            self._history = None
+            return
+        initial = np.atleast_1d(np.asarray(initial)).astype(self.acc_dtype)[:, None]
+        self._history = np.repeat(initial, self.overlap, axis=1)
+
+    @instrument('filter.fixed_point', samples_arg=1)
+    def process(self, block):
+        """
+        Filters the next integer block.
+
+        Parameters:
+        - block: Integer array of shape (channels, samples) or (samples,).
+
+        Returns the filtered block in `out_dtype`, same shape.
+        """
+        block = np.asarray(block)
+        if not np.issubdtype(block.dtype, np.integer):
+            raise TypeError(f"QuantizedFIR takes integer samples, got {block.dtype}")
+        squeeze = block.ndim == 1
+        if squeeze:
+            block = block[None, :]
+
+        if self._history is None:
+            self._history = np.zeros((block.shape[0], self.overlap), dtype=self.acc_dtype)
+        elif self._history.shape[0] != block.shape[0]:
+            raise ValueError(f"Expected {self._history.shape[0]} channels, got {block.shape[0]}")
+
+        length = block.shape[1]
+        buffer = np.concatenate([self._history, block.astype(self.acc_dtype)], axis=1)
+        out = np.empty((block.shape[0], length), dtype=self.out_dtype)
+        # Work in cache-sized chunks so the accumulator never leaves the cache
+        for chunk in range(0, length, CHUNK_SIZE):
+            self._accumulate(buffer, chunk, min(CHUNK_SIZE, length - chunk), out)
+        self._history = buffer[:, length:].copy()
+        return out[0] if squeeze else out
+
+    def _accumulate(self, buffer, offset, length, out):
+        # One multiply-accumulate per tap across all channels, as the MAC loop does.
+        # Linear-phase taps are folded so mirrored samples share one multiply.
+        acc = np.full((buffer.shape[0], length), self._half, dtype=self.acc_dtype)
+        product = np.empty_like(acc)
+        for k, pair in self._schedule:
+            start = offset + self.overlap - k
+            np.copyto(product, buffer[:, start:start + length])
+            if pair is not None:
+                start = offset + self.overlap - pair
+                product += buffer[:, start:start + length]
+            product *= self._taps_acc[k]
+            acc += product
+        np.right_shift(acc, self.q, out=acc)
+        info = np.iinfo(self.out_dtype)
+        np.clip(acc, info.min, info.max, out=acc)
+        out[:, offset:offset + length] = acc
+
+
+def load_reference(path=ORIGINAL_FILTER_CSV):
+    """
+    Returns (original, filtered) int64 arrays from original_filter.csv.
+    """
+    data = np.loadtxt(path, delimiter=',', skiprows=1, dtype=np.int64)
+    return data[:, 0], data[:, 1]
+
+
+def reference_check(method=None, params=None, q=15, path=ORIGINAL_FILTER_CSV, max_lag=2):
+    """
+    Compares the integer engine against the device output in original_filter.csv.
+
+    Every rounding mode and output alignment up to `max_lag` samples (in
+    either direction) is tried, and the one reproducing most samples exactly
+    is returned.
+
+    Parameters:
+    - method, params: Design to check; the recovered firmware filter by default.
+    - q: 15 or 31.
+
+    Returns a ReferenceMatch; `exact` is the fraction of samples equal to
+    the device output and the errors are in ADC codes.
+    """
+    if method is None:
+        method, params = REFERENCE_DESIGN
+    params = dict(params or {})
+    original, filtered = load_reference(path)
+    best = None
+    for rounding in ROUNDING:
+        output = QuantizedFIR(method, q=q, rounding=rounding, out_dtype=np.int32, **params).process(original)
+        output = output.astype(np.int64)
+        for lag in range(-max_lag, max_lag + 1):
+            # Positive lag: the device output trails the simulation by `lag` samples
+            if lag >= 0:
+                ours, theirs = output[:len(output) - lag], filtered[lag:]
+            else:
+                ours, theirs = output[-lag:], filtered[:lag]
+            error = ours - theirs
+            match = ReferenceMatch(method, params, q, rounding, lag, float(np.mean(error == 0)),
+                                   int(np.abs(error).max()), float(np.sqrt(np.mean(error.astype(float) ** 2))))
+            if best is None or match.exact > best.exact:
+                best = match
+    return best
+
+
+def main(argv=None):
+    from .streaming import StreamingFIR
+
+    parser = argparse.ArgumentParser(description="Check the fixed-point filter against the device output.")
+    parser.add_argument('--method', choices=sorted(FILTER_DESIGNS), default=None,
+                        help="Design to check (default: the recovered firmware filter)")
+    parser.add_argument('--q', type=int, choices=sorted(FORMATS), default=None, help="Only this Q format")
+    parser.add_argument('--samples', type=int, default=1_000_000, help="Samples per channel for the timing run")
+    args = parser.parse_args(argv)
+
+    formats = [args.q] if args.q else sorted(FORMATS)
+    if args.method is None:
+        candidates = [REFERENCE_DESIGN] + [(method, {}) for method in sorted(FILTER_DESIGNS)]
+    else:
+        candidates = [(args.method, {})]
+    for method, params in candidates:
+        for q in formats:
+            try:
+                match = reference_check(method, params, q)
+            except ValueError as e:
+                print(f"{method} {params} Q{q}: {e}")
+                continue
+            print(f"{method} {params} Q{q}: {match.exact:.1%} exact ({match.rounding}, lag {match.lag}), "
+                  f"max error {match.max_error}, rms {match.rms_error:.3f} codes")
+
+    # Integer versus float path on three channels of ADC codes
+    method, params = (args.method, {}) if args.method else REFERENCE_DESIGN
+    rng = np.random.default_rng(0)
+    codes = rng.integers(0, ADC_MAX + 1, size=(3, args.samples), dtype=np.uint16)
+    for q in formats:
+        engine = QuantizedFIR(method, q=q, **params)
+        start = time.perf_counter()
+        out = engine.process(codes)
+        elapsed = time.perf_counter() - start
+        print(f"Q{q}: {elapsed * 1000.0:.1f} ms, {(codes.nbytes + out.nbytes) / 1e6:.1f} MB in+out")
+    floats = codes.astype(float)
+    engine = StreamingFIR(design_filter(method, **params), method='direct')
+    start = time.perf_counter()
+    out = engine.process(floats)
+    elapsed = time.perf_counter() - start
+    print(f"float64: {elapsed * 1000.0:.1f} ms, {(floats.nbytes + out.nbytes) / 1e6:.1f} MB in+out")
+
+
+if __name__ == "__main__":
+    main()
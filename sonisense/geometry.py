@@ -0,0 +1,63 @@
+"""
+Microphone array geometry for the SoniSense boards.
+
+The schematics do not record the physical placement of Q1-Q3, so the default
+layout is an equilateral triangle centred on the board origin with mic 1 on
+the +x axis. Pass explicit positions wherever a measured layout is known.
+"""
+
+import itertools
+
+import numpy as np
+
+SPEED_OF_SOUND = 343.0  # m/s at ~20 C
+DEFAULT_MIC_SPACING = 0.06  # Side of the triangle in metres
+
+
+def triangle_positions(spacing=DEFAULT_MIC_SPACING):
+    """
+    Returns the (3, 2) x/y positions in metres of three mics on an
+    equilateral triangle with the given side length.
+    """
+    radius = spacing / np.sqrt(3)
+    angles = np.deg2rad([0.0, 120.0, 240.0])
+    return np.stack([radius * np.cos(angles), radius * np.sin(angles)], axis=1)
+
+
+def mic_pairs(num_mics):
+    """
+    Returns the (P, 2) array of index pairs (i, j), i < j, used for TDOAs.
+    """
+    return np.array(list(itertools.combinations(range(num_mics), 2)), dtype=int)
+
+
+def max_pair_delay(positions, speed_of_sound=SPEED_OF_SOUND):
+    """
+    Returns the largest physically possible TDOA over all pairs in seconds.
+    """
+    positions = np.asarray(positions, dtype=float)
+    pairs = mic_pairs(len(positions))
+    spans = np.linalg.norm(positions[pairs[:, 0]] - positions[pairs[:, 1]], axis=1)
+    return spans.max() / speed_of_sound
+
+
+def far_field_delays(positions, azimuths, speed_of_sound=SPEED_OF_SOUND):
+    """
+    Expected pairwise TDOAs for plane waves arriving from the given azimuths.
+
+    The delay of pair (i, j) is t_i - t_j, so it is positive when the sound
+    reaches mic i after mic j.
+
+    Parameters:
+    - positions: (M, 2) mic positions in metres.
+    - azimuths: Array of arrival directions in radians, measured from +x.
+
+    Returns an array of shape azimuths.shape + (P,).
+    """
+    positions = np.asarray(positions, dtype=float)
+    azimuths = np.asarray(azimuths, dtype=float)
+    pairs = mic_pairs(len(positions))
+    baselines = positions[pairs[:, 0]] - positions[pairs[:, 1]]  # (P, 2)
+    directions = np.stack([np.cos(azimuths), np.sin(azimuths)], axis=-1)
+    # A mic further along the arrival direction hears the wavefront earlier
+    return -(directions @ baselines.T) / speed_of_sound
@@ -0,0 +1,233 @@
+"""
+Bulk ingest of spreadsheet/CSV captures into binary column files.
+
+`ingest` streams one numeric column out of an Excel or CSV file in chunks,
+coerces it to float with a vectorized `pd.to_numeric`, applies an optional
+value band and appends it to a `.npy` file (or Parquet when pyarrow is
+installed) without ever holding the whole sheet in memory. The `.npy` output
+opens memory-mapped with `load_column`. Excel stays available as an export
+for humans via `export_excel`, which refuses to write past the sheet limit.
+
+Usage:
+    python -m sonisense.ingest data.xlsx data.npy --lower 1100 --upper 1500
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from .instrumentation import instrument
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+EXCEL_MAX_ROWS = 1048576
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+
+# Reserved .npy header size, large enough for any 1-D shape
+_NPY_HEADER_SIZE = 128
+
+
+def iter_column_chunks(path, column=0, chunksize=DEFAULT_CHUNK_SIZE, header=None):
+    """
+    Yields raw chunks (object or numeric arrays) of one column of a CSV or Excel file.
+
+    Parameters:
+    - path: .csv, .xlsx or .xlsm file.
+    - column: Zero-based column index.
+    - chunksize: Rows per chunk.
+    - header: Row number of a header to skip, or None when the first row is data.
+    """
+    if os.path.splitext(path)[1].lower() in EXCEL_EXTENSIONS:
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ImportError("Reading Excel files needs openpyxl (pip install openpyxl)")
+
+        # read_only mode streams rows instead of building the whole sheet
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(min_col=column + 1, max_col=column + 1, values_only=True)
+            skip = 0 if header is None else header + 1
+            buffer = []
+            for i, (value,) in enumerate(rows):
+                if i < skip:
+                    continue
+                buffer.append(value)
+                if len(buffer) == chunksize:
+                    yield np.array(buffer, dtype=object)
+                    buffer = []
+            if buffer:
+                yield np.array(buffer, dtype=object)
+        finally:
+            workbook.close()
+    else:
+        reader = pd.read_csv(path, usecols=[column], header=header, chunksize=chunksize)
+        for chunk in reader:
+            yield chunk.iloc[:, 0].values
+
+
+def coerce_numeric(values, lower=None, upper=None):
+    """
+    Converts a raw chunk to float64, dropping empty and non-numeric cells and
+    anything outside [lower, upper].
+    """
+    values = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64)
+    keep = ~np.isnan(values)
+    if lower is not None:
+        keep &= values >= lower
+    if upper is not None:
+        keep &= values <= upper
+    return values[keep]
+
+
+class NpyColumnWriter:
+    """
+    Appends float64 chunks to a 1-D `.npy` file whose length is only known at the end.
+
+    The header is written with reserved space and rewritten with the final
+    shape on close, so the output is a standard `.npy` readable by `np.load`.
+    """
+
+    def __init__(self, path, dtype=np.float64):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self._tmp_path = f"{path}.tmp"
+        self._file = open(self._tmp_path, 'wb')
+        self._write_header()
+
+    def _write_header(self):
+        header = {'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False,
+                  'shape': (self.count,)}
+        text = repr(header).encode('latin1')
+        padding = _NPY_HEADER_SIZE - len(np.lib.format.MAGIC_PREFIX) - 4 - len(text) - 1
+        self._file.seek(0)
+        self._file.write(np.lib.format.magic(1, 0))
+        self._file.write(np.uint16(_NPY_HEADER_SIZE - 10).tobytes())
+        self._file.write(text + b' ' * padding + b'\n')
+
+    def write(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        self._file.write(values.tobytes())
+        self.count += len(values)
+
+    def close(self):
+        self._write_header()
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._tmp_path)
+
+
+class ParquetColumnWriter:
+    """
+    Appends float64 chunks to a single-column Parquet file (needs pyarrow).
+    """
+
+    def __init__(self, path, name='Data'):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output needs pyarrow (pip install pyarrow); use .npy instead")
+        self._pa = pa
+        self.name = name
+        self.count = 0
+        self._writer = pq.ParquetWriter(path, pa.schema([(name, pa.float64())]))
+
+    def write(self, values):
+        self._writer.write_table(self._pa.table({self.name: np.asarray(values, dtype=np.float64)}))
+        self.count += len(values)
+
+    def close(self):
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@instrument('export.ingest')
+def ingest(path, output_path, column=0, lower=None, upper=None, chunksize=DEFAULT_CHUNK_SIZE, header=None):
+    """
+    Streams one numeric column of a CSV/Excel file into a binary column file.
+
+    Parameters:
+    - path: Source .csv, .xlsx or .xlsm file.
+    - output_path: Destination; `.parquet` writes Parquet, anything else `.npy`.
+    - column: Zero-based column index.
+    - lower, upper: Optional inclusive value band to keep.
+    - chunksize: Rows per chunk.
+    - header: Row number of a header to skip, or None when the first row is data.
+
+    Returns the number of values written.
+    """
+    if os.path.splitext(output_path)[1].lower() == '.parquet':
+        writer = ParquetColumnWriter(output_path)
+    else:
+        writer = NpyColumnWriter(output_path)
+
+    with writer:
+        for chunk in iter_column_chunks(path, column, chunksize, header):
+            writer.write(coerce_numeric(chunk, lower, upper))
+    return writer.count
+
+
+def load_column(path):
+    """
+    Loads a column written by `ingest`; `.npy` files are memory-mapped.
+    """
+    if os.path.splitext(path)[1].lower() == '.parquet':
+        import pyarrow.parquet as pq
+        return pq.read_table(path).column(0).to_numpy()
+    return np.load(path, mmap_mode='r')
+
+
+def export_excel(values, path, header=False):
+    """
+    Writes values to a single-column Excel sheet for human inspection.
+
+    Raises ValueError past Excel's row limit; export to CSV or keep the
+    binary file for long captures.
+    """
+    values = np.asarray(values)
+    if len(values) + int(bool(header)) > EXCEL_MAX_ROWS:
+        raise ValueError(f"{len(values)} rows exceed the Excel limit of {EXCEL_MAX_ROWS}; export to CSV instead")
+    pd.DataFrame({'Data': values}).to_excel(path, index=False, header=header)
+
+
+def export_csv(values, path, header=None):
+    """
+    Writes values to a single-column CSV.
+    """
+    np.savetxt(path, np.asarray(values), delimiter=',', fmt='%.10g', header=header or '', comments='')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest one column of a CSV/Excel capture into .npy or Parquet.")
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--column', type=int, default=0)
+    parser.add_argument('--lower', type=float, default=None)
+    parser.add_argument('--upper', type=float, default=None)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--header', type=int, default=None, help="Row number of a header to skip")
+    args = parser.parse_args(argv)
+
+    count = ingest(args.input, args.output, args.column, args.lower, args.upper, args.chunk_size, args.header)
+    print(f"Wrote {count} values to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+"""
+Per-stage timing, throughput and allocation telemetry.
+
+Every processing stage of the package (load, filter, spectral, detect,
+localise, export) is wrapped with `instrument`. While instrumentation is
+enabled, each call records its wall time, the number of samples it was
+given and any error into fixed-bucket histograms in the process-wide
+`REGISTRY`. Disabled, the wrappers cost one flag check per call.
+Recording is a `perf_counter` pair and a bisect into a short bucket list,
+so it can stay on in production.
+
+Two opt-in hooks give more detail at a higher cost:
+
+- `profile=True` runs a `cProfile` profiler for the whole process;
+  `dump_profile` writes its stats for `pstats` or snakeviz.
+- `trace_allocations=True` starts `tracemalloc` (unless something else
+  already runs it, in which case `disable` leaves it running), and every
+  call on the main thread also records the peak memory allocated above its
+  starting point. Nested stages each get their own peak. tracemalloc keeps
+  one peak counter for the whole process, so calls on other threads, such
+  as the pipeline's offloaded stages, record no allocations, and memory
+  other threads allocate during a call is counted in its peak.
+
+`REGISTRY.to_prometheus()` renders the metrics in the Prometheus text
+exposition format and `REGISTRY.to_json()` as a JSON document; `dump`
+picks one from the file extension.
+
+Instrumentation can be switched on without code changes with
+SONISENSE_METRICS=1, or SONISENSE_METRICS=profile,allocations for the hooks
+as well. Worker processes keep their own registries.
+
+Usage:
+    python -m sonisense.instrumentation --format prometheus
+    python -m sonisense.instrumentation --profile profile.pstats --allocations -o metrics.json
+"""
+
+import argparse
+import bisect
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+# Bucket upper bounds: 1 us to 10 s at four per decade, 1 kB to 1 GB at two per decade
+TIME_BUCKETS = tuple(float(f'{bound:.3g}') for bound in np.logspace(-6, 1, 29))
+BYTE_BUCKETS = tuple(float(f'{bound:.3g}') for bound in np.logspace(3, 9, 13))
+QUANTILES = (0.5, 0.9, 0.99)
+METRIC_PREFIX = 'sonisense_stage'
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with count, sum, min and max.
+
+    Parameters:
+    - bounds: Increasing bucket upper bounds; larger values land in an
+      overflow bucket.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """
+        Estimates a quantile from the buckets, interpolating geometrically
+        within the bucket it falls in (clamped to the observed min and max).
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = self.bounds[index - 1] if index else self.min
+                high = self.bounds[index] if index < len(self.bounds) else self.max
+                low, high = max(low, self.min), min(high, self.max)
+                if low <= 0 or high <= low:
+                    return high
+                return low * (high / low) ** ((rank - seen) / count)
+            seen += count
+        return self.max
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count else 0.0,
+            'max': self.max if self.count else 0.0,
+            **{f'p{round(q * 100)}': self.quantile(q) for q in QUANTILES},
+            'buckets': dict(zip([*map(str, self.bounds), '+Inf'], self.counts)),
+        }
+
+
+class StageMetrics:
+    """
+    Calls, errors, samples, wall time and allocations of one stage.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.errors = 0
+        self.samples = 0
+        self.seconds = Histogram(TIME_BUCKETS)
+        self.allocated = Histogram(BYTE_BUCKETS)
+
+    @property
+    def calls(self):
+        return self.seconds.count
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'samples': self.samples,
+            'samples_per_second': self.samples / self.seconds.sum if self.seconds.sum else 0.0,
+            'seconds': self.seconds.as_dict(),
+            'allocated_bytes': self.allocated.as_dict(),
+        }
+
+
+class _Measurement:
+    """
+    Context manager timing one call, and its allocations when traced.
+    """
+
+    __slots__ = ('registry', 'name', 'samples', 'start', 'frame')
+
+    def __init__(self, registry, name, samples):
+        self.registry = registry
+        self.name = name
+        self.samples = samples
+        self.frame = None
+
+    def __enter__(self):
+        if (self.registry.trace_allocations and tracemalloc.is_tracing()
+                and threading.current_thread() is threading.main_thread()):
+            self.frame = self.registry._enter_allocations()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        elapsed = time.perf_counter() - self.start
+        allocated = None if self.frame is None else self.registry._exit_allocations(self.frame)
+        self.registry.observe(self.name, elapsed, self.samples, allocated, error=exc_type is not None)
+        return False
+
+
+class Registry:
+    """
+    Process-wide collection of `StageMetrics`, keyed by stage name.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_allocations = False
+        self.profiler = None
+        self.stages = {}
+        self._profiling = False
+        self._owns_tracemalloc = False
+        self._lock = threading.Lock()
+        self._stack = []  # Open allocation measurements, main thread only
+
+    def enable(self, profile=False, trace_allocations=False):
+        """
+        Starts recording, optionally with the cProfile and tracemalloc hooks.
+        A profiler stopped by `disable` resumes and keeps its earlier stats.
+        """
+        self.enabled = True
+        if profile and not self._profiling:
+            if self.profiler is None:
+                import cProfile
+
+                self.profiler = cProfile.Profile()
+            self.profiler.enable()
+            self._profiling = True
+        if trace_allocations and not self.trace_allocations:
+            self.trace_allocations = True
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owns_tracemalloc = True
+
+    def disable(self):
+        """
+        Stops recording and the hooks; the collected metrics are kept.
+        tracemalloc is only stopped if `enable` started it.
+        """
+        self.enabled = False
+        if self._profiling:
+            self.profiler.disable()
+            self._profiling = False
+        if self.trace_allocations:
+            self.trace_allocations = False
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+                self._owns_tracemalloc = False
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+
+    def stage(self, name):
+        metrics = self.stages.get(name)
+        if metrics is None:
+            with self._lock:
+                metrics = self.stages.setdefault(name, StageMetrics(name))
+        return metrics
+
+    def observe(self, name, seconds, samples=0, allocated=None, error=False):
+        """
+        Records one call of a stage.
+        """
+        metrics = self.stage(name)
+        with self._lock:
+            metrics.seconds.observe(seconds)
+            metrics.samples += samples
+            if error:
+                metrics.errors += 1
+            if allocated is not None:
+                metrics.allocated.observe(allocated)
+
+    def measure(self, name, samples=0):
+        """
+        Context manager recording the enclosed block as one call of `name`;
+        a no-op while disabled.
+        """
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return _Measurement(self, name, samples)
+
+    def _enter_allocations(self):
+        # tracemalloc has one peak counter; each open measurement keeps its own
+        # running peak, folded in whenever a nested measurement resets the counter
+        stack = self._stack
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1][1] = max(stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        frame = [current, current]
+        stack.append(frame)
+        return frame
+
+    def _exit_allocations(self, frame):
+        stack = self._stack
+        peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+        stack.pop()
+        if stack:
+            stack[-1][1] = max(stack[-1][1], peak)
+        return peak - frame[0]
+
+    def snapshot(self):
+        """
+        Returns every stage's metrics as a dict, sorted by stage name.
+        """
+        with self._lock:
+            return {name: self.stages[name].as_dict() for name in sorted(self.stages)}
+
+    def to_json(self):
+        return json.dumps({'timestamp': time.time(), 'pid': os.getpid(), 'stages': self.snapshot()}, indent=2)
+
+    def to_prometheus(self):
+        """
+        Renders the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            stages = [self.stages[name] for name in sorted(self.stages)]
+            for metric, attribute, help_text in (('seconds', 'seconds', 'Wall time per call in seconds.'),
+                                                 ('allocated_bytes', 'allocated',
+                                                  'Peak bytes allocated per call (with allocation tracing).')):
+                observed = [stage for stage in stages if getattr(stage, attribute).count]
+                if not observed:
+                    continue
+                lines += [f'# HELP {METRIC_PREFIX}_{metric} {help_text}', f'# TYPE {METRIC_PREFIX}_{metric} histogram']
+                for stage in observed:
+                    histogram = getattr(stage, attribute)
+                    total = 0
+                    for bound, count in zip([*map(repr, histogram.bounds), '+Inf'], histogram.counts):
+                        total += count
+                        lines.append(f'{METRIC_PREFIX}_{metric}_bucket{{stage="{stage.name}",le="{bound}"}} {total}')
+                    lines.append(f'{METRIC_PREFIX}_{metric}_sum{{stage="{stage.name}"}} {histogram.sum!r}')
+                    lines.append(f'{METRIC_PREFIX}_{metric}_count{{stage="{stage.name}"}} {histogram.count}')
+            for metric, help_text in (('samples', 'Samples processed.'), ('errors', 'Calls that raised.')):
+                lines += [f'# HELP {METRIC_PREFIX}_{metric}_total {help_text}',
+                          f'# TYPE {METRIC_PREFIX}_{metric}_total counter']
+                lines += [f'{METRIC_PREFIX}_{metric}_total{{stage="{stage.name}"}} {getattr(stage, metric)}'
+                          for stage in stages]
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """
+        Writes the metrics to `path`: JSON for `.json`, Prometheus text otherwise.
+        """
+        text = self.to_json() if os.path.splitext(path)[1].lower() == '.json' else self.to_prometheus()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def dump_profile(self, path):
+        """
+        Writes the cProfile statistics collected so far (needs `profile=True`).
+        """
+        if self.profiler is None:
+            raise ValueError("Profiling is off; enable it with enable(profile=True)")
+        self.profiler.dump_stats(path)
+
+
+REGISTRY = Registry()
+
+
+def instrument(name, samples_arg=None):
+    """
+    Decorator recording every call of a function as stage `name` in `REGISTRY`.
+
+    Parameters:
+    - name: Stage name, conventionally '<category>.<stage>' (e.g. 'filter.fir').
+    - samples_arg: Position of the argument whose array size counts as the
+      samples processed (1 for a method's first argument).
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not REGISTRY.enabled:
+                return func(*args, **kwargs)
+            samples = 0
+            if samples_arg is not None and len(args) > samples_arg:
+                samples = int(getattr(args[samples_arg], 'size', 0))
+            with _Measurement(REGISTRY, name, samples):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def measure(name, samples=0):
+    """
+    Context manager recording a block as one call of stage `name` in `REGISTRY`.
+    """
+    return REGISTRY.measure(name, samples)
+
+
+def _enable_from_environment():
+    value = os.environ.get('SONISENSE_METRICS', '').lower()
+    if value and value not in ('0', 'false', 'no'):
+        REGISTRY.enable(profile='profile' in value, trace_allocations='alloc' in value)
+
+
+_enable_from_environment()
+
+
+def main(argv=None):
+    from .filter_design import design_filter
+    from .localisation import Localiser
+    from .simulator import simulate_frames
+    from .spectral import welch_batch
+    from .streaming import StreamingFIR
+
+    parser = argparse.ArgumentParser(description="Run the hot paths once and dump their telemetry.")
+    parser.add_argument('--format', choices=('prometheus', 'json'), default='prometheus')
+    parser.add_argument('-o', '--output', default=None, help="Write the dump here instead of printing it")
+    parser.add_argument('--profile', default=None, help="Also write cProfile stats to this path")
+    parser.add_argument('--allocations', action='store_true', help="Record allocations with tracemalloc")
+    parser.add_argument('--frames', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    REGISTRY.enable(profile=args.profile is not None, trace_allocations=args.allocations)
+    sample_rate = 48000.0
+    rng = np.random.default_rng(0)
+    sources = rng.uniform(-2.0, 2.0, (args.frames, 2))
+    with measure('load.simulate'):
+        frames = simulate_frames(sources, sample_rate, 1024, 'noise', rng=rng).samples
+    fir = StreamingFIR(design_filter('kaiser'))
+    localiser = Localiser(sample_rate)
+    for frame in frames:
+        fir.process(frame.astype(float))
+        localiser.process(frame)
+    welch_batch(frames.astype(float), sample_rate)
+    REGISTRY.disable()
+
+    if args.profile:
+        REGISTRY.dump_profile(args.profile)
+    if args.output:
+        REGISTRY.dump(args.output)
+        print(f"Metrics for {len(REGISTRY.stages)} stages written to {args.output}")
+    else:
+        print(REGISTRY.to_json() if args.format == 'json' else REGISTRY.to_prometheus(), end='')
+
+
+if __name__ == "__main__":
+    # Under -m this module is __main__; register it under its package name before main() imports the
+    # decorated stages, so they report to this REGISTRY instead of loading a second copy
+    sys.modules.setdefault(f'{__package__}.instrumentation', sys.modules[__name__])
+    main()
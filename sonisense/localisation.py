@@ -0,0 +1,269 @@
+"""
+Streaming TDOA localisation for the three-mic SoniSense array.
+
+Each frame of synchronized mic samples goes through the FIR pre-filter from
+`filter_design`, then GCC-PHAT gives the time difference of arrival for every
+mic pair, and a vectorized solver turns the TDOAs into an azimuth.
+"""
+
+import time
+from collections import namedtuple
+
+import numpy as np
+from scipy.fft import irfft, next_fast_len, rfft
+
+from .filter_design import design_filter
+from .geometry import SPEED_OF_SOUND, far_field_delays, max_pair_delay, mic_pairs, triangle_positions
+from .instrumentation import instrument
+from .streaming import StreamingFIR
+
+LocalisationResult = namedtuple(
+    'LocalisationResult',
+    ['azimuth', 'tdoas', 'confidence', 'latency', 'realtime_factor'],
+)
+
+
+def gcc_phat_correlation(frames, pairs, max_lag, interp=1):
+    """
+    PHAT-weighted cross-correlation of every mic pair around zero lag.
+
+    All channels are transformed once with a real FFT and every pair is
+    correlated in the same array operation.
+
+    Parameters:
+    - frames: Array of shape (..., M, N) holding N samples from M mics.
+    - pairs: (P, 2) mic index pairs; the delay of pair (i, j) is t_i - t_j.
+    - max_lag: Largest lag worth keeping, in samples.
+    - interp: Upsampling factor applied to the correlation for finer lags.
+
+    Returns (cc, max_shift): cc has shape (..., P, 2 * max_shift + 1) and
+    index i holds the lag (i - max_shift) / interp samples.
+    """
+    frames = np.asarray(frames, dtype=float)
+    n = frames.shape[-1]
+    n_fft = next_fast_len(2 * n)
+    spectra = rfft(frames, n_fft, axis=-1)
+
+    cross = spectra[..., pairs[:, 0], :] * np.conj(spectra[..., pairs[:, 1], :])
+    cross /= np.abs(cross) + 1e-12
+
+    # Zero-padding the spectrum interpolates the correlation by `interp`
+    cc = irfft(cross, n_fft * interp, axis=-1) * interp
+    max_shift = min(int(np.ceil(max_lag * interp)), n_fft * interp // 2 - 1)
+    cc = np.concatenate([cc[..., -max_shift:], cc[..., :max_shift + 1]], axis=-1)
+    return cc, max_shift
+
+
+def gcc_phat(frames, pairs, max_lag, interp=1):
+    """
+    Estimates pairwise TDOAs with the phase transform weighted cross-correlation.
+
+    Parameters:
+    - frames: Array of shape (..., M, N) holding N samples from M mics.
+    - pairs: (P, 2) mic index pairs; the delay of pair (i, j) is t_i - t_j.
+    - max_lag: Largest lag worth searching, in samples.
+    - interp: Upsampling factor applied to the correlation for finer lags.
+
+    Returns (lags, peaks): the fractional lag in samples and the normalised
+    correlation peak (0..1) for each pair, both of shape (..., P).
+    """
+    cc, max_shift = gcc_phat_correlation(frames, pairs, max_lag, interp)
+    idx = np.argmax(cc, axis=-1)
+    peaks = np.take_along_axis(cc, idx[..., None], axis=-1)[..., 0]
+
+    # Parabolic refinement around the peak (edges are left unrefined)
+    inner = np.clip(idx, 1, cc.shape[-1] - 2)
+    y0 = np.take_along_axis(cc, (inner - 1)[..., None], axis=-1)[..., 0]
+    y1 = np.take_along_axis(cc, inner[..., None], axis=-1)[..., 0]
+    y2 = np.take_along_axis(cc, (inner + 1)[..., None], axis=-1)[..., 0]
+    denom = y0 - 2 * y1 + y2
+    denom = np.where(np.abs(denom) > 1e-12, denom, np.inf)
+    delta = np.where(idx == inner, 0.5 * (y0 - y2) / denom, 0.0)
+
+    lags = (idx - max_shift + delta) / interp
+    return lags, np.clip(peaks, 0.0, 1.0)
+
+
+class AzimuthLookup:
+    """
+    Lookup-table solver: compares measured TDOAs against the far-field delays
+    of every candidate azimuth and picks the closest one.
+
+    Parameters:
+    - positions: (M, 2) mic positions in metres.
+    - resolution: Grid step in degrees.
+    """
+
+    def __init__(self, positions, resolution=1.0, speed_of_sound=SPEED_OF_SOUND):
+        self.azimuths = np.deg2rad(np.arange(0.0, 360.0, resolution))
+        self.table = far_field_delays(positions, self.azimuths, speed_of_sound)  # (K, P)
+
+    def solve(self, tdoas):
+        """
+        Returns the azimuth in degrees for TDOAs of shape (..., P) in seconds.
+        """
+        tdoas = np.asarray(tdoas, dtype=float)
+        errors = np.sum((tdoas[..., None, :] - self.table) ** 2, axis=-1)
+        return np.rad2deg(self.azimuths[np.argmin(errors, axis=-1)])
+
+
+class AzimuthLeastSquares:
+    """
+    Closed-form solver: the far-field model tdoa = -B u / c is linear in the
+    arrival direction u, so it is solved with a precomputed pseudo-inverse.
+
+    Parameters:
+    - positions: (M, 2) mic positions in metres.
+    """
+
+    def __init__(self, positions, speed_of_sound=SPEED_OF_SOUND):
+        positions = np.asarray(positions, dtype=float)
+        pairs = mic_pairs(len(positions))
+        baselines = positions[pairs[:, 0]] - positions[pairs[:, 1]]
+        self.pinv = np.linalg.pinv(-baselines / speed_of_sound)  # (2, P)
+
+    def solve(self, tdoas):
+        """
+        Returns the azimuth in degrees for TDOAs of shape (..., P) in seconds.
+        """
+        direction = np.asarray(tdoas, dtype=float) @ self.pinv.T
+        return np.rad2deg(np.arctan2(direction[..., 1], direction[..., 0])) % 360.0
+
+
+SOLVERS = {
+    'lookup': AzimuthLookup,
+    'lstsq': AzimuthLeastSquares,
+}
+
+
+class Localiser:
+    """
+    Frame-by-frame azimuth estimator for synchronized multi-mic input.
+
+    Parameters:
+    - sample_rate: ADC sample rate in Hz.
+    - positions: (M, 2) mic positions in metres, defaults to the SoniSense triangle.
+    - prefilter: Name of the `filter_design` method used as the front end, or
+      None to skip pre-filtering.
+    - prefilter_params: Keyword arguments for the pre-filter design.
+    - solver: 'lookup', 'lstsq' or 'srp' (steered response power, see `srp`).
+    - resolution: Grid step for the lookup and SRP solvers (degrees, or
+      metres for an SRP position grid).
+    - interp: GCC correlation upsampling factor.
+    - calibration: Optional `CalibrationProfile`; its per-mic DC offsets are
+      removed before filtering.
+    - srp_params: Extra `SrpSearch` arguments (grid, extent, beam, ...).
+    """
+
+    def __init__(self, sample_rate, positions=None, prefilter='kaiser', prefilter_params=None,
+                 solver='lookup', resolution=1.0, interp=4, speed_of_sound=SPEED_OF_SOUND,
+                 calibration=None, srp_params=None):
+        self.sample_rate = float(sample_rate)
+        self.dc_offsets = None if calibration is None else calibration.dc_offsets()[:, None]
+        self.positions = triangle_positions() if positions is None else np.asarray(positions, dtype=float)
+        self.pairs = mic_pairs(len(self.positions))
+        self.interp = interp
+        self.max_lag = max_pair_delay(self.positions, speed_of_sound) * self.sample_rate
+
+        self.srp = None
+        if solver == 'lookup':
+            self.solver = AzimuthLookup(self.positions, resolution, speed_of_sound)
+        elif solver == 'srp':
+            from .srp import SrpSearch
+
+            self.srp = SrpSearch(self.positions, self.sample_rate, resolution=resolution, interp=interp,
+                                 speed_of_sound=speed_of_sound, **(srp_params or {}))
+        elif solver in SOLVERS:
+            self.solver = SOLVERS[solver](self.positions, speed_of_sound)
+        else:
+            raise ValueError(f"Unknown solver '{solver}', expected one of {sorted(SOLVERS) + ['srp']}")
+
+        self.prefilter = None
+        if prefilter is not None:
+            self.prefilter = StreamingFIR(design_filter(prefilter, **(prefilter_params or {})))
+        self._primed = False
+
+    def reset(self):
+        """
+        Clears the pre-filter state, e.g. after a gap in the input stream.
+        """
+        self._primed = False
+
+    def _prefilter(self, frames):
+        if self.prefilter is None:
+            return frames
+        if not self._primed:
+            # Start from the steady state of the first sample to avoid a DC step transient
+            self.prefilter.reset(frames[:, 0])
+            self._primed = True
+        return self.prefilter.process(frames)
+
+    @instrument('localise.frame', samples_arg=1)
+    def process(self, frames):
+        """
+        Localises one frame.
+
+        Parameters:
+        - frames: Array of shape (M, N), one row per mic, in stream order.
+
+        Returns a LocalisationResult with the azimuth in degrees, the pairwise
+        TDOAs in seconds, a 0..1 confidence, the processing latency in seconds
+        and the ratio of frame duration to processing time (> 1 keeps up).
+        """
+        start = time.perf_counter()
+        frames = np.asarray(frames, dtype=float)
+        if self.dc_offsets is not None:
+            frames = frames - self.dc_offsets
+
+        filtered = self._prefilter(frames)
+        filtered = filtered - filtered.mean(axis=-1, keepdims=True)
+
+        azimuth, tdoas, confidence = self.locate(filtered)
+
+        latency = time.perf_counter() - start
+        frame_duration = frames.shape[-1] / self.sample_rate
+        return LocalisationResult(float(azimuth), tdoas, float(confidence), latency,
+                                  frame_duration / max(latency, 1e-12))
+
+    def locate(self, frames):
+        """
+        Localises pre-filtered, zero-mean frames of shape (..., M, N) in one
+        array operation, skipping the stream state of `process`.
+
+        Returns (azimuth, tdoas, confidence) with the leading shape of `frames`.
+        """
+        if self.srp is not None:
+            found = self.srp.search(frames)
+            return found.azimuth, found.tdoas, np.clip(found.power, 0.0, 1.0)
+        lags, peaks = gcc_phat(frames, self.pairs, self.max_lag, self.interp)
+        tdoas = lags / self.sample_rate
+        return self.solver.solve(tdoas), tdoas, peaks.mean(axis=-1)
+
+
+if __name__ == "__main__":
+    import os
+
+    import pandas as pd
+
+    from .timebase import fit_clock
+
+    # Feed the idle calibration captures through the engine to check latency
+    readings = os.path.join(os.path.dirname(__file__), '..', 'idle callibration', 'readings')
+    files = ['mic#1_raw_dile_data.csv', 'mic#2_raw_idle_data.csv', 'mic#3_raw_idle_data.csv']
+    captures = [pd.read_csv(os.path.join(readings, name)) for name in files]
+
+    length = min(len(capture) for capture in captures)
+    signals = np.stack([capture['Mic Value'].values[:length] for capture in captures]).astype(float)
+    sample_rate = fit_clock(captures[0]['Time (ms)'].values[:length]).sample_rate
+
+    frame_size = 1024
+    localiser = Localiser(sample_rate)
+    latencies = []
+    for start in range(0, length - frame_size + 1, frame_size):
+        result = localiser.process(signals[:, start:start + frame_size])
+        latencies.append(result.latency)
+
+    latencies = np.array(latencies) * 1000.0
+    print(f"Sample rate: {sample_rate:.1f} Hz, {len(latencies)} frames of {frame_size}")
+    print(f"Latency per frame (ms): median {np.median(latencies):.3f}, p99 {np.percentile(latencies, 99):.3f}")
+    print(f"Real-time factor at median latency: {frame_size / sample_rate / (np.median(latencies) / 1000.0):.1f}x")
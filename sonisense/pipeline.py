@@ -0,0 +1,578 @@
+"""
+Continuous processing pipeline for live SoniSense input.
+
+Frames flow from the acquisition ring buffer through a chain of stages:
+
+    source -> DC removal -> [decimation] -> [adaptive] -> FIR -> detector -> localiser -> [tracker] -> sink
+
+With the STA/LTA detector, the detector moves to the front and passes on
+event windows cut from the ring buffer instead of single frames:
+
+    source -> events -> DC removal -> [decimation] -> [adaptive] -> FIR -> localiser -> [tracker] -> sink
+
+Every stage runs in its own task and hands frames on through a bounded
+`asyncio.Queue`, so memory stays bounded however long the pipeline runs.
+When a stage falls behind, its input queue fills and the overflow policy
+decides what happens. 'block' stalls the upstream stages until the ring
+buffer overruns, and the source counts the skipped samples. 'drop_oldest'
+discards the stalest queued frame. CPU-heavy stages run in an executor so
+the event loop stays responsive, and each stage keeps counters that can be
+read while the pipeline runs.
+
+Usage:
+    python -m sonisense.pipeline --seconds 10 --speed 4
+"""
+
+import argparse
+import asyncio
+import inspect
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .adaptive import ADAPTIVE_FILTERS, adaptive_canceller
+from .decimation import MultistageDecimator
+from .detection import EventDetector
+from .filter_design import design_filter
+from .instrumentation import REGISTRY, measure
+from .localisation import Localiser
+from .streaming import StreamingFIR
+from .tracking import MODELS as TRACKING_MODELS, BearingTracker
+
+DEFAULT_FRAME_SIZE = 256
+DEFAULT_QUEUE_SIZE = 8
+OVERFLOW_POLICIES = ('block', 'drop_oldest')
+DETECTORS = ('energy', 'stalta')
+
+Frame = namedtuple('Frame', ['position', 'timestamps', 'samples', 'result', 'tracks'], defaults=(None, None))
+
+_END = object()
+
+
+class StageCounters:
+    """
+    Running counters for one stage.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.received = 0
+        self.emitted = 0
+        self.filtered = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_time = 0.0
+        self.max_queue = 0
+        self.last_error = None
+
+    def as_dict(self):
+        return {
+            'received': self.received,
+            'emitted': self.emitted,
+            'filtered': self.filtered,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'busy_time': self.busy_time,
+            'mean_time': self.busy_time / self.received if self.received else 0.0,
+            'max_queue': self.max_queue,
+        }
+
+
+class Stage:
+    """
+    Base class for pipeline stages.
+
+    Subclasses implement `process(frame)` and return the frame to pass on,
+    None to drop it (e.g. a detector with nothing to report), or a list of
+    frames when one input yields several (e.g. event windows). Stages with
+    `offload = True` run in the pipeline's executor. A stage only ever sees
+    one frame at a time and in stream order, so it may keep state.
+    """
+
+    name = 'stage'
+    offload = False
+
+    def process(self, frame):
+        raise NotImplementedError
+
+
+class DCRemoval(Stage):
+    """
+    Subtracts the per-mic DC offset.
+
+    Parameters:
+    - calibration: Optional `CalibrationProfile` with fixed offsets. Without
+      one, the offset is tracked with an exponential average of frame means.
+    - smoothing: Weight of the newest frame mean in the running estimate.
+    """
+
+    name = 'dc_removal'
+
+    def __init__(self, calibration=None, smoothing=0.05):
+        self.offsets = None if calibration is None else calibration.dc_offsets()[:, None]
+        self.fixed = calibration is not None
+        self.smoothing = smoothing
+
+    def process(self, frame):
+        samples = np.asarray(frame.samples, dtype=float)
+        if not self.fixed:
+            means = samples.mean(axis=1, keepdims=True)
+            self.offsets = means if self.offsets is None else self.offsets + self.smoothing * (means - self.offsets)
+        return frame._replace(samples=samples - self.offsets)
+
+
+class FIRStage(Stage):
+    """
+    Streaming FIR pre-filter using one of the `filter_design` methods.
+    """
+
+    name = 'fir'
+    offload = True
+
+    def __init__(self, method='kaiser', **params):
+        self.filter = StreamingFIR(design_filter(method, **params))
+        self._next = None
+
+    def process(self, frame):
+        if frame.position != self._next:
+            # First frame, or a gap (dropped frames, event windows): restart the history
+            self.filter.reset(frame.samples[:, 0])
+        self._next = frame.position + frame.samples.shape[1]
+        return frame._replace(samples=self.filter.process(frame.samples))
+
+
+class DecimationStage(Stage):
+    """
+    Lowers the frame rate with a `MultistageDecimator`, so the stages after
+    it process `factor` times fewer samples. Output samples are computed at
+    the input samples whose position is a multiple of `factor`, and output
+    position n is input position n * factor, so positions stay unique and
+    in order across gaps. Each output sample keeps the timestamp of the input
+    sample it was computed at.
+    """
+
+    name = 'decimation'
+    offload = True
+
+    def __init__(self, factor, **params):
+        self.decimator = MultistageDecimator(factor, **params)
+        self.factor = self.decimator.factor
+        self._next = None
+        self._origin = 0
+        self._produced = 0
+
+    def process(self, frame):
+        if frame.position != self._next:
+            # First frame or a gap: restart at the first input position on the output grid
+            self.decimator.reset(frame.samples[:, 0])
+            self._origin = -(-frame.position // self.factor) * self.factor
+            self._produced = 0
+        self._next = frame.position + frame.samples.shape[1]
+        skip = min(max(0, self._origin - frame.position), frame.samples.shape[1])
+        samples = self.decimator.process(frame.samples[:, skip:])
+        count = samples.shape[1]
+        if count == 0:
+            return None
+        kept = self._origin + (self._produced + np.arange(count)) * self.factor - frame.position
+        position = self._origin // self.factor + self._produced
+        self._produced += count
+        return Frame(position, np.asarray(frame.timestamps)[kept], samples)
+
+
+class AdaptiveStage(Stage):
+    """
+    Adaptive hum and interference cancellation from `adaptive`, seeded from
+    the calibration profile when one is given. The learnt weights survive
+    gaps in the stream; only the sample history restarts.
+    """
+
+    name = 'adaptive'
+    offload = True
+
+    def __init__(self, method='nlms', calibration=None, sample_rate=None, **params):
+        self.canceller = adaptive_canceller(method, calibration, sample_rate, **params)
+        self._next = None
+
+    def process(self, frame):
+        if frame.position != self._next:
+            self.canceller.reset()
+        self._next = frame.position + frame.samples.shape[1]
+        return frame._replace(samples=self.canceller.process(frame.samples))
+
+
+class EnergyDetector(Stage):
+    """
+    Passes only frames whose RMS stands out from the idle noise floor.
+
+    Parameters:
+    - threshold: Factor over the noise standard deviation.
+    - calibration: Optional `CalibrationProfile` giving the noise level;
+      otherwise it is tracked from the quietest recent frames.
+    """
+
+    name = 'detector'
+
+    def __init__(self, threshold=3.0, calibration=None, history=64):
+        self.threshold = threshold
+        self.noise = None if calibration is None else float(np.mean(calibration.noise_std()))
+        self._levels = deque(maxlen=history)
+
+    def process(self, frame):
+        level = float(np.sqrt(np.mean(frame.samples ** 2)))
+        noise = self.noise
+        if noise is None:
+            self._levels.append(level)
+            noise = float(np.percentile(self._levels, 10))
+        return frame if level > self.threshold * noise else None
+
+
+class EventStage(Stage):
+    """
+    Passes on only event windows cut from the ring buffer.
+
+    It reads the raw frames for detection and, for every finished event,
+    emits one Frame covering the event plus pre/post-roll. The stage must sit
+    directly after the source, because the windows are raw ring data.
+
+    Parameters:
+    - detector: A `detection.EventDetector`.
+    - ring: The acquisition `RingBuffer` the source reads from.
+    """
+
+    name = 'events'
+
+    def __init__(self, detector, ring):
+        self.detector = detector
+        self.ring = ring
+        self.missed = 0
+
+    def process(self, frame):
+        windows = []
+        for event in self.detector.process(frame.samples, frame.position):
+            start, stop = self.detector.window(event)
+            samples, timestamps, actual_start = self.ring.read(start, stop)
+            if actual_start > start:
+                self.missed += 1  # Pre-roll already overwritten; keep what is left
+            if samples.shape[1]:
+                windows.append(Frame(actual_start, timestamps, samples))
+        return windows or None
+
+
+class LocaliserStage(Stage):
+    """
+    Runs a `Localiser` on each frame and attaches its result. The frames
+    arrive already DC-free and filtered, so the localiser's own pre-filter
+    is disabled.
+    """
+
+    name = 'localiser'
+    offload = True
+
+    def __init__(self, sample_rate, **localiser_params):
+        localiser_params.setdefault('prefilter', None)
+        self.localiser = Localiser(sample_rate, **localiser_params)
+
+    def process(self, frame):
+        return frame._replace(result=self.localiser.process(frame.samples))
+
+
+class TrackerStage(Stage):
+    """
+    Feeds each localised frame's bearing into a `BearingTracker` and attaches
+    the confirmed tracks. Time comes from the frame timestamps (ms), so
+    frames dropped by the detector simply lengthen the prediction step.
+    """
+
+    name = 'tracker'
+
+    def __init__(self, model='kalman', **tracker_params):
+        self.tracker = BearingTracker(model, **tracker_params)
+
+    def process(self, frame):
+        timestamp = float(np.mean(frame.timestamps)) / 1000.0
+        if frame.result is None:
+            tracks = self.tracker.update(timestamp, [])
+        else:
+            tracks = self.tracker.update(timestamp, frame.result.azimuth, frame.result.confidence)
+        return frame._replace(tracks=tracks)
+
+
+class RingSource:
+    """
+    Cuts consecutive frames out of a `RingBuffer` as the writer fills it.
+
+    Parameters:
+    - ring: The acquisition ring buffer.
+    - frame_size: Samples per channel in each frame.
+    - poll_interval: Seconds to wait when no complete frame is available.
+    """
+
+    name = 'source'
+
+    def __init__(self, ring, frame_size=DEFAULT_FRAME_SIZE, poll_interval=0.005):
+        self.ring = ring
+        self.frame_size = frame_size
+        self.poll_interval = poll_interval
+        self.position = ring.position
+        self.overrun_samples = 0
+
+    async def frames(self):
+        while True:
+            if self.ring.position - self.position < self.frame_size:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            samples, timestamps, start = self.ring.read(self.position, self.position + self.frame_size)
+            # Samples the writer overwrote before we got to them are skipped
+            self.overrun_samples += start - self.position
+            self.position = start + samples.shape[1]
+            if samples.shape[1] == self.frame_size:
+                yield Frame(start, timestamps, samples)
+
+
+class Pipeline:
+    """
+    Connects a source, a chain of stages and a sink with bounded queues.
+
+    Parameters:
+    - source: Object with an async `frames()` generator, such as `RingSource`.
+    - stages: List of `Stage` instances, in order.
+    - sink: Callable (plain or async) receiving each frame that leaves the
+      last stage. Defaults to keeping the most recent frames in `self.results`.
+    - queue_size: Capacity of every inter-stage queue, in frames.
+    - overflow: 'block' or 'drop_oldest', see the module docstring.
+    - executor: Executor for offloaded stages; a private thread pool by default.
+    """
+
+    def __init__(self, source, stages, sink=None, queue_size=DEFAULT_QUEUE_SIZE, overflow='block', executor=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow}', expected one of {OVERFLOW_POLICIES}")
+        self.source = source
+        self.stages = list(stages)
+        self.results = deque(maxlen=1024)
+        self.sink = sink if sink is not None else self.results.append
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.executor = executor
+        self.counters = {stage.name: StageCounters(stage.name) for stage in [source, *self.stages]}
+        self.counters['sink'] = StageCounters('sink')
+        self._stop = None
+
+    def stats(self):
+        """
+        Returns a snapshot of every stage's counters, in pipeline order.
+        """
+        stats = {name: counters.as_dict() for name, counters in self.counters.items()}
+        if hasattr(self.source, 'overrun_samples'):
+            stats[self.source.name]['overrun_samples'] = self.source.overrun_samples
+        return stats
+
+    async def _put(self, queue, item, counters):
+        if self.overflow == 'drop_oldest' and queue.full():
+            try:
+                queue.get_nowait()
+                queue.task_done()
+                counters.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        await queue.put(item)
+        counters.max_queue = max(counters.max_queue, queue.qsize())
+
+    async def _run_source(self, output):
+        counters = self.counters[self.source.name]
+        try:
+            async for frame in self.source.frames():
+                if self._stop.is_set():
+                    break
+                counters.received += 1
+                await self._put(output, frame, counters)
+                counters.emitted += 1
+        finally:
+            await output.put(_END)
+
+    @staticmethod
+    def _process(stage, frame):
+        # Timed where it runs, so executor waits stay out of the stage's histogram
+        with measure(f'pipeline.{stage.name}', frame.samples.size):
+            return stage.process(frame)
+
+    async def _run_stage(self, stage, queue, output, loop):
+        counters = self.counters[stage.name]
+        while True:
+            frame = await queue.get()
+            queue.task_done()
+            if frame is _END:
+                await output.put(_END)
+                return
+            counters.received += 1
+            start = time.perf_counter()
+            try:
+                if stage.offload:
+                    frame = await loop.run_in_executor(self.executor, self._process, stage, frame)
+                else:
+                    frame = self._process(stage, frame)
+            except Exception as e:
+                # Keep running; a bad frame must not stop a live pipeline
+                counters.errors += 1
+                counters.last_error = e
+                continue
+            finally:
+                counters.busy_time += time.perf_counter() - start
+            if frame is None:
+                counters.filtered += 1
+                continue
+            for frame in frame if isinstance(frame, list) else (frame,):
+                await self._put(output, frame, counters)
+                counters.emitted += 1
+
+    async def _run_sink(self, queue):
+        counters = self.counters['sink']
+        is_async = inspect.iscoroutinefunction(self.sink)
+        while True:
+            frame = await queue.get()
+            queue.task_done()
+            if frame is _END:
+                return
+            counters.received += 1
+            start = time.perf_counter()
+            try:
+                if is_async:
+                    await self.sink(frame)
+                else:
+                    self.sink(frame)
+            except Exception as e:
+                counters.errors += 1
+                counters.last_error = e
+            counters.busy_time += time.perf_counter() - start
+
+    async def run(self, duration=None):
+        """
+        Runs until the source ends, `stop()` is called or `duration` seconds pass.
+        """
+        loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        own_executor = self.executor is None
+        if own_executor:
+            self.executor = ThreadPoolExecutor(max_workers=max(1, sum(stage.offload for stage in self.stages)))
+
+        queues = [asyncio.Queue(self.queue_size) for _ in range(len(self.stages) + 1)]
+        tasks = [asyncio.create_task(self._run_source(queues[0]))]
+        for stage, queue, output in zip(self.stages, queues, queues[1:]):
+            tasks.append(asyncio.create_task(self._run_stage(stage, queue, output, loop)))
+        tasks.append(asyncio.create_task(self._run_sink(queues[-1])))
+
+        try:
+            if duration is None:
+                await asyncio.gather(*tasks)
+            else:
+                done, _ = await asyncio.wait(tasks, timeout=duration, return_when=asyncio.FIRST_EXCEPTION)
+                for task in done:
+                    task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if own_executor:
+                self.executor.shutdown(wait=True)
+                self.executor = None
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+
+
+def default_stages(sample_rate, calibration=None, prefilter='kaiser', prefilter_params=None, threshold=3.0,
+                   decimation=1, adaptive=None, tracking=None, detector='energy', ring=None, detector_params=None,
+                   **localiser_params):
+    """
+    Returns the standard DC removal -> FIR -> detector -> localiser chain.
+
+    `detector` is 'energy' for an `EnergyDetector` on every frame (with
+    `threshold`), or 'stalta' for an `EventStage` at the front that gates
+    the chain with a `detection.EventDetector` (with `detector_params`) and
+    cuts the event windows from `ring`, the acquisition ring buffer the
+    source reads. With `decimation` > 1 a `DecimationStage` follows the DC
+    removal, and the pre-filter and localiser run at the decimated rate (the
+    pre-filter cutoff is then a fraction of the decimated Nyquist).
+    `adaptive` names an `adaptive` filter ('nlms' or 'fdlms') for an
+    `AdaptiveStage` ahead of the pre-filter. `tracking` names a `tracking`
+    model ('kalman' or 'particle') for a `TrackerStage` at the end.
+    """
+    if detector not in DETECTORS:
+        raise ValueError(f"Unknown detector '{detector}', expected one of {list(DETECTORS)}")
+    stages = []
+    if detector == 'stalta':
+        if ring is None:
+            raise ValueError("The STA/LTA detector cuts its event windows from the ring buffer, pass `ring`")
+        events = EventDetector(sample_rate, ring.channels, calibration, **(detector_params or {}))
+        stages.append(EventStage(events, ring))
+    stages.append(DCRemoval(calibration))
+    if decimation > 1:
+        stages.append(DecimationStage(decimation))
+        sample_rate = sample_rate / decimation
+    if adaptive is not None:
+        stages.append(AdaptiveStage(adaptive, calibration, sample_rate))
+    if prefilter is not None:
+        stages.append(FIRStage(prefilter, **(prefilter_params or {})))
+    if detector == 'energy':
+        stages.append(EnergyDetector(threshold, calibration))
+    stages.append(LocaliserStage(sample_rate, **localiser_params))
+    if tracking is not None:
+        stages.append(TrackerStage(tracking))
+    return stages
+
+
+def main(argv=None):
+    from .acquisition import Acquisition, ReplaySource
+    from .calibration import CalibrationProfile
+
+    parser = argparse.ArgumentParser(description="Run the SoniSense pipeline on a replayed capture.")
+    parser.add_argument('paths', nargs='*', help="Capture CSVs, one per mic (the idle captures by default)")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--speed', type=float, default=1.0)
+    parser.add_argument('--frame-size', type=int, default=DEFAULT_FRAME_SIZE)
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument('--overflow', choices=OVERFLOW_POLICIES, default='block')
+    parser.add_argument('--detector', choices=DETECTORS, default='energy',
+                        help="Per-frame energy gate, or STA/LTA event windows with pre/post-roll")
+    parser.add_argument('--threshold', type=float, default=0.0,
+                        help="Energy detector threshold (0 passes every frame)")
+    parser.add_argument('--calibration', default=None, help="Calibration profile JSON")
+    parser.add_argument('--decimation', type=int, default=1, help="Decimate by this factor after DC removal")
+    parser.add_argument('--adaptive', choices=sorted(ADAPTIVE_FILTERS), default=None,
+                        help="Cancel hum and periodic interference adaptively")
+    parser.add_argument('--metrics', default=None,
+                        help="Record per-stage telemetry and write it here (.json, else Prometheus text)")
+    parser.add_argument('--tracking', choices=sorted(TRACKING_MODELS), default=None, help="Track the bearings")
+    args = parser.parse_args(argv)
+
+    if args.metrics:
+        REGISTRY.enable()
+    source = ReplaySource(args.paths or None, speed=args.speed, loop=True)
+    calibration = CalibrationProfile.load(args.calibration) if args.calibration else None
+
+    with Acquisition(source, source.channels, args.frame_size * args.queue_size * 16) as acquisition:
+        stages = default_stages(source.sample_rate, calibration, threshold=args.threshold, decimation=args.decimation,
+                                adaptive=args.adaptive, tracking=args.tracking, detector=args.detector,
+                                ring=acquisition.ring)
+        pipeline = Pipeline(RingSource(acquisition.ring, args.frame_size), stages,
+                            queue_size=args.queue_size, overflow=args.overflow)
+        asyncio.run(pipeline.run(args.seconds))
+
+    for name, counters in pipeline.stats().items():
+        summary = ', '.join(f"{key} {value:.4g}" if isinstance(value, float) else f"{key} {value}"
+                            for key, value in counters.items())
+        print(f"{name}: {summary}")
+    if pipeline.results:
+        azimuths = np.array([frame.result.azimuth for frame in pipeline.results])
+        print(f"Last azimuths: {np.round(azimuths[-5:], 1)}")
+        if pipeline.results[-1].tracks is not None:
+            print(f"Tracks: {[(track.id, round(track.azimuth, 1)) for track in pipeline.results[-1].tracks]}")
+    if args.metrics:
+        REGISTRY.dump(args.metrics)
+        print(f"Telemetry written to {args.metrics}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Columnar binary recording format for multi-mic SoniSense captures.
+
+A recording is one file holding every channel:
+
+    magic (8 bytes) | header length (uint32) | JSON header | padding
+    timestamps: float64, (1 or channels, samples), channel-major
+    samples:    uint16,  (channels, samples), channel-major
+
+The header carries the sample rate, channel map, board revision and the byte
+offsets of both arrays, which are aligned so they can be memory-mapped. Each
+channel is contiguous on disk, so slicing one mic or one time range is a
+page-in rather than a parse.
+
+Usage:
+    python -m sonisense.recording convert capture.ssr mic1.csv mic2.csv mic3.csv --board V2
+    python -m sonisense.recording info capture.ssr
+"""
+
+import argparse
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+from .instrumentation import instrument
+from .timebase import fit_clock
+
+MAGIC = b'SONISREC'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+BOARD_REVISIONS = ('V1', 'V2')
+
+# Mic designators on the SoniSense schematic, in ADC channel order
+DEFAULT_CHANNEL_MAP = {'mic1': 'Q1', 'mic2': 'Q2', 'mic3': 'Q3'}
+
+_PREAMBLE = struct.Struct('<8sI')
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+@instrument('export.recording', samples_arg=1)
+def write_recording(path, samples, timestamps, sample_rate, board='V2', channel_map=None, metadata=None):
+    """
+    Writes a recording file.
+
+    Parameters:
+    - path: Output file path (conventionally `.ssr`).
+    - samples: Integer array of shape (channels, samples) in 0..65535.
+    - timestamps: Array of shape (samples,) shared by all channels, or
+      (channels, samples) when each channel was stamped separately. In ms.
+    - sample_rate: Nominal sample rate in Hz.
+    - board: Board revision, 'V1' or 'V2'.
+    - channel_map: Dict of channel name to hardware designator, in storage
+      order. Defaults to mic1..micN mapped onto Q1..QN.
+    - metadata: Optional JSON-serialisable dict stored in the header.
+    """
+    samples = np.asarray(samples)
+    if samples.ndim != 2:
+        raise ValueError("samples must have shape (channels, samples)")
+    if samples.size and (samples.min() < 0 or samples.max() > np.iinfo(np.uint16).max):
+        raise ValueError("sample values must fit in uint16")
+    samples = np.ascontiguousarray(samples, dtype=np.uint16)
+
+    timestamps = np.ascontiguousarray(np.atleast_2d(timestamps), dtype=np.float64)
+    if timestamps.shape[1] != samples.shape[1] or timestamps.shape[0] not in (1, samples.shape[0]):
+        raise ValueError("timestamps must have shape (samples,) or (channels, samples)")
+
+    if board not in BOARD_REVISIONS:
+        raise ValueError(f"Unknown board revision '{board}', expected one of {BOARD_REVISIONS}")
+    if channel_map is None:
+        channel_map = {f'mic{i + 1}': f'Q{i + 1}' for i in range(samples.shape[0])}
+    if len(channel_map) != samples.shape[0]:
+        raise ValueError("channel_map must name every channel")
+
+    header = {
+        'version': FORMAT_VERSION,
+        'sample_rate': float(sample_rate),
+        'board': board,
+        'channel_map': dict(channel_map),
+        'num_samples': int(samples.shape[1]),
+        'timestamps': 'shared' if timestamps.shape[0] == 1 else 'per_channel',
+        'time_unit': 'ms',
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'metadata': metadata or {},
+    }
+
+    # The offsets depend on the header length, so size it with placeholders first
+    header['timestamps_offset'] = header['samples_offset'] = 0
+    base = _PREAMBLE.size + len(json.dumps(header).encode()) + 64
+    header['timestamps_offset'] = _align(base)
+    header['samples_offset'] = _align(header['timestamps_offset'] + timestamps.nbytes)
+    encoded = json.dumps(header).encode()
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, len(encoded)))
+        f.write(encoded)
+        f.write(b'\0' * (header['timestamps_offset'] - f.tell()))
+        f.write(timestamps.tobytes())
+        f.write(b'\0' * (header['samples_offset'] - f.tell()))
+        f.write(samples.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_header(path):
+    """
+    Returns the parsed JSON header of a recording file.
+    """
+    with open(path, 'rb') as f:
+        magic, length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a SoniSense recording")
+        header = json.loads(f.read(length))
+    if header['version'] > FORMAT_VERSION:
+        raise ValueError(f"{path} uses format version {header['version']}, newer than supported {FORMAT_VERSION}")
+    return header
+
+
+class Recording:
+    """
+    Memory-mapped reader for a recording file.
+
+    `samples` and the arrays returned by `channel`, `timestamps` and `slice`
+    are views onto the file; nothing is read until it is touched.
+
+    Parameters:
+    - path: Recording file path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header = read_header(path)
+        n = self.header['num_samples']
+        num_channels = len(self.header['channel_map'])
+        ts_rows = 1 if self.header['timestamps'] == 'shared' else num_channels
+
+        self.samples = np.memmap(path, dtype=np.uint16, mode='r', offset=self.header['samples_offset'],
+                                 shape=(num_channels, n))
+        self._timestamps = np.memmap(path, dtype=np.float64, mode='r', offset=self.header['timestamps_offset'],
+                                     shape=(ts_rows, n))
+
+    @property
+    def sample_rate(self):
+        return self.header['sample_rate']
+
+    @property
+    def board(self):
+        return self.header['board']
+
+    @property
+    def channel_map(self):
+        return self.header['channel_map']
+
+    @property
+    def channels(self):
+        return list(self.header['channel_map'])
+
+    def __len__(self):
+        return self.header['num_samples']
+
+    def _index(self, channel):
+        if isinstance(channel, str):
+            return self.channels.index(channel)
+        return int(channel)
+
+    def channel(self, channel):
+        """
+        Returns the samples of one channel, by name or index.
+        """
+        return self.samples[self._index(channel)]
+
+    def timestamps(self, channel=None):
+        """
+        Returns the timestamps in ms. For per-channel recordings, pass the
+        channel to get its own clock; otherwise the first row is returned.
+        """
+        if channel is None or self._timestamps.shape[0] == 1:
+            return self._timestamps[0]
+        return self._timestamps[self._index(channel)]
+
+    def slice(self, start, stop):
+        """
+        Returns (samples, timestamps) views for the sample range [start, stop).
+        """
+        return self.samples[:, start:stop], self._timestamps[:, start:stop]
+
+    def close(self):
+        """
+        Releases the memory maps. Views handed out earlier keep the file open.
+        """
+        self.samples = self._timestamps = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def estimate_sample_rate(timestamps_ms):
+    """
+    Nominal sample rate in Hz from a (possibly jittery) ms timestamp column,
+    using the robust clock fit so the burst-stamped startup backlog does not
+    bias it.
+    """
+    timestamps_ms = np.asarray(timestamps_ms, dtype=float)
+    if len(timestamps_ms) < 2 or timestamps_ms[-1] <= timestamps_ms[0]:
+        return 0.0
+    return fit_clock(timestamps_ms).sample_rate
+
+
+@instrument('load.convert')
+def convert_csv_captures(csv_paths, output_path, board='V2', sample_rate=None, channel_names=None,
+                         time_column='Time (ms)', value_column='Mic Value'):
+    """
+    Converts per-mic CSV captures (`Time (ms),Mic Value`) into one recording.
+
+    The mics were captured separately, so each keeps its own timestamp row.
+    All channels are truncated to the shortest capture; the original lengths
+    are kept in the header metadata.
+
+    Parameters:
+    - csv_paths: One CSV per channel, in channel order.
+    - output_path: Recording file to write.
+    - board: Board revision, 'V1' or 'V2'.
+    - sample_rate: Nominal rate in Hz; estimated from the first capture's
+      timestamps when omitted.
+    - channel_names: Names for the channels, defaults to mic1..micN.
+    """
+    import pandas as pd
+
+    columns = [time_column, value_column]
+    captures = [pd.read_csv(path, usecols=columns, dtype={time_column: np.float64, value_column: np.int64})
+                for path in csv_paths]
+    lengths = [len(capture) for capture in captures]
+    n = min(lengths)
+
+    samples = np.stack([capture[value_column].values[:n] for capture in captures])
+    timestamps = np.stack([capture[time_column].values[:n] for capture in captures])
+    if sample_rate is None:
+        sample_rate = estimate_sample_rate(timestamps[0])
+
+    names = channel_names or [f'mic{i + 1}' for i in range(len(csv_paths))]
+    channel_map = {name: DEFAULT_CHANNEL_MAP.get(name, name) for name in names}
+    metadata = {
+        'source_files': [os.path.basename(path) for path in csv_paths],
+        'source_lengths': lengths,
+    }
+    write_recording(output_path, samples, timestamps, sample_rate, board, channel_map, metadata)
+    return output_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SoniSense recording tools.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    convert = commands.add_parser('convert', help="Convert per-mic CSV captures into one recording")
+    convert.add_argument('output')
+    convert.add_argument('inputs', nargs='+')
+    convert.add_argument('--board', choices=BOARD_REVISIONS, default='V2')
+    convert.add_argument('--sample-rate', type=float, default=None)
+
+    info = commands.add_parser('info', help="Print a recording header")
+    info.add_argument('path')
+
+    args = parser.parse_args(argv)
+    if args.command == 'convert':
+        convert_csv_captures(args.inputs, args.output, args.board, args.sample_rate)
+        print(json.dumps(read_header(args.output), indent=2))
+    else:
+        print(json.dumps(read_header(args.path), indent=2))
+
+
+if __name__ == "__main__":
+    main()
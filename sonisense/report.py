@@ -0,0 +1,435 @@
+"""
+Headless, incremental rendering of the project figures.
+
+Every figure is described by a `FigureJob`: a renderer name from `RENDERERS`,
+the input files it reads and its parameters. Figures are rendered with the
+Agg backend in a process pool. A figure is skipped when the hash of its
+inputs, parameters and renderer version matches the manifest from the
+previous run. Afterwards a single `index.html` links every figure.
+
+`default_jobs` covers the figures that were previously produced by hand
+with `plt.show()`: the four FIR algorithm demos, the idle filter
+comparison, the idle captures, and the sweep heatmaps, surfaces and
+per-capture plots. Figures whose inputs are not on this machine are listed
+as missing instead of failing the run.
+
+Usage:
+    python -m sonisense.report reports/ --workers 4
+"""
+
+import argparse
+import hashlib
+import html
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .instrumentation import instrument
+
+# Bump when a renderer changes so cached figures are redrawn
+RENDERER_VERSION = 1
+DEFAULT_DPI = 100
+MANIFEST_NAME = 'manifest.json'
+INDEX_NAME = 'index.html'
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+IDLE_DATA_DIR = os.path.join(REPO_ROOT, 'Algorithim Tests', 'idle mic data [idle environment used for callibration]')
+
+# (folder, design method, design params, filter mode, title suffix), mirroring the algorithm scripts
+ALGORITHM_DEMOS = [
+    ('1st algorithim', 'sinc_hamming', {'num_taps': 21, 'cutoff': 0.2}, 'same', ''),
+    ('2nd alg', 'kaiser', {'num_taps': 51, 'cutoff': 0.1, 'beta': 8.6}, 'causal', ' (Kaiser Window)'),
+    ('3rd alg', 'frequency_sampling', {'num_taps': 51, 'cutoff': 0.2}, 'causal', ' (Frequency Sampling Method)'),
+    ('4th slg', 'gaussian', {'num_taps': 21, 'std_dev': 3.0}, 'causal', ' (Gaussian Window)'),
+]
+
+# Frequency in kHz of the captures that were plotted one by one, per wave
+CAPTURE_FIGURES = {'sine': 10, 'square': 20, 'triangle': 20}
+
+FigureJob = namedtuple('FigureJob', ['name', 'section', 'renderer', 'inputs', 'params'])
+
+
+def _save(fig, path, dpi):
+    tmp_path = f"{path}.tmp.png"
+    fig.savefig(tmp_path, dpi=dpi)
+    os.replace(tmp_path, path)
+
+
+def render_fir_demo(path, inputs, params):
+    """
+    Original, filtered and overlaid white noise for one FIR design.
+    """
+    import matplotlib.pyplot as plt
+    from scipy.signal import lfilter
+
+    from .filter_design import design_filter
+
+    input_signal = np.random.default_rng(params['seed']).standard_normal(params['length'])
+    h = design_filter(params['method'], **params['design'])
+    if params['mode'] == 'same':
+        filtered_signal = np.convolve(input_signal, h, mode='same')
+    else:
+        filtered_signal = lfilter(h, 1.0, input_signal)
+    suffix = params['suffix']
+
+    fig, axs = plt.subplots(3, 1, figsize=(15, 10))
+    axs[0].plot(input_signal, label='Original Signal', color='blue')
+    axs[0].set_title('Original Signal')
+    axs[1].plot(filtered_signal, label='Filtered Signal', color='red')
+    axs[1].set_title(f'Filtered Signal{suffix}')
+    axs[2].plot(input_signal, label='Original Signal', color='blue', alpha=0.5)
+    axs[2].plot(filtered_signal, label='Filtered Signal', color='red', alpha=0.5)
+    axs[2].set_title(f'Original vs. Filtered Signal{suffix}')
+    for ax in axs:
+        ax.legend()
+    fig.tight_layout()
+    _save(fig, path, params['dpi'])
+    plt.close(fig)
+
+
+def render_filter_comparison(path, inputs, params):
+    """
+    Filtered vs unfiltered idle capture from `original_filter.csv`.
+    """
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
+    data = pd.read_csv(inputs[0]).dropna()
+    unfiltered = data['Original Signal'].values
+    filtered = data['Filtered Signal'].values
+    x = np.arange(len(data))
+
+    fig, axs = plt.subplots(3, 1, figsize=(10, 18))
+    axs[0].plot(x, filtered, label='Filtered', color='b')
+    axs[0].set_title('Filtered Data')
+    axs[1].plot(x, unfiltered, label='Unfiltered', color='r')
+    axs[1].set_title('Unfiltered Data')
+    axs[2].plot(x, filtered, label='Filtered', color='b')
+    axs[2].plot(x, unfiltered, label='Unfiltered', color='r')
+    axs[2].set_title('Filtered vs Unfiltered Data')
+    for ax in axs:
+        ax.set_xlabel('Sample Index')
+        ax.set_ylabel('Amplitude')
+        ax.grid(True)
+        ax.legend()
+    fig.tight_layout()
+    _save(fig, path, params['dpi'])
+    plt.close(fig)
+
+
+def render_idle_captures(path, inputs, params):
+    """
+    The idle calibration captures of every mic on one time axis.
+    """
+    import matplotlib.pyplot as plt
+
+    from .calibration import iter_csv_chunks
+
+    fig, axs = plt.subplots(len(inputs), 1, figsize=(12, 3 * len(inputs)), sharex=True, squeeze=False)
+    for ax, input_path in zip(axs[:, 0], inputs):
+        timestamps, values = (np.concatenate(parts) for parts in zip(*iter_csv_chunks(input_path)))
+        ax.plot(timestamps / 1000.0, values, linewidth=0.5)
+        ax.set_title(os.path.basename(input_path))
+        ax.set_ylabel('Mic Value')
+        ax.grid(True)
+    axs[-1, 0].set_xlabel('Time (s)')
+    fig.tight_layout()
+    _save(fig, path, params['dpi'])
+    plt.close(fig)
+
+
+def _sweep_metrics(inputs, params):
+    from .sweep_loader import load_sweep
+    from .sweep_stats import compute_sweep_metrics
+
+    files = {tuple(key): input_path for key, input_path in zip(params['keys'], inputs)}
+    return compute_sweep_metrics(load_sweep(files, executor='thread'))
+
+
+def plot_stability_heatmap(results_df, wave_type, metric="Variance"):
+    """
+    Draws a metric of one wave type as a heatmap over frequency and distance.
+
+    Parameters:
+    - results_df: Output of `compute_sweep_metrics` for that wave type.
+    - wave_type: Wave name used in the title.
+    - metric: Column of results_df to plot.
+
+    Returns the matplotlib figure.
+    """
+    import matplotlib.pyplot as plt
+
+    from .sweep_stats import sweep_tensor
+
+    (distances, frequencies), grid = sweep_tensor(results_df, metric, axes=["Distance (cm)", "Frequency (kHz)"])
+
+    fig, ax = plt.subplots(figsize=(10, 8))
+    ax.set_title(f"{wave_type.capitalize()} Wave Stability ({metric}) by Frequency and Distance", fontsize=14)
+    heatmap = ax.imshow(grid, cmap="coolwarm", aspect="auto", origin="lower")
+    fig.colorbar(heatmap, label=f"{metric} (Stability)")
+    ax.set_xticks(np.arange(len(frequencies)), labels=frequencies, rotation=45)
+    ax.set_yticks(np.arange(len(distances)), labels=distances)
+    ax.set_xlabel("Frequency (kHz)", fontsize=12)
+    ax.set_ylabel("Distance (cm)", fontsize=12)
+    fig.tight_layout()
+    return fig
+
+
+def plot_stability_surface(results_df, wave_type, metric="Variance"):
+    """
+    Draws a metric of one wave type as a 3D surface over frequency and
+    distance. Takes the same parameters as `plot_stability_heatmap`.
+    """
+    import matplotlib.pyplot as plt
+
+    from .sweep_stats import sweep_tensor
+
+    (distances, frequencies), grid = sweep_tensor(results_df, metric, axes=["Distance (cm)", "Frequency (kHz)"])
+    X, Y = np.meshgrid(frequencies, distances)
+
+    fig = plt.figure(figsize=(12, 8))
+    ax = fig.add_subplot(111, projection='3d')
+    surf = ax.plot_surface(X, Y, grid, cmap='viridis', edgecolor='k', alpha=0.8)
+    ax.set_title(f"{wave_type.capitalize()} Wave Stability ({metric}) by Frequency and Distance", fontsize=14)
+    ax.set_xlabel("Frequency (kHz)", fontsize=12)
+    ax.set_ylabel("Distance (cm)", fontsize=12)
+    ax.set_zlabel(f"{metric} (Stability)", fontsize=12)
+    fig.colorbar(surf, ax=ax, shrink=0.5, aspect=10, label=f"{metric} (Stability)")
+    fig.tight_layout()
+    return fig
+
+
+def render_sweep_heatmap(path, inputs, params):
+    """
+    Variance heatmap over frequency and distance for one wave type.
+    """
+    import matplotlib.pyplot as plt
+
+    fig = plot_stability_heatmap(_sweep_metrics(inputs, params), params['wave'])
+    _save(fig, path, params['dpi'])
+    plt.close(fig)
+
+
+def render_sweep_surface(path, inputs, params):
+    """
+    Variance surface over frequency and distance for one wave type.
+    """
+    import matplotlib.pyplot as plt
+
+    fig = plot_stability_surface(_sweep_metrics(inputs, params), params['wave'])
+    _save(fig, path, params['dpi'])
+    plt.close(fig)
+
+
+def render_capture(path, inputs, params):
+    """
+    Raw waveform of a single sweep capture.
+    """
+    import matplotlib.pyplot as plt
+
+    from .sweep_loader import load_microphone_data
+
+    signal = load_microphone_data(inputs[0])
+    fig, ax = plt.subplots(figsize=(12, 4))
+    ax.plot(signal[:params['max_samples']], linewidth=0.6)
+    ax.set_title(f"{params['wave'].capitalize()} {params['frequency']:g} kHz at {params['distance']:g} cm")
+    ax.set_xlabel('Sample Index')
+    ax.set_ylabel('Mic Value')
+    ax.grid(True)
+    fig.tight_layout()
+    _save(fig, path, params['dpi'])
+    plt.close(fig)
+
+
+RENDERERS = {
+    'fir_demo': render_fir_demo,
+    'filter_comparison': render_filter_comparison,
+    'idle_captures': render_idle_captures,
+    'sweep_heatmap': render_sweep_heatmap,
+    'sweep_surface': render_sweep_surface,
+    'capture': render_capture,
+}
+
+
+def _file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def job_hash(job):
+    """
+    Hash of everything a figure depends on, or None if an input is missing.
+    """
+    if job.renderer not in RENDERERS:
+        raise ValueError(f"Unknown renderer '{job.renderer}', expected one of {sorted(RENDERERS)}")
+    if not all(os.path.exists(path) for path in job.inputs):
+        return None
+    digest = hashlib.sha1()
+    digest.update(json.dumps([job.renderer, RENDERER_VERSION, job.params], sort_keys=True).encode())
+    for path in job.inputs:
+        digest.update(_file_digest(path).encode())
+    return digest.hexdigest()
+
+
+def default_jobs(dpi=DEFAULT_DPI, seed=0, sweep_root=None):
+    """
+    Builds the jobs for every figure of the project. The sweep figures
+    come from `default_dataset(sweep_root)`.
+    """
+    from .sweep import default_dataset
+
+    jobs = []
+    for section, method, design, mode, suffix in ALGORITHM_DEMOS:
+        params = {'method': method, 'design': design, 'mode': mode, 'suffix': suffix,
+                  'seed': seed, 'length': 1000, 'dpi': dpi}
+        jobs.append(FigureJob(f'fir_{method}', f'Algorithim Tests / {section}', 'fir_demo', [], params))
+
+    jobs.append(FigureJob('idle_filter_comparison', 'Idle calibration', 'filter_comparison',
+                          [os.path.join(IDLE_DATA_DIR, 'original_filter.csv')], {'dpi': dpi}))
+
+    from .acquisition import IDLE_CAPTURES
+    jobs.append(FigureJob('idle_captures', 'Idle calibration', 'idle_captures', list(IDLE_CAPTURES), {'dpi': dpi}))
+
+    dataset = default_dataset(sweep_root)
+    for wave in dataset.waves:
+        files = dataset.files(wave)
+        keys = sorted(files)
+        inputs = [files[key] for key in keys]
+        sweep_params = {'wave': wave, 'keys': [list(key) for key in keys], 'dpi': dpi}
+        section = f'Pictorial Representation / {wave}'
+        jobs.append(FigureJob(f'{wave}_heatmap', section, 'sweep_heatmap', inputs, sweep_params))
+        jobs.append(FigureJob(f'{wave}_surface', section, 'sweep_surface', inputs, sweep_params))
+        for (frequency, distance), input_path in sorted(files.items()):
+            if frequency == CAPTURE_FIGURES.get(wave):
+                params = {'wave': wave, 'frequency': frequency, 'distance': distance,
+                          'max_samples': 2000, 'dpi': dpi}
+                jobs.append(FigureJob(f'{wave}_{frequency:g}k_{distance:g}cm', section, 'capture',
+                                      [input_path], params))
+    return jobs
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _render_job(args):
+    job, path = args
+    try:
+        RENDERERS[job.renderer](path, job.inputs, job.params)
+    except Exception as e:
+        return job.name, f'{type(e).__name__}: {e}'
+    return job.name, None
+
+
+def write_index(path, jobs, manifest, title='SoniSense figures'):
+    """
+    Writes an HTML page with every figure, grouped by section.
+    """
+    sections = {}
+    for job in jobs:
+        sections.setdefault(job.section, []).append(job)
+
+    lines = ['<!DOCTYPE html>', '<html><head><meta charset="utf-8">',
+             f'<title>{html.escape(title)}</title>',
+             '<style>body{font-family:sans-serif;margin:2em}figure{display:inline-block;margin:1em;'
+             'vertical-align:top}img{max-width:480px;border:1px solid #ccc}figcaption{font-size:0.9em}'
+             '.missing,.failed{color:#a00}</style>',
+             f'</head><body><h1>{html.escape(title)}</h1>']
+    for section, section_jobs in sections.items():
+        lines.append(f'<h2>{html.escape(section)}</h2>')
+        for job in section_jobs:
+            entry = manifest.get(job.name, {})
+            status = entry.get('status', 'missing')
+            name = html.escape(job.name)
+            if status == 'ok':
+                src = html.escape(entry['file'])
+                lines.append(f'<figure><a href="{src}"><img src="{src}" alt="{name}"></a>'
+                             f'<figcaption>{name}</figcaption></figure>')
+            else:
+                detail = html.escape(entry.get('error', 'input data not found'))
+                lines.append(f'<figure><figcaption class="{status}">{name}: {status} ({detail})'
+                             f'</figcaption></figure>')
+    lines.append('</body></html>')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+
+
+@instrument('export.report')
+def render_report(output_dir, jobs=None, max_workers=None, force=False):
+    """
+    Renders every out-of-date figure in a process pool and writes the index.
+
+    Parameters:
+    - output_dir: Directory for the PNGs, the manifest and `index.html`.
+    - jobs: List of FigureJob, defaults to `default_jobs()`.
+    - max_workers: Render processes; defaults to the CPU count.
+    - force: Redraw every figure even if its inputs are unchanged.
+
+    Returns a dictionary of counts: rendered, skipped, missing and failed.
+    """
+    jobs = default_jobs() if jobs is None else jobs
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    previous = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+
+    manifest = {}
+    pending = []
+    counts = {'rendered': 0, 'skipped': 0, 'missing': 0, 'failed': 0}
+    for job in jobs:
+        digest = job_hash(job)
+        file_name = f'{job.name}.png'
+        if digest is None:
+            manifest[job.name] = {'status': 'missing', 'file': file_name}
+            counts['missing'] += 1
+            continue
+        manifest[job.name] = {'status': 'ok', 'file': file_name, 'hash': digest}
+        old = previous.get(job.name, {})
+        if (not force and old.get('hash') == digest and old.get('status') == 'ok'
+                and os.path.exists(os.path.join(output_dir, file_name))):
+            counts['skipped'] += 1
+        else:
+            pending.append((job, os.path.join(output_dir, file_name)))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as pool:
+            for name, error in pool.map(_render_job, pending):
+                if error is None:
+                    counts['rendered'] += 1
+                else:
+                    manifest[name].update(status='failed', error=error)
+                    manifest[name].pop('hash')
+                    counts['failed'] += 1
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    write_index(os.path.join(output_dir, INDEX_NAME), jobs, manifest)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render every SoniSense figure headlessly.")
+    parser.add_argument('output_dir')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--force', action='store_true', help="Redraw figures even when their inputs are unchanged")
+    parser.add_argument('--dpi', type=int, default=DEFAULT_DPI)
+    parser.add_argument('--sweep-root', default=None, help="Sweep capture directory (see sonisense.sweep)")
+    args = parser.parse_args(argv)
+
+    jobs = default_jobs(args.dpi, sweep_root=args.sweep_root)
+    counts = render_report(args.output_dir, jobs, args.workers, args.force)
+    print(', '.join(f"{count} {state}" for state, count in counts.items()))
+    print(f"Index: {os.path.join(args.output_dir, INDEX_NAME)}")
+
+
+if __name__ == "__main__":
+    main()
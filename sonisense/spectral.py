@@ -0,0 +1,149 @@
+"""
+Batched spectral analysis of the frequency x distance sweeps.
+
+Every capture of a sweep is trimmed to a common length and stacked into one
+(files, samples) array. Welch PSDs and STFTs are then taken for the whole
+stack in one strided rfft, with the window cached per (name, length). From
+the PSDs, `tones.spectral_features` extracts each capture's peak frequency,
+the power at the expected tone and its harmonics, SNR, THD and noise floor.
+
+The tone frequencies are folded back into the band the ADC actually
+samples. A 20 kHz tone captured at ~1 kHz shows up as an alias, and that is
+where its power is measured. The `Aliased` column says when this happened.
+`response_surface` scatters any feature into the (distance x frequency x
+wave) grid to give the mic's frequency-response surface.
+"""
+
+import functools
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy.fft import rfft, rfftfreq
+from scipy.signal import get_window
+
+from .instrumentation import instrument
+from .sweep_stats import SWEEP_AXES, sweep_tensor
+from .tones import NUM_HARMONICS, spectral_features, stack_signals
+
+DEFAULT_SEGMENT_LENGTH = 256
+DEFAULT_WINDOW = 'hann'
+
+
+@functools.lru_cache(maxsize=32)
+def _window(name, nperseg):
+    window = get_window(name, nperseg)
+    window.setflags(write=False)
+    return window
+
+
+def _segments(frames, nperseg, noverlap):
+    hop = nperseg - noverlap
+    if frames.shape[-1] < nperseg:
+        raise ValueError(f"Signals of {frames.shape[-1]} samples are shorter than one segment ({nperseg})")
+    return np.lib.stride_tricks.sliding_window_view(frames, nperseg, axis=-1)[..., ::hop, :]
+
+
+@instrument('spectral.welch', samples_arg=0)
+def welch_batch(frames, sample_rate, nperseg=DEFAULT_SEGMENT_LENGTH, noverlap=None, window=DEFAULT_WINDOW):
+    """
+    Welch PSD of every row of `frames` at once.
+
+    Matches `scipy.signal.welch` with constant detrending and density scaling.
+
+    Parameters:
+    - frames: Array of shape (..., samples).
+    - sample_rate: Sample rate in Hz.
+    - nperseg: Segment length.
+    - noverlap: Overlap between segments, nperseg // 2 by default.
+    - window: Window name understood by `scipy.signal.get_window`.
+
+    Returns (freqs, psd) with psd of shape (..., nperseg // 2 + 1).
+    """
+    noverlap = nperseg // 2 if noverlap is None else noverlap
+    win = _window(window, nperseg)
+    segments = _segments(np.asarray(frames, dtype=float), nperseg, noverlap)
+    segments = segments - segments.mean(axis=-1, keepdims=True)
+    power = np.abs(rfft(segments * win, axis=-1, workers=-1)) ** 2
+    psd = power.mean(axis=-2) / (sample_rate * np.sum(win ** 2))
+    psd[..., 1:(nperseg + 1) // 2] *= 2  # One-sided; the Nyquist bin only exists once for even nperseg
+    return rfftfreq(nperseg, 1.0 / sample_rate), psd
+
+
+@instrument('spectral.stft', samples_arg=0)
+def stft_batch(frames, sample_rate, nperseg=DEFAULT_SEGMENT_LENGTH, noverlap=None, window=DEFAULT_WINDOW):
+    """
+    STFT of every row of `frames` at once, without boundary padding.
+
+    Returns (freqs, times, spectra) with spectra of shape
+    (..., nperseg // 2 + 1, segments), scaled like `scipy.signal.stft`.
+    """
+    noverlap = nperseg // 2 if noverlap is None else noverlap
+    win = _window(window, nperseg)
+    segments = _segments(np.asarray(frames, dtype=float), nperseg, noverlap)
+    spectra = rfft(segments * win, axis=-1, workers=-1) / win.sum()
+    hop = nperseg - noverlap
+    times = (np.arange(segments.shape[-2]) * hop + nperseg / 2) / sample_rate
+    return rfftfreq(nperseg, 1.0 / sample_rate), times, np.swapaxes(spectra, -1, -2)
+
+
+def analyze_sweep(signals, sample_rate, nperseg=DEFAULT_SEGMENT_LENGTH, noverlap=None, window=DEFAULT_WINDOW,
+                  num_harmonics=NUM_HARMONICS):
+    """
+    Spectral summary of a whole sweep in one batched pass.
+
+    Parameters:
+    - signals: Dictionary keyed by (frequency, distance) or (wave, frequency,
+      distance), frequencies in kHz, as returned by `load_sweep` or
+      `SweepDataset.signals`.
+    - sample_rate: Capture sample rate in Hz.
+    - nperseg, noverlap, window: Welch parameters.
+    - num_harmonics: Harmonics measured, including the fundamental.
+
+    Returns a DataFrame with one row per capture, using the same key
+    columns as `compute_sweep_metrics`.
+    """
+    keys = list(signals)
+    if keys and len(keys[0]) == 3:
+        waves, frequencies, distances = zip(*keys)
+    else:
+        frequencies, distances = zip(*keys) if keys else ((), ())
+        waves = None
+    frequencies_khz = np.asarray(frequencies, dtype=float)
+
+    freqs, psd = welch_batch(stack_signals(signals), sample_rate, nperseg, noverlap, window)
+    features = spectral_features(freqs, psd, sample_rate, frequencies_khz * 1000.0, num_harmonics)
+
+    results = {
+        "Distance (cm)": np.asarray(distances),
+        "Frequency (kHz)": np.asarray(frequencies),
+        "Peak Frequency (kHz)": features['peak_frequency'] / 1000.0,
+        "Observed Frequency (kHz)": features['observed_frequency'] / 1000.0,
+        "Aliased": features['aliased'],
+        "Signal Power (dB)": 10 * np.log10(np.maximum(features['signal_power'], 1e-300)),
+        "SNR (dB)": features['snr_db'],
+        "THD": features['thd'],
+        "Noise Floor (dB/Hz)": 10 * np.log10(np.maximum(features['noise_floor'], 1e-300)),
+    }
+    for h in range(1, num_harmonics):
+        results[f"H{h + 1} (dBc)"] = 10 * np.log10(
+            np.maximum(features['harmonic_power'][:, h], 1e-300) / np.maximum(features['signal_power'], 1e-300))
+    if waves is not None:
+        results = {"Wave": np.asarray(waves), **results}
+    return pd.DataFrame(results)
+
+
+def response_surface(results_df, metric="Signal Power (dB)", axes=SWEEP_AXES, normalise=True):
+    """
+    Frequency-response surface of the mic from `analyze_sweep` output.
+
+    Returns (axis_values, tensor) like `sweep_tensor`. With `normalise`, dB
+    metrics are shifted so the strongest point of each wave is 0 dB.
+    """
+    axis_values, tensor = sweep_tensor(results_df, metric, axes)
+    if normalise and metric.endswith("(dB)"):
+        reduce_axes = tuple(i for i, axis in enumerate(a for a in axes if a in results_df.columns) if axis != "Wave")
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # All-NaN waves stay NaN
+            tensor = tensor - np.nanmax(tensor, axis=reduce_axes, keepdims=True)
+    return axis_values, tensor
@@ -0,0 +1,230 @@
+"""
+One index of the wave x frequency x distance sweep captures.
+
+The captures live in a directory tree such as
+
+    <root>/15 cm/sine/sine_wave_1k.csv
+    <root>/100cm/square/square_wave_20k.csv
+
+`SweepDataset.discover` walks the tree once and reads wave, frequency
+and distance from the paths. The folder names do not have to be
+consistent ("15 cm" and "100cm" both work). A dataset can also be saved
+to, and loaded from, a CSV manifest. All wave types are then served from
+the same index, so the analysis scripts share one parallel, cached
+`load_sweep` call instead of each hard-coding its own 35-path dictionary.
+
+Usage:
+    python -m sonisense.sweep <root> --manifest sweep.csv
+"""
+
+import argparse
+import csv
+import os
+import re
+
+# Where the original captures were recorded; override with SONISENSE_SWEEP_ROOT
+DEFAULT_SWEEP_ROOT = os.environ.get(
+    'SONISENSE_SWEEP_ROOT',
+    r'c:\Users\anees\Desktop\microphone raw data\Wave simulation\distance based',
+)
+
+# Grid and folder names of the original sweep, used when the tree cannot be walked
+SWEEP_WAVES = ('sine', 'square', 'triangle')
+SWEEP_FREQUENCIES = (1, 5, 10, 15, 20)
+SWEEP_DISTANCE_FOLDERS = {15: '15 cm', 50: '50 cm', 100: '100cm', 150: '150cm', 200: '200 cm', 250: '250 cm',
+                          300: '300 cm'}
+
+_FILE_PATTERN = re.compile(r'^(?P<wave>[a-z]+)_wave_(?P<frequency>\d+(?:\.\d+)?)\s*k(?:hz)?\.csv$', re.IGNORECASE)
+_DISTANCE_PATTERN = re.compile(r'^(?P<distance>\d+(?:\.\d+)?)\s*cm$', re.IGNORECASE)
+MANIFEST_FIELDS = ('wave', 'frequency_khz', 'distance_cm', 'path')
+
+
+def _number(text):
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+def parse_capture_path(path):
+    """
+    Returns (wave, frequency_khz, distance_cm) for a capture path, or None
+    when the path does not follow the sweep layout.
+    """
+    match = _FILE_PATTERN.match(os.path.basename(path))
+    if match is None:
+        return None
+    # The distance is the nearest enclosing "<n> cm" folder
+    directory = os.path.dirname(path)
+    while directory and directory != os.path.dirname(directory):
+        distance = _DISTANCE_PATTERN.match(os.path.basename(directory))
+        if distance is not None:
+            return match['wave'].lower(), _number(match['frequency']), _number(distance['distance'])
+        directory = os.path.dirname(directory)
+    return None
+
+
+class SweepDataset:
+    """
+    Index of sweep captures keyed by (wave, frequency in kHz, distance in cm).
+
+    Parameters:
+    - files: Dictionary mapping (wave, frequency, distance) to a CSV path.
+    """
+
+    def __init__(self, files):
+        self._files = dict(sorted(files.items()))
+        self._signals = None
+
+    @classmethod
+    def discover(cls, root):
+        """
+        Indexes every capture under `root` in one directory walk.
+        """
+        files = {}
+        for directory, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(directory, name)
+                key = parse_capture_path(path)
+                if key is None:
+                    continue
+                if key in files:
+                    raise ValueError(f"Two captures for {key}: {files[key]} and {path}")
+                files[key] = path
+        return cls(files)
+
+    @classmethod
+    def from_layout(cls, root, waves=SWEEP_WAVES, frequencies=SWEEP_FREQUENCIES, distance_folders=None):
+        """
+        Builds the index of the original sweep grid without touching the disk.
+        """
+        distance_folders = distance_folders or SWEEP_DISTANCE_FOLDERS
+        return cls({
+            (wave, frequency, distance): os.path.join(root, folder, wave, f'{wave}_wave_{frequency}k.csv')
+            for wave in waves for frequency in frequencies for distance, folder in distance_folders.items()
+        })
+
+    @classmethod
+    def from_files(cls, frequency_distance_files, wave):
+        """
+        Wraps one of the legacy {(frequency, distance): path} dictionaries.
+        """
+        return cls({(wave, f, d): path for (f, d), path in frequency_distance_files.items()})
+
+    @classmethod
+    def from_manifest(cls, path):
+        """
+        Loads an index saved with `save_manifest`. Relative paths are taken
+        relative to the manifest.
+        """
+        base = os.path.dirname(os.path.abspath(path))
+        files = {}
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                key = (row['wave'], _number(row['frequency_khz']), _number(row['distance_cm']))
+                files[key] = os.path.join(base, row['path'])
+        return cls(files)
+
+    def save_manifest(self, path, relative=True):
+        base = os.path.dirname(os.path.abspath(path))
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(MANIFEST_FIELDS)
+            for (wave, frequency, distance), file_path in self._files.items():
+                if relative:
+                    file_path = os.path.relpath(os.path.abspath(file_path), base)
+                writer.writerow([wave, frequency, distance, file_path])
+
+    def __len__(self):
+        return len(self._files)
+
+    def __iter__(self):
+        return iter(self._files)
+
+    @property
+    def waves(self):
+        return sorted({key[0] for key in self._files})
+
+    @property
+    def frequencies(self):
+        return sorted({key[1] for key in self._files})
+
+    @property
+    def distances(self):
+        return sorted({key[2] for key in self._files})
+
+    def files(self, wave=None):
+        """
+        Returns {(wave, frequency, distance): path}, or {(frequency, distance): path}
+        for a single wave type, the form the analysis functions take.
+        """
+        if wave is None:
+            return dict(self._files)
+        return {(f, d): path for (w, f, d), path in self._files.items() if w == wave}
+
+    def missing(self):
+        """
+        Returns the keys whose file does not exist.
+        """
+        return [key for key, path in self._files.items() if not os.path.exists(path)]
+
+    def signals(self, wave=None, **load_params):
+        """
+        Loads the captures, keyed like `files(wave)`.
+
+        All wave types are parsed in one `load_sweep` call on first use and
+        kept, so asking for each wave in turn costs a single parallel pass.
+        """
+        from .sweep_loader import load_sweep
+
+        if self._signals is None:
+            self._signals = load_sweep(self._files, **load_params)
+        if wave is None:
+            return dict(self._signals)
+        return {(f, d): signal for (w, f, d), signal in self._signals.items() if w == wave}
+
+    def metrics(self, wave=None, sample_rate=None, baseline=None):
+        """
+        Returns `compute_sweep_metrics` for one wave type or, with a Wave
+        column, for all of them.
+        """
+        from .sweep_stats import compute_sweep_metrics
+
+        return compute_sweep_metrics(self.signals(wave), sample_rate, baseline)
+
+    def spectrum(self, sample_rate, wave=None, **params):
+        """
+        Returns `analyze_sweep` for one wave type or for all of them in one pass.
+        """
+        from .spectral import analyze_sweep
+
+        return analyze_sweep(self.signals(wave), sample_rate, **params)
+
+
+def default_dataset(root=None):
+    """
+    Indexes the sweep under `root` (default `DEFAULT_SWEEP_ROOT`), falling
+    back to the original grid layout when the directory is not available.
+    """
+    root = root or DEFAULT_SWEEP_ROOT
+    if os.path.isdir(root):
+        return SweepDataset.discover(root)
+    return SweepDataset.from_layout(root)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index the SoniSense sweep captures.")
+    parser.add_argument('root', nargs='?', default=None)
+    parser.add_argument('--manifest', default=None, help="Write the index to this CSV")
+    args = parser.parse_args(argv)
+
+    dataset = default_dataset(args.root)
+    print(f"{len(dataset)} captures: waves {dataset.waves}, frequencies {dataset.frequencies} kHz, "
+          f"distances {dataset.distances} cm")
+    missing = dataset.missing()
+    if missing:
+        print(f"{len(missing)} captures not found")
+    if args.manifest:
+        dataset.save_manifest(args.manifest)
+
+
+if __name__ == "__main__":
+    main()
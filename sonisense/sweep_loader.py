@@ -0,0 +1,154 @@
+"""
+Parallel, cached loading of the frequency x distance sweep captures.
+
+The sweep CSVs keep the mic values in the second column (B) with a label
+row under the header. `load_sweep` parses only that column with the pandas
+C reader, spreads cache misses over a worker pool, and keeps the parsed
+arrays as `.npy` files keyed by the source file's path, size and mtime, so
+re-running an analysis only re-parses files that changed.
+"""
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .instrumentation import instrument
+
+CACHE_DIR = os.environ.get(
+    'SONISENSE_SWEEP_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'sonisense', 'sweeps'),
+)
+
+
+def load_microphone_data(file_path):
+    """
+    Loads microphone data from a CSV file, assuming column B contains mic values.
+    Skips the first row under the header, which contains the label.
+    """
+    try:
+        data = pd.read_csv(file_path, usecols=[1], skiprows=[1], dtype=np.float64, engine='c')
+        return data.iloc[:, 0].values
+    except ValueError:
+        pass
+
+    # Irregular files (stray text in the column): fall back to the original lenient parse
+    data = pd.read_csv(file_path)
+    try:
+        signal = data['B'][1:].astype(float).values  # Skip the label in B1
+    except KeyError:
+        signal = data.iloc[1:, 1].astype(float).values  # If 'B' column is not labeled
+    return signal
+
+
+class SweepCache:
+    """
+    Parsed-signal cache in memory and on disk.
+
+    Entries are named after a hash of the absolute source path plus its size
+    and mtime, so an edited or replaced CSV is never served stale.
+
+    Parameters:
+    - cache_dir: Directory for `.npy` files, or None to cache in memory only.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._memory = {}
+
+    def _key(self, file_path):
+        stat = os.stat(file_path)
+        digest = hashlib.sha1(os.path.abspath(file_path).encode()).hexdigest()[:16]
+        return digest, f"{digest}_{stat.st_size}_{stat.st_mtime_ns}.npy"
+
+    def get(self, file_path):
+        """
+        Returns the cached signal for `file_path`, or None on a miss.
+        """
+        digest, name = self._key(file_path)
+        if name in self._memory:
+            return self._memory[name]
+        if self.cache_dir is None:
+            return None
+        path = os.path.join(self.cache_dir, name)
+        try:
+            signal = np.load(path)
+        except (OSError, ValueError):
+            return None
+        self._memory[name] = signal
+        return signal
+
+    def put(self, file_path, signal):
+        """
+        Stores `signal` for `file_path`, replacing entries for older versions.
+        """
+        digest, name = self._key(file_path)
+        self._memory[name] = signal
+        if self.cache_dir is None:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for old in os.listdir(self.cache_dir):
+                if old.startswith(digest) and old != name:
+                    os.remove(os.path.join(self.cache_dir, old))
+            tmp_path = os.path.join(self.cache_dir, f"{name}.{os.getpid()}.tmp.npy")
+            np.save(tmp_path, signal)
+            os.replace(tmp_path, os.path.join(self.cache_dir, name))
+        except OSError:
+            pass  # The disk cache is an optimisation only
+
+
+_default_cache = None
+
+
+def default_cache():
+    """
+    Returns the process-wide cache used when `load_sweep` is not given one.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = SweepCache()
+    return _default_cache
+
+
+@instrument('load.sweep')
+def load_sweep(files, max_workers=None, executor='process', cache=None):
+    """
+    Loads every capture of a sweep concurrently.
+
+    Parameters:
+    - files: Dictionary mapping a key, e.g. (frequency, distance) or
+      (wave, frequency, distance), to a CSV path.
+    - max_workers: Pool size; defaults to the executor's own default.
+    - executor: 'process', 'thread' or None to parse serially.
+    - cache: A SweepCache, defaults to the shared on-disk cache. Pass
+      SweepCache(None) to keep results in memory only.
+
+    Returns a dictionary with the same keys mapping to 1-D float signals.
+    """
+    cache = cache or default_cache()
+    signals = {}
+    misses = {}
+    for key, file_path in files.items():
+        signal = cache.get(file_path)
+        if signal is None:
+            misses[key] = file_path
+        else:
+            signals[key] = signal
+
+    if misses:
+        paths = list(misses.values())
+        if executor is None or len(paths) == 1:
+            parsed = [load_microphone_data(path) for path in paths]
+        else:
+            pool_class = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+            with pool_class(max_workers=max_workers) as pool:
+                parsed = list(pool.map(load_microphone_data, paths))
+        for (key, file_path), signal in zip(misses.items(), parsed):
+            cache.put(file_path, signal)
+            signals[key] = signal
+
+    # Keep the caller's ordering
+    return {key: signals[key] for key in files}
@@ -0,0 +1,133 @@
+"""
+Batch statistics for the frequency x distance sweeps.
+
+`compute_sweep_metrics` turns a loaded sweep into one row per capture with
+variance, RMS, SNR against the idle baseline, THD and dominant-frequency
+error, computing each metric for all captures in a single array pass. The
+spectral metrics come from `tones.spectral_features`, so tones above
+Nyquist are measured where the ADC folds them.
+`sweep_tensor` then scatters any metric into a dense (distance x frequency
+x wave) grid in one step, so denser sweeps cost linear time instead of a
+masked search per grid cell.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .tones import NUM_HARMONICS, periodogram, spectral_features, stack_signals
+
+SWEEP_AXES = ("Distance (cm)", "Frequency (kHz)", "Wave")
+
+# Longest window used for the spectral metrics, in samples
+MAX_SPECTRUM_LENGTH = 1 << 16
+
+
+def _ragged_moments(signals):
+    """
+    Mean, variance and RMS of every signal, vectorized across unequal lengths.
+    """
+    if not signals:
+        return np.empty(0), np.empty(0), np.empty(0)
+    lengths = np.array([len(signal) for signal in signals])
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    flat = np.concatenate([np.asarray(signal, dtype=float) for signal in signals])
+
+    means = np.add.reduceat(flat, offsets) / lengths
+    # Centre before squaring, the ADC values sit on a ~2500 DC offset
+    centred = flat - np.repeat(means, lengths)
+    variances = np.add.reduceat(centred ** 2, offsets) / lengths
+    mean_squares = variances + means ** 2
+    return means, variances, np.sqrt(mean_squares)
+
+
+def _spectral_metrics(signals, sample_rate, expected_frequencies):
+    """
+    Dominant frequency, observed (folded) tone frequency and THD of every
+    signal from one Hann-windowed periodogram of the whole stack.
+    """
+    frames = stack_signals(signals, min(min(len(signal) for signal in signals), MAX_SPECTRUM_LENGTH))
+    freqs, psd = periodogram(frames, sample_rate)
+    features = spectral_features(freqs, psd, sample_rate, expected_frequencies, NUM_HARMONICS)
+    return features['peak_frequency'], features['observed_frequency'], features['thd']
+
+
+def compute_sweep_metrics(signals, sample_rate=None, baseline=None):
+    """
+    Computes per-capture metrics for a whole sweep.
+
+    Parameters:
+    - signals: Dictionary keyed by (frequency, distance) or
+      (wave, frequency, distance) with 1-D mic signals, as returned by
+      `load_sweep`. Frequencies are in kHz, distances in cm.
+    - sample_rate: Capture sample rate in Hz. The spectral metrics (THD,
+      dominant frequency and its error) are NaN when it is not given. The
+      error is against the expected tone folded into the sampled band, and
+      THD is NaN when the tone folds onto DC.
+    - baseline: Idle-noise variance, or an idle signal to take it from. SNR
+      is NaN when it is not given.
+
+    Returns a DataFrame with one row per capture.
+    """
+    keys = list(signals)
+    values = [signals[key] for key in keys]
+    if keys and len(keys[0]) == 3:
+        waves, frequencies, distances = zip(*keys)
+    else:
+        frequencies, distances = zip(*keys) if keys else ((), ())
+        waves = None
+
+    means, variances, rms = _ragged_moments(values)
+
+    if baseline is None:
+        snr = np.full(len(keys), np.nan)
+    else:
+        baseline_variance = np.var(baseline) if np.ndim(baseline) else float(baseline)
+        snr = 10 * np.log10(np.maximum(variances, 1e-12) / max(baseline_variance, 1e-12))
+
+    frequencies_khz = np.asarray(frequencies, dtype=float)
+    if sample_rate is None or not keys:
+        dominant = observed = thd = np.full(len(keys), np.nan)
+    else:
+        dominant, observed, thd = _spectral_metrics(values, sample_rate, frequencies_khz * 1000.0)
+        dominant, observed = dominant / 1000.0, observed / 1000.0
+
+    results = {
+        "Distance (cm)": np.asarray(distances),
+        "Frequency (kHz)": np.asarray(frequencies),
+        "Mean": means,
+        "Variance": variances,
+        "RMS": rms,
+        "SNR (dB)": snr,
+        "THD": thd,
+        "Dominant Frequency (kHz)": dominant,
+        "Frequency Error (kHz)": dominant - observed,
+    }
+    if waves is not None:
+        results = {"Wave": np.asarray(waves), **results}
+    return pd.DataFrame(results)
+
+
+def sweep_tensor(results_df, metric, axes=SWEEP_AXES):
+    """
+    Scatters one metric into a dense grid in a single indexing step.
+
+    Parameters:
+    - results_df: Output of `compute_sweep_metrics`.
+    - metric: Column to place in the grid, e.g. "Variance".
+    - axes: Columns that index the grid, in output dimension order. Axes not
+      present in results_df are dropped.
+
+    Returns (axis_values, tensor): a list with the sorted unique values of
+    each axis and the grid itself, with NaN for missing grid points.
+    """
+    axes = [axis for axis in axes if axis in results_df.columns]
+    axis_values = []
+    indices = []
+    for axis in axes:
+        values, inverse = np.unique(results_df[axis].values, return_inverse=True)
+        axis_values.append(values)
+        indices.append(inverse)
+
+    tensor = np.full([len(values) for values in axis_values], np.nan)
+    tensor[tuple(indices)] = results_df[metric].values
+    return axis_values, tensor
@@ -0,0 +1,17 @@
+import pytest
+
+from sonisense import filter_design, srp
+
+
+@pytest.fixture(autouse=True)
+def cache_dirs(tmp_path, monkeypatch):
+    """
+    Keeps the filter and SRP disk caches inside the test's temporary directory.
+    """
+    monkeypatch.setattr(filter_design, 'CACHE_DIR', str(tmp_path / 'filters'))
+    monkeypatch.setattr(srp, 'CACHE_DIR', str(tmp_path / 'srp'))
+    filter_design.clear_filter_cache()
+    srp.clear_srp_cache()
+    yield
+    filter_design.clear_filter_cache()
+    srp.clear_srp_cache()
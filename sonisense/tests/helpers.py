@@ -0,0 +1,43 @@
+"""
+Shared signal generators for the tests.
+"""
+
+import numpy as np
+
+from sonisense.geometry import SPEED_OF_SOUND, triangle_positions
+
+
+def random_splits(length, rng, max_block=500):
+    """
+    Block boundaries covering [0, length), including empty and one-sample blocks.
+    """
+    edges = [0, 0, 1]
+    while edges[-1] < length:
+        edges.append(min(length, edges[-1] + int(rng.integers(0, max_block))))
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def far_field_noise(azimuth, length, sample_rate, rng, positions=None, noise=0.05):
+    """
+    White noise arriving from `azimuth` degrees, delayed per mic in the
+    frequency domain, plus independent sensor noise. Shape (mics, length).
+    """
+    positions = triangle_positions() if positions is None else positions
+    direction = np.array([np.cos(np.deg2rad(azimuth)), np.sin(np.deg2rad(azimuth))])
+    delays = -(positions @ direction) / SPEED_OF_SOUND * sample_rate
+    spectrum = np.fft.rfft(rng.standard_normal(length))
+    shifts = np.exp(-2j * np.pi * np.fft.rfftfreq(length)[None, :] * delays[:, None])
+    return np.fft.irfft(spectrum * shifts, length) + noise * rng.standard_normal((len(positions), length))
+
+
+def backlog_stamps(length, sample_rate=1000.0, backlog=2000, burst=16, seed=0):
+    """
+    Host receive stamps: a startup backlog delivered in bursts of `burst`
+    rows that share one stamp, then ~1 ms steps with jitter.
+    """
+    rng = np.random.default_rng(seed)
+    true = np.arange(length) * 1000.0 / sample_rate
+    stamps = true - true[backlog] + rng.normal(0.0, 0.05, length)
+    bursts = np.arange(backlog) // burst
+    stamps[:backlog] = bursts * burst * 0.2
+    return np.maximum.accumulate(stamps)
@@ -0,0 +1,67 @@
+import threading
+
+import numpy as np
+
+from sonisense.acquisition import RingBuffer
+
+
+def write_range(ring, start, stop):
+    index = np.arange(start, stop)
+    ring.write(np.stack([index, -index]), index.astype(float))
+
+
+def test_read_returns_the_requested_range():
+    ring = RingBuffer(2, 100, dtype=np.int64)
+    write_range(ring, 0, 70)
+    write_range(ring, 70, 150)
+    samples, timestamps, start = ring.read(60, 140)
+    assert start == 60
+    np.testing.assert_array_equal(samples[0], np.arange(60, 140))
+    np.testing.assert_array_equal(samples[1], -np.arange(60, 140))
+    np.testing.assert_array_equal(timestamps, np.arange(60, 140))
+
+
+def test_overwritten_range_moves_start_forward():
+    ring = RingBuffer(2, 100, dtype=np.int64)
+    write_range(ring, 0, 250)
+    assert ring.position == 250 and ring.oldest == 150
+    samples, _, start = ring.read(0)
+    assert start == 150
+    np.testing.assert_array_equal(samples[0], np.arange(150, 250))
+
+
+def test_oversized_write_keeps_the_newest_samples():
+    ring = RingBuffer(2, 100, dtype=np.int64)
+    write_range(ring, 0, 30)
+    write_range(ring, 30, 380)
+    samples, timestamps, start = ring.read(0)
+    assert (ring.position, start) == (380, 280)
+    np.testing.assert_array_equal(samples[0], np.arange(280, 380))
+    np.testing.assert_array_equal(timestamps, np.arange(280, 380))
+
+
+def test_concurrent_reads_are_never_torn():
+    capacity = 4096
+    ring = RingBuffer(2, capacity, dtype=np.int64)
+    done = threading.Event()
+
+    def writer():
+        rng = np.random.default_rng(0)
+        position = 0
+        while not done.is_set():
+            length = int(rng.integers(1, 2 * capacity))
+            write_range(ring, position, position + length)
+            position += length
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(5000):
+            position = ring.position
+            samples, timestamps, start = ring.read(position - capacity, position)
+            expected = np.arange(start, start + samples.shape[1])
+            np.testing.assert_array_equal(samples[0], expected)
+            np.testing.assert_array_equal(timestamps, expected)
+    finally:
+        done.set()
+        thread.join()
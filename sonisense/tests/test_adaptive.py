@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from sonisense.adaptive import AdaptiveCanceller, FrequencyDomainLMS, adaptive_canceller, seed_weights
+from sonisense.calibration import CalibrationProfile, ChannelCalibrator
+
+SAMPLE_RATE = 1000.0
+FRAME_SIZE = 256
+LINES = ((8.0, 12.0), (50.0, 20.0), (90.0, 8.0))  # (Hz, amplitude) of the hum lines
+
+
+def hum(length, seed, noise=1.0):
+    # The idle interference: a few strong lines per mic on unit white noise
+    rng = np.random.default_rng(seed)
+    t = np.arange(length) / SAMPLE_RATE
+    return np.stack([sum(amplitude * np.cos(2 * np.pi * frequency * t + rng.uniform(0, 2 * np.pi))
+                         for frequency, amplitude in LINES) + noise * rng.standard_normal(length)
+                     for _ in range(3)])
+
+
+def reduction_db(signal, out):
+    return 10 * np.log10(np.var(signal, axis=1) / np.var(out, axis=1))
+
+
+@pytest.fixture(scope='module')
+def profile():
+    channels = {}
+    for index, samples in enumerate(hum(60000, seed=1) + 2500.0):
+        calibrator = ChannelCalibrator(SAMPLE_RATE)
+        calibrator.update(samples)
+        channels[f'mic{index + 1}'] = calibrator.result()
+    return CalibrationProfile(channels, SAMPLE_RATE)
+
+
+@pytest.mark.parametrize('method, minimum', [('nlms', 18.0), ('fdlms', 22.0)])
+def test_converges_to_near_the_noise_floor(method, minimum):
+    signal = hum(20000, seed=0)
+    # Cancelling every line perfectly leaves the unit noise
+    ideal = 10 * np.log10(np.var(signal, axis=1))
+    canceller = adaptive_canceller(method)
+    out = np.concatenate([canceller.process(signal[:, start:start + FRAME_SIZE])
+                          for start in range(0, signal.shape[1], FRAME_SIZE)], axis=1)
+
+    settled = reduction_db(signal[:, 5000:], out[:, 5000:])
+    assert np.all(settled > minimum)
+    assert np.all(settled < ideal + 0.5)
+
+
+@pytest.mark.parametrize('method', ['nlms', 'fdlms'])
+def test_seeded_filter_cancels_from_the_first_block(profile, method):
+    signal = hum(FRAME_SIZE, seed=0)
+    unseeded = adaptive_canceller(method).process(signal)
+    seeded = adaptive_canceller(method, profile).process(signal)
+
+    # Skip the samples whose reference still reaches into the zero history
+    np.testing.assert_allclose(reduction_db(signal[:, 64:], unseeded[:, 64:]), 0.0, atol=1e-9)
+    assert np.all(reduction_db(signal[:, 64:], seeded[:, 64:]) > 18.0)
+
+
+def test_assigned_weights_take_effect_in_the_frequency_domain(profile):
+    signal = hum(4 * FRAME_SIZE, seed=0)
+    weights = seed_weights(profile, SAMPLE_RATE)
+    canceller = FrequencyDomainLMS()
+    canceller.process(signal[:, :FRAME_SIZE])
+    canceller.weights = weights
+    canceller.adapt = False
+
+    fresh = FrequencyDomainLMS(weights=weights)
+    fresh.adapt = False
+    fresh.process(signal[:, :FRAME_SIZE])
+    np.testing.assert_allclose(canceller.process(signal[:, FRAME_SIZE:]), fresh.process(signal[:, FRAME_SIZE:]),
+                               atol=1e-9)
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        AdaptiveCanceller()
+    with pytest.raises(ValueError, match='Unknown adaptive filter'):
+        adaptive_canceller('rls')
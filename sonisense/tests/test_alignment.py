@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from scipy.signal import butter, sosfiltfilt
+
+from sonisense.alignment import align_channels, estimate_alignment, estimate_lag, fft_xcorr
+from sonisense.timebase import interpolate_at
+
+LENGTH = 200000
+PAD = 200
+
+
+@pytest.fixture(scope='module')
+def source():
+    # Band-limited noise, so the fractional delays are well defined
+    rng = np.random.default_rng(0)
+    return sosfiltfilt(butter(4, 0.2, output='sos'), rng.standard_normal(LENGTH + 2 * PAD))
+
+
+def delayed(source, lag, drift_ppm):
+    """
+    The source `lag` samples late at the centre, with the clock running `drift_ppm` off.
+    """
+    n = np.arange(LENGTH)
+    return interpolate_at(source, PAD + n - lag - drift_ppm * 1e-6 * (n - LENGTH / 2))
+
+
+def test_xcorr_peaks_at_an_integer_lag():
+    rng = np.random.default_rng(1)
+    ref = rng.standard_normal(5000)
+    other = np.concatenate([np.zeros(12), ref[:-12]])
+    lags, correlation = fft_xcorr(ref, other, max_lag=50)
+    assert lags[np.argmax(correlation)] == 12
+    assert estimate_lag(ref, other, decimation=1)[0] == pytest.approx(12.0, abs=1e-3)
+
+
+@pytest.mark.parametrize('lag, drift_ppm', [(37.3, -50.0), (-5.6, 20.0)])
+def test_recovers_sub_sample_lag_and_drift(source, lag, drift_ppm):
+    alignment = estimate_alignment(source[PAD:PAD + LENGTH], delayed(source, lag, drift_ppm))
+    assert alignment.lag == pytest.approx(lag, abs=0.1)
+    assert alignment.drift_ppm == pytest.approx(drift_ppm, abs=3.0)
+    assert alignment.peak > 0.5
+
+
+def test_aligned_channels_line_up(source):
+    ref = source[PAD:PAD + LENGTH]
+    aligned, alignments, start = align_channels([ref, delayed(source, 37.3, -50.0), delayed(source, -12.4, 0.0)])
+
+    assert alignments[0].lag == 0.0
+    assert aligned.shape[0] == 3 and aligned.shape[1] > LENGTH - 100
+    np.testing.assert_allclose(aligned[0], ref[start:start + aligned.shape[1]])
+    residual = np.abs(aligned[1:] - aligned[0]).max()
+    assert residual < 0.05 * np.abs(ref).max()
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from sonisense.batch import localise_archive, localise_array
+from sonisense.localisation import Localiser
+
+from .helpers import far_field_noise
+
+SAMPLE_RATE = 48000.0
+FRAME_SIZE = 256
+
+
+@pytest.fixture(scope='module')
+def capture():
+    # Two sources one after the other on a DC offset, like raw ADC codes
+    rng = np.random.default_rng(0)
+    signal = np.concatenate([far_field_noise(azimuth, 40 * FRAME_SIZE, SAMPLE_RATE, rng) for azimuth in (40, 250)],
+                            axis=1)
+    return 2500.0 + 100.0 * signal
+
+
+@pytest.mark.parametrize('solver', ['lookup', 'srp'])
+def test_matches_per_frame_processing(capture, solver):
+    localiser = Localiser(SAMPLE_RATE, solver=solver)
+    expected = [localiser.process(capture[:, start:start + FRAME_SIZE])
+                for start in range(0, capture.shape[1] - FRAME_SIZE + 1, FRAME_SIZE)]
+
+    azimuth, confidence = localise_array(Localiser(SAMPLE_RATE, solver=solver), capture, FRAME_SIZE,
+                                         chunk_frames=7)
+    np.testing.assert_allclose(azimuth, [result.azimuth for result in expected], atol=1e-9)
+    np.testing.assert_allclose(confidence, [result.confidence for result in expected], atol=1e-9)
+
+
+@pytest.mark.parametrize('hop', [FRAME_SIZE, FRAME_SIZE // 2, 100])
+def test_frame_ranges_match_one_pass(capture, hop):
+    whole = localise_array(Localiser(SAMPLE_RATE), capture, FRAME_SIZE, hop)
+    localiser = Localiser(SAMPLE_RATE)
+    edges = [0, 1, 5, 33, 34, 60, len(whole[0])]
+    parts = [localise_array(localiser, capture, FRAME_SIZE, hop, a, b) for a, b in zip(edges[:-1], edges[1:])]
+    np.testing.assert_allclose(np.concatenate([part[0] for part in parts]), whole[0], atol=1e-9)
+    np.testing.assert_allclose(np.concatenate([part[1] for part in parts]), whole[1], atol=1e-9)
+
+
+def test_archive_split_does_not_change_results(capture):
+    stack = np.stack([capture, capture[:, ::-1].copy()])
+    table = localise_archive(stack, SAMPLE_RATE, FRAME_SIZE, segment_frames=9, max_workers=1)
+
+    assert list(table['recording'].unique()) == [0, 1]
+    for index, samples in enumerate(stack):
+        azimuth, confidence = localise_array(Localiser(SAMPLE_RATE), samples, FRAME_SIZE)
+        rows = table[table['recording'] == index]
+        np.testing.assert_allclose(rows['azimuth'], azimuth, atol=1e-9)
+        np.testing.assert_allclose(rows['confidence'], confidence, atol=1e-9)
+        np.testing.assert_allclose(rows['timestamp'], (np.arange(len(rows)) * FRAME_SIZE + FRAME_SIZE // 2)
+                                   / SAMPLE_RATE * 1000.0)
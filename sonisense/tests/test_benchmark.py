@@ -0,0 +1,53 @@
+import csv
+import json
+
+import numpy as np
+import pytest
+
+from sonisense.benchmark import benchmark_case, main, response_metrics, run_benchmarks, write_csv
+
+
+def test_case_reports_throughput_latency_and_quality():
+    result = benchmark_case('kaiser', 51, 2, 5000, 'fft', block_size=512)
+
+    assert result['length'] == 5000 and result['channels'] == 2
+    assert result['samples_per_sec'] > 0
+    assert result['latency_p50_us'] <= result['latency_p99_us'] <= result['latency_max_us']
+    assert result['peak_memory_bytes'] > 0
+    assert result['stopband_attenuation_db'] > 40
+    assert 0.1 < result['cutoff_3db'] < 0.2
+
+
+def test_response_metrics_of_a_pass_through():
+    metrics = response_metrics(np.array([1.0]))
+    assert metrics['passband_ripple_db'] == pytest.approx(0.0, abs=1e-9)
+    assert metrics['stopband_attenuation_db'] == pytest.approx(0.0, abs=1e-9)
+    assert metrics['cutoff_3db'] == 1.0
+
+
+def test_grid_covers_every_combination():
+    results = run_benchmarks(['kaiser', 'gaussian'], lengths=[1e3], taps=[21, 51], channels=[1],
+                             engines=['direct', 'fft'], measure_memory=False)
+    assert len(results) == 8
+    cases = {(r['design'], r['num_taps'], r['engine']) for r in results}
+    assert cases == {(design, taps, engine) for design in ('kaiser', 'gaussian') for taps in (21, 51)
+                     for engine in ('direct', 'fft')}
+    assert all(r['peak_memory_bytes'] is None for r in results)
+
+
+def test_writes_json_and_csv(tmp_path):
+    main(['--designs', 'kaiser', '--lengths', '1e3', '--taps', '21', '--channels', '1', '--no-memory',
+          '--output', str(tmp_path / 'results.json'), '--csv', str(tmp_path / 'results.csv')])
+
+    with open(tmp_path / 'results.json') as f:
+        document = json.load(f)
+    with open(tmp_path / 'results.csv', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert 'numpy' in document['environment']
+    assert len(document['results']) == len(rows) == 2
+    assert [row['engine'] for row in rows] == [r['engine'] for r in document['results']]
+
+
+def test_empty_results_give_an_empty_csv(tmp_path):
+    write_csv([], tmp_path / 'empty.csv')
+    assert (tmp_path / 'empty.csv').read_text() == ''
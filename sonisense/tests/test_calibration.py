@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sonisense.calibration import CalibrationProfile, calibrate_captures
+
+from .helpers import backlog_stamps
+
+
+@pytest.fixture
+def captures(tmp_path):
+    rng = np.random.default_rng(0)
+    paths = []
+    for mic, offset in enumerate((2500, 2480, 2530)):
+        stamps = backlog_stamps(12000, seed=mic)
+        path = tmp_path / f'mic{mic + 1}.csv'
+        pd.DataFrame({'Time (ms)': stamps, 'Mic Value': np.rint(offset + rng.normal(0, 4, len(stamps)))}).to_csv(
+            path, index=False)
+        paths.append(str(path))
+    return paths
+
+
+def test_rate_is_estimated_past_the_startup_backlog(captures):
+    profile = calibrate_captures(captures, chunksize=1000)
+    assert profile.sample_rate == pytest.approx(1000.0, abs=0.5)
+
+
+def test_profile_round_trip(captures, tmp_path):
+    profile = calibrate_captures(captures, sample_rate=1000.0)
+    np.testing.assert_allclose(profile.dc_offsets(), [2500, 2480, 2530], atol=0.5)
+    np.testing.assert_allclose(profile.noise_std(), 4.0, rtol=0.1)
+    profile.save(tmp_path / 'profile.json')
+    loaded = CalibrationProfile.load(tmp_path / 'profile.json')
+    assert loaded.sample_rate == profile.sample_rate
+    np.testing.assert_allclose(loaded.dc_offsets(), profile.dc_offsets())
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from scipy.signal import lfilter
+
+from sonisense.decimation import MultistageDecimator, PolyphaseDecimator
+from sonisense.filter_design import design_filter
+from sonisense.pipeline import DecimationStage, Frame
+
+from .helpers import random_splits
+
+
+@pytest.mark.parametrize('factor', [2, 3, 5])
+def test_polyphase_matches_filter_then_downsample(factor):
+    rng = np.random.default_rng(factor)
+    taps = design_filter('kaiser', num_taps=31)
+    signal = rng.standard_normal((2, 3001))
+    out = PolyphaseDecimator(taps, factor).process(signal)
+    np.testing.assert_allclose(out, lfilter(taps, 1.0, signal, axis=-1)[:, ::factor], atol=1e-12)
+
+
+@pytest.mark.parametrize('factor', [4, 6, 8])
+@pytest.mark.parametrize('method', ['kaiser', 'sinc_hamming'])
+def test_block_split_gives_identical_output(factor, method):
+    rng = np.random.default_rng(factor)
+    signal = rng.standard_normal((3, 20000))
+    whole = MultistageDecimator(factor, method=method).process(signal)
+
+    decimator = MultistageDecimator(factor, method=method)
+    parts = [decimator.process(signal[:, a:b]) for a, b in random_splits(signal.shape[1], rng, max_block=700)]
+    np.testing.assert_allclose(np.concatenate(parts, axis=1), whole, atol=1e-12)
+    assert whole.shape[1] == -(-signal.shape[1] // factor)
+
+
+def test_aliasing_stays_below_the_design_attenuation():
+    assert MultistageDecimator(8).aliasing()['aliasing_db'] < -55.0
+
+
+@pytest.mark.parametrize('factor', [4, 8, 10])
+def test_default_passband_fits_every_factor(factor):
+    decimator = MultistageDecimator(factor)
+    assert decimator.passband * factor < 1
+    assert decimator.aliasing()['aliasing_db'] < -55.0
+
+
+def test_passband_above_the_output_nyquist_is_rejected():
+    with pytest.raises(ValueError, match='output Nyquist'):
+        MultistageDecimator(10, passband=0.1)
+
+
+def test_stage_positions_follow_the_input_grid_across_gaps():
+    factor = 4
+    rng = np.random.default_rng(0)
+    signal = rng.standard_normal((3, 2000))
+    stamps = np.arange(signal.shape[1]) * 0.5
+    # A gap that ends off the output grid, and frames shorter than the factor
+    edges = [(0, 256), (256, 512), (701, 703), (703, 900), (900, 1300)]
+    stage = DecimationStage(factor)
+    frames = [stage.process(Frame(a, stamps[a:b], signal[:, a:b])) for a, b in edges]
+    frames = [frame for frame in frames if frame is not None]
+
+    positions = np.concatenate([frame.position + np.arange(frame.samples.shape[1]) for frame in frames])
+    assert np.all(np.diff(positions) > 0)
+    np.testing.assert_array_equal(np.concatenate([frame.timestamps for frame in frames]),
+                                  stamps[positions * factor])
+    assert positions[np.searchsorted(positions * factor, 701)] * factor == 704
+
+    # After the gap the output is a fresh decimator started at input 704
+    decimator = MultistageDecimator(factor)
+    decimator.reset(signal[:, 701])
+    expected = decimator.process(signal[:, 704:1300])
+    resumed = np.concatenate([frame.samples for frame in frames if frame.position * factor >= 704], axis=1)
+    np.testing.assert_allclose(resumed, expected, atol=1e-12)
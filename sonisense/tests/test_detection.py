@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from sonisense.detection import StaLta, detect_events
+
+SAMPLE_RATE = 1000.0
+BURSTS = (6500, 9000, 11000)
+
+
+@pytest.fixture(scope='module')
+def signals():
+    rng = np.random.default_rng(0)
+    signals = 2500.0 + rng.normal(0.0, 3.0, (3, 12000))
+    for start in BURSTS:
+        signals[:, start:start + 150] += rng.normal(0.0, 60.0, (3, 150))
+    return signals
+
+
+def detect(signals, block_size):
+    return detect_events(signals, SAMPLE_RATE, block_size=block_size)
+
+
+def test_finds_the_bursts(signals):
+    events = detect(signals, 4096)
+    assert [event.start for event in events] == pytest.approx(BURSTS, abs=20)
+    assert all(event.stop - event.start < 400 for event in events)
+
+
+@pytest.mark.parametrize('block_size', [1, 64, 4999, 5000, 5001, 12000])
+def test_events_do_not_depend_on_block_size(signals, block_size):
+    assert detect(signals, block_size) == detect(signals, 4096)
+
+
+def test_nothing_triggers_during_warm_up():
+    sta_lta = StaLta(SAMPLE_RATE, 1, lta=2.0)
+    ratio = np.concatenate([sta_lta.process(np.full((1, 1), 2500.0)), sta_lta.process(np.full((1, 1998), 2500.0))])
+    np.testing.assert_array_equal(ratio, 1.0)
+    assert sta_lta.process(np.full((1, 5), 2500.0)).shape == (5,)
@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+import pytest
+
+from sonisense import filter_design
+from sonisense.filter_design import _cache_key, clear_filter_cache, design_filter
+
+
+def test_cache_key_is_canonical():
+    key = _cache_key('kaiser', {})
+    assert _cache_key('kaiser', {'num_taps': 51.0, 'cutoff': 0.10, 'beta': 8.6}) == key
+    assert _cache_key('kaiser', {'beta': 8.6, 'num_taps': np.int64(51)}) == key
+    assert _cache_key('kaiser', {'cutoff': 1 / 10}) == key
+    assert _cache_key('kaiser', {'cutoff': 0.2}) != key
+
+
+def test_equivalent_parameters_share_one_design():
+    taps = design_filter('kaiser')
+    assert design_filter('kaiser', num_taps=51.0, cutoff=0.10) is taps
+    assert not taps.flags.writeable
+    assert len(os.listdir(filter_design.CACHE_DIR)) == 1
+
+
+def test_disk_cache_round_trip():
+    taps = design_filter('sinc_hamming', num_taps=31)
+    clear_filter_cache()
+    cached = design_filter('sinc_hamming', num_taps=31)
+    assert cached is not taps
+    np.testing.assert_array_equal(cached, taps)
+    np.testing.assert_array_equal(design_filter('sinc_hamming', cache=False, num_taps=31), taps)
+
+
+def test_memory_only_cache_writes_nothing():
+    design_filter('gaussian', cache='memory')
+    assert not os.path.exists(filter_design.CACHE_DIR)
+
+
+def test_unknown_design_and_parameter():
+    with pytest.raises(ValueError, match="Unknown filter design"):
+        design_filter('butterworth')
+    with pytest.raises(TypeError):
+        design_filter('gaussian', cutoff=0.2)
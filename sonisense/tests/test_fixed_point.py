@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from sonisense.filter_design import design_filter
+from sonisense.fixed_point import QuantizedFIR, quantize_taps, reference_check
+
+from .helpers import random_splits
+
+
+def test_output_saturates_to_out_dtype():
+    fir = QuantizedFIR([0.5, 0.5], q=15, out_dtype=np.int8)
+    out = fir.process(np.array([1000, 1000, -1000, -1000, 100, 100]))
+    np.testing.assert_array_equal(out, [127, 127, 0, -128, -128, 100])
+
+
+def test_rounding_modes_differ_by_half_an_lsb():
+    # 0.25 x 3 = 0.75: a bare shift floors it, rounding adds half an LSB first
+    block = np.array([3, -3, 1, 2])
+    floor = QuantizedFIR([0.25], q=15, rounding='floor').process(block)
+    rounded = QuantizedFIR([0.25], q=15, rounding='round').process(block)
+    np.testing.assert_array_equal(floor, [0, -1, 0, 0])
+    np.testing.assert_array_equal(rounded, [1, -1, 0, 1])
+
+
+def test_blocks_match_one_pass():
+    rng = np.random.default_rng(0)
+    codes = rng.integers(0, 4096, size=(3, 3000))
+    fir = QuantizedFIR('sinc_hamming', q=31, num_taps=21, cutoff=0.1)
+    whole = fir.process(codes)
+    fir.reset()
+    parts = [fir.process(codes[:, start:stop]) for start, stop in random_splits(codes.shape[1], rng)]
+    np.testing.assert_array_equal(np.concatenate(parts, axis=1), whole)
+
+
+def test_q31_quantizes_more_finely_than_q15():
+    taps = design_filter('sinc_hamming', num_taps=21, cutoff=0.1)
+    q15, q31 = QuantizedFIR(taps, q=15), QuantizedFIR(taps, q=31)
+    assert q15.taps.dtype == np.int16 and q31.taps.dtype == np.int32
+    assert q31.quantization_error < q15.quantization_error / 1000
+    assert q15.quantization_error <= 0.5 / (1 << 15)
+
+
+def test_out_of_range_taps_and_accumulator_overflow_are_rejected():
+    with pytest.raises(ValueError, match='range'):
+        quantize_taps([1.0], q=15)
+    with pytest.raises(ValueError, match='overflow'):
+        QuantizedFIR([0.9] * 8, q=31, input_max=1 << 40)
+    with pytest.raises(TypeError):
+        QuantizedFIR([0.5]).process(np.array([1.0, 2.0]))
+
+
+@pytest.mark.parametrize('q, exact', [(15, 0.80), (31, 0.86)])
+def test_reference_check_reproduces_the_device(q, exact):
+    match = reference_check(q=q)
+    assert match.exact >= exact
+    assert match.max_error <= 1
+    assert match.lag == -1
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sonisense.ingest import EXCEL_MAX_ROWS, export_excel, ingest, iter_column_chunks, load_column
+
+
+@pytest.fixture
+def values():
+    return np.random.default_rng(0).integers(900, 1700, 10000).astype(float)
+
+
+def messy_column(values):
+    # Stray text and empty cells, as in the hand-edited sheets
+    column = values.astype(object)
+    column[[5, 17, len(column) - 3]] = ['n/a', None, 'x']
+    return column
+
+
+@pytest.mark.parametrize('chunksize', [7, 999, 1 << 16])
+def test_chunked_csv_matches_one_pass(tmp_path, values, chunksize):
+    source = tmp_path / 'capture.csv'
+    pd.DataFrame({'Time': np.arange(len(values)), 'Data': messy_column(values)}).to_csv(source, index=False)
+
+    count = ingest(str(source), str(tmp_path / 'column.npy'), column=1, lower=1100, upper=1500, chunksize=chunksize,
+                   header=0)
+    column = load_column(str(tmp_path / 'column.npy'))
+
+    kept = np.delete(values, [5, 17, len(values) - 3])
+    kept = kept[(kept >= 1100) & (kept <= 1500)]
+    assert count == len(kept)
+    assert isinstance(column, np.memmap)
+    np.testing.assert_array_equal(column, kept)
+
+
+def test_excel_is_streamed_in_chunks(tmp_path, values):
+    source = tmp_path / 'capture.xlsx'
+    pd.DataFrame({'Data': messy_column(values[:3000])}).to_excel(source, index=False, header=False)
+
+    chunks = list(iter_column_chunks(str(source), chunksize=1000))
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 1000]
+
+    count = ingest(str(source), str(tmp_path / 'column.npy'), chunksize=700)
+    np.testing.assert_array_equal(load_column(str(tmp_path / 'column.npy')), np.delete(values[:3000], [5, 17, 2997]))
+    assert count == 2997
+
+
+def test_failed_ingest_leaves_no_output(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ingest(str(tmp_path / 'missing.csv'), str(tmp_path / 'column.npy'))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_excel_export_refuses_past_the_row_limit(tmp_path):
+    with pytest.raises(ValueError, match='Excel limit'):
+        export_excel(np.zeros(EXCEL_MAX_ROWS + 1), tmp_path / 'big.xlsx')
@@ -0,0 +1,137 @@
+import json
+import threading
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from sonisense.instrumentation import REGISTRY, TIME_BUCKETS, Histogram, Registry, instrument
+
+
+@pytest.fixture
+def registry():
+    REGISTRY.reset()
+    yield REGISTRY
+    REGISTRY.disable()
+    REGISTRY.reset()
+
+
+@instrument('test.work', samples_arg=0)
+def work(block, fail=False):
+    if fail:
+        raise RuntimeError("failed")
+    return np.ones(block.size * 4)
+
+
+def test_quantiles_follow_the_observations():
+    values = np.random.default_rng(0).lognormal(np.log(1e-3), 1.0, 20000)
+    histogram = Histogram(TIME_BUCKETS)
+    for value in values:
+        histogram.observe(value)
+
+    assert histogram.count == len(values) and histogram.sum == pytest.approx(values.sum())
+    assert (histogram.min, histogram.max) == (values.min(), values.max())
+    for q in (0.5, 0.9, 0.99):
+        assert histogram.quantile(q) == pytest.approx(np.quantile(values, q), rel=0.1)
+    assert histogram.quantile(1.0) == pytest.approx(values.max())
+    assert Histogram(TIME_BUCKETS).quantile(0.5) == 0.0
+
+
+def test_disabled_wrappers_record_nothing(registry):
+    assert not registry.enabled
+    work(np.zeros(10))
+    with registry.measure('test.block'):
+        pass
+    assert registry.snapshot() == {}
+
+
+def test_calls_samples_and_errors_are_recorded(registry):
+    registry.enable()
+    for _ in range(3):
+        work(np.zeros((2, 50)))
+    with pytest.raises(RuntimeError):
+        work(np.zeros(5), fail=True)
+
+    metrics = registry.snapshot()['test.work']
+    assert metrics['calls'] == 4 and metrics['errors'] == 1 and metrics['samples'] == 305
+    assert metrics['seconds']['count'] == 4 and sum(metrics['seconds']['buckets'].values()) == 4
+    assert metrics['allocated_bytes']['count'] == 0
+
+
+def test_prometheus_and_json_output(registry, tmp_path):
+    registry.enable()
+    for _ in range(5):
+        work(np.zeros(8))
+    registry.observe('test.other', 20.0, samples=7)
+
+    text = registry.to_prometheus()
+    prefix = 'sonisense_stage_seconds_bucket{stage="test.work"'
+    buckets = [line for line in text.splitlines() if line.startswith(prefix)]
+    counts = [int(line.rsplit(' ', 1)[1]) for line in buckets]
+    assert len(buckets) == len(TIME_BUCKETS) + 1
+    assert counts == sorted(counts) and counts[-1] == 5
+    assert buckets[-1].startswith('sonisense_stage_seconds_bucket{stage="test.work",le="+Inf"}')
+    assert 'sonisense_stage_seconds_bucket{stage="test.other",le="+Inf"} 1' in text
+    assert 'sonisense_stage_samples_total{stage="test.other"} 7' in text
+    assert '# TYPE sonisense_stage_seconds histogram' in text
+    assert 'sonisense_stage_allocated_bytes' not in text
+
+    registry.dump(str(tmp_path / 'metrics.json'))
+    registry.dump(str(tmp_path / 'metrics.prom'))
+    with open(tmp_path / 'metrics.json') as f:
+        document = json.load(f)
+    assert sorted(document['stages']) == ['test.other', 'test.work']
+    assert document['stages']['test.other']['seconds']['max'] == 20.0
+    assert (tmp_path / 'metrics.prom').read_text() == registry.to_prometheus()
+
+
+def test_allocations_are_recorded_on_the_main_thread_only(registry):
+    registry.enable(trace_allocations=True)
+    with registry.measure('test.outer'):
+        work(np.zeros(100000))  # Allocates 3.2 MB
+        np.ones(10000)
+    thread = threading.Thread(target=work, args=(np.zeros(100000),))
+    thread.start()
+    thread.join()
+
+    stages = registry.snapshot()
+    inner = stages['test.work']['allocated_bytes']
+    assert stages['test.work']['calls'] == 2 and inner['count'] == 1
+    assert 3.2e6 <= inner['max'] < 3.3e6
+    assert stages['test.outer']['allocated_bytes']['max'] >= inner['max']
+
+
+def test_hooks_are_released_only_when_owned():
+    registry = Registry()
+    tracemalloc.start()
+    try:
+        registry.enable(trace_allocations=True)
+        registry.disable()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+    registry.enable(trace_allocations=True)
+    assert tracemalloc.is_tracing()
+    registry.disable()
+    assert not tracemalloc.is_tracing()
+
+
+def test_profiler_resumes_after_disable(tmp_path):
+    registry = Registry()
+    with pytest.raises(ValueError, match='Profiling is off'):
+        registry.dump_profile(str(tmp_path / 'none.pstats'))
+    registry.enable(profile=True)
+    profiler = registry.profiler
+    registry.disable()
+    registry.enable(profile=True)
+    try:
+        assert registry.profiler is profiler
+        work(np.zeros(4))
+    finally:
+        registry.disable()
+    registry.dump_profile(str(tmp_path / 'work.pstats'))
+
+    import pstats
+    functions = {function for _, _, function in pstats.Stats(str(tmp_path / 'work.pstats')).stats}
+    assert 'work' in functions
@@ -0,0 +1,43 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run(*code_or_args):
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONWARNINGS='default')
+    return subprocess.run([sys.executable, *code_or_args], capture_output=True, text=True, env=env, check=True)
+
+
+def test_import_is_lazy():
+    result = run('-c', "import sys, sonisense; print(sorted(m for m in sys.modules if m.startswith('sonisense.')))"
+                       "; sonisense.Localiser; print('sonisense.localisation' in sys.modules)")
+    assert result.stdout.splitlines() == ['[]', 'True']
+
+
+def test_every_export_resolves():
+    import sonisense
+
+    for name in sonisense.__all__:
+        assert getattr(sonisense, name) is not None
+    with pytest.raises(AttributeError):
+        sonisense.not_an_export
+
+
+@pytest.mark.parametrize('module', ['decimation', 'pipeline', 'srp'])
+def test_module_entry_points_run_once(module):
+    assert 'RuntimeWarning' not in run('-m', f'sonisense.{module}', '--help').stderr
+
+
+def test_instrumentation_cli_sees_the_decorated_stages(tmp_path):
+    path = tmp_path / 'metrics.json'
+    result = run('-m', 'sonisense.instrumentation', '--frames', '20', '-o', str(path))
+    assert 'RuntimeWarning' not in result.stderr
+    with open(path) as f:
+        stages = json.load(f)['stages']
+    assert {'filter.fir', 'localise.frame', 'spectral.welch'} <= set(stages)
+    assert stages['localise.frame']['calls'] == 20
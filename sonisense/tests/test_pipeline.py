@@ -0,0 +1,135 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from sonisense.acquisition import RingBuffer
+from sonisense.detection import EventDetector, detect_events
+from sonisense.pipeline import (DCRemoval, EnergyDetector, EventStage, Frame, LocaliserStage, Pipeline, Stage,
+                                default_stages)
+
+SAMPLE_RATE = 1000.0
+FRAME_SIZE = 250
+BURSTS = (6500, 9000, 11000)
+
+
+class ListSource:
+    name = 'source'
+
+    def __init__(self, frames, ring=None):
+        self.items = frames
+        self.ring = ring
+
+    async def frames(self):
+        for frame in self.items:
+            if self.ring is not None:
+                self.ring.write(frame.samples, frame.timestamps)
+            yield frame
+            await asyncio.sleep(0)
+
+
+class PassThrough(Stage):
+    name = 'pass'
+
+    def process(self, frame):
+        return frame
+
+
+class Scale(Stage):
+    name = 'scale'
+
+    def process(self, frame):
+        if frame.position == 3:
+            raise RuntimeError("bad frame")
+        return frame._replace(samples=frame.samples * 2)
+
+
+class EvenOnly(Stage):
+    name = 'even'
+    offload = True
+
+    def process(self, frame):
+        return frame if frame.position % 2 == 0 else None
+
+
+def numbered(count):
+    return [Frame(i, np.full(4, float(i)), np.full((3, 4), float(i))) for i in range(count)]
+
+
+def test_frames_flow_in_order_with_counters():
+    pipeline = Pipeline(ListSource(numbered(10)), [Scale(), EvenOnly()], queue_size=2)
+    asyncio.run(pipeline.run())
+
+    assert [frame.position for frame in pipeline.results] == [0, 2, 4, 6, 8]
+    np.testing.assert_array_equal(pipeline.results[1].samples, 4.0)
+    stats = pipeline.stats()
+    assert list(stats) == ['source', 'scale', 'even', 'sink']
+    assert stats['scale']['received'] == 10 and stats['scale']['errors'] == 1
+    assert stats['even']['filtered'] == 4
+    assert stats['sink']['received'] == 5
+    assert all(counters['max_queue'] <= 2 for counters in stats.values())
+
+
+def test_drop_oldest_keeps_a_slow_sink_current():
+    received = []
+
+    async def slow_sink(frame):
+        received.append(frame.position)
+        await asyncio.sleep(0.01)
+
+    pipeline = Pipeline(ListSource(numbered(50)), [PassThrough()], slow_sink, queue_size=1, overflow='drop_oldest')
+    asyncio.run(pipeline.run())
+
+    # Every frame is either delivered or counted as dropped, and the newest always gets through
+    dropped = sum(counters['dropped'] for counters in pipeline.stats().values())
+    assert dropped > 0 and dropped + len(received) == 50
+    assert received == sorted(received) and received[-1] == 49
+    with pytest.raises(ValueError):
+        Pipeline(ListSource([]), [], overflow='spill')
+
+
+@pytest.fixture(scope='module')
+def bursts():
+    rng = np.random.default_rng(0)
+    signals = 2500.0 + rng.normal(0.0, 3.0, (3, 12000))
+    for start in BURSTS:
+        signals[:, start:start + 150] += rng.normal(0.0, 60.0, (3, 150))
+    return np.rint(signals)  # ADC codes, as the ring stores them
+
+
+def test_event_stage_emits_the_windows_from_the_ring(bursts):
+    ring = RingBuffer(3, 4096)
+    timestamps = np.arange(bursts.shape[1]) / SAMPLE_RATE * 1000.0
+    frames = [Frame(start, timestamps[start:start + FRAME_SIZE], bursts[:, start:start + FRAME_SIZE])
+              for start in range(0, bursts.shape[1], FRAME_SIZE)]
+    detector = EventDetector(SAMPLE_RATE, 3)
+    stage = EventStage(detector, ring)
+    pipeline = Pipeline(ListSource(frames, ring), [stage])
+    asyncio.run(pipeline.run())
+
+    # The last event's post-roll runs past the end of the stream, so only the completed ones come out
+    expected = [detector.window(event) for event in detect_events(bursts, SAMPLE_RATE)]
+    windows = [(frame.position, frame.position + frame.samples.shape[1]) for frame in pipeline.results]
+    assert windows == expected[:len(windows)] and len(windows) >= 2
+    for frame in pipeline.results:
+        start, stop = frame.position, frame.position + frame.samples.shape[1]
+        np.testing.assert_array_equal(frame.samples, bursts[:, start:stop])
+        np.testing.assert_array_equal(frame.timestamps, timestamps[start:stop])
+    assert stage.missed == 0
+
+
+def test_default_stages_wires_the_detector():
+    energy = default_stages(SAMPLE_RATE)
+    assert [type(stage) for stage in energy] == [DCRemoval, type(energy[1]), EnergyDetector, LocaliserStage]
+
+    ring = RingBuffer(3, 4096)
+    stalta = default_stages(SAMPLE_RATE, detector='stalta', ring=ring, detector_params={'lta': 2.0})
+    assert isinstance(stalta[0], EventStage) and stalta[0].ring is ring
+    assert stalta[0].detector.sta_lta.channels == 3
+    assert not any(isinstance(stage, EnergyDetector) for stage in stalta)
+    assert isinstance(stalta[-1], LocaliserStage)
+
+    with pytest.raises(ValueError, match="ring"):
+        default_stages(SAMPLE_RATE, detector='stalta')
+    with pytest.raises(ValueError, match="Unknown detector"):
+        default_stages(SAMPLE_RATE, detector='threshold')
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sonisense.recording import ALIGNMENT, Recording, convert_csv_captures, read_header, write_recording
+
+
+@pytest.fixture
+def samples():
+    return np.random.default_rng(0).integers(0, 4096, size=(3, 5000)).astype(np.uint16)
+
+
+@pytest.mark.parametrize('per_channel', [False, True])
+def test_round_trip(tmp_path, samples, per_channel):
+    timestamps = np.arange(samples.shape[1]) * 1.25
+    if per_channel:
+        timestamps = timestamps + np.array([[0.0], [0.1], [0.2]])
+    path = tmp_path / 'capture.ssr'
+    write_recording(path, samples, timestamps, 800.0, board='V1', metadata={'room': 'lab'})
+
+    with Recording(path) as recording:
+        assert len(recording) == samples.shape[1]
+        assert recording.sample_rate == 800.0 and recording.board == 'V1'
+        assert recording.channels == ['mic1', 'mic2', 'mic3']
+        assert recording.header['metadata'] == {'room': 'lab'}
+        np.testing.assert_array_equal(recording.samples, samples)
+        np.testing.assert_array_equal(recording.channel('mic2'), samples[1])
+        np.testing.assert_array_equal(recording.timestamps('mic3'), np.atleast_2d(timestamps)[-1])
+
+
+def test_reads_are_views_onto_the_file(tmp_path, samples):
+    path = tmp_path / 'capture.ssr'
+    write_recording(path, samples, np.arange(samples.shape[1], dtype=float), 1000.0)
+    header = read_header(path)
+    assert header['timestamps_offset'] % ALIGNMENT == 0 and header['samples_offset'] % ALIGNMENT == 0
+
+    with Recording(path) as recording:
+        block, stamps = recording.slice(1000, 1200)
+        assert isinstance(block, np.memmap) and not block.flags.writeable
+        np.testing.assert_array_equal(block, samples[:, 1000:1200])
+        np.testing.assert_array_equal(stamps[0], np.arange(1000, 1200))
+        # Channel-major on disk: one mic is one contiguous run of bytes
+        assert recording.channel(1).flags.c_contiguous
+
+
+def test_rejects_bad_input(tmp_path, samples):
+    with pytest.raises(ValueError, match='uint16'):
+        write_recording(tmp_path / 'bad.ssr', samples.astype(int) - 1, np.arange(samples.shape[1]), 1000.0)
+    with pytest.raises(ValueError, match='board'):
+        write_recording(tmp_path / 'bad.ssr', samples, np.arange(samples.shape[1]), 1000.0, board='V3')
+    (tmp_path / 'other.bin').write_bytes(b'x' * 64)
+    with pytest.raises(ValueError, match='not a SoniSense recording'):
+        read_header(tmp_path / 'other.bin')
+
+
+def test_converts_per_mic_csv_captures(tmp_path):
+    rng = np.random.default_rng(1)
+    paths = []
+    for mic, length in enumerate((3000, 2900, 3100)):
+        path = tmp_path / f'mic{mic + 1}.csv'
+        pd.DataFrame({'Time (ms)': np.arange(length) * 1.0 + mic,
+                      'Mic Value': rng.integers(2000, 3000, length)}).to_csv(path, index=False)
+        paths.append(str(path))
+    convert_csv_captures(paths, tmp_path / 'capture.ssr')
+
+    with Recording(tmp_path / 'capture.ssr') as recording:
+        assert len(recording) == 2900
+        assert recording.sample_rate == pytest.approx(1000.0)
+        assert recording.header['metadata']['source_lengths'] == [3000, 2900, 3100]
+        assert recording.channel_map == {'mic1': 'Q1', 'mic2': 'Q2', 'mic3': 'Q3'}
+        np.testing.assert_array_equal(recording.channel(2), pd.read_csv(paths[2])['Mic Value'].values[:2900])
+        np.testing.assert_array_equal(recording.timestamps(1), np.arange(2900) + 1.0)
@@ -0,0 +1,70 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from sonisense.report import FigureJob, job_hash, render_report
+
+
+def write_capture(path, values):
+    with open(path, 'w') as f:
+        f.write('A,B\nlabel,Mic Value\n')
+        f.writelines(f'{i},{value}\n' for i, value in enumerate(values))
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    capture = tmp_path / 'capture.csv'
+    write_capture(capture, np.arange(50))
+    demo = {'method': 'kaiser', 'design': {'num_taps': 21}, 'mode': 'causal', 'suffix': '', 'seed': 0,
+            'length': 200, 'dpi': 20}
+    plot = {'wave': 'sine', 'frequency': 10, 'distance': 50, 'max_samples': 50, 'dpi': 20}
+    return [
+        FigureJob('fir_kaiser', 'Demos', 'fir_demo', [], demo),
+        FigureJob('capture', 'Captures', 'capture', [str(capture)], plot),
+        FigureJob('absent', 'Captures', 'capture', [str(tmp_path / 'absent.csv')], plot),
+    ]
+
+
+def test_hash_follows_inputs_and_parameters(jobs):
+    demo, capture, absent = jobs
+    assert job_hash(absent) is None
+    assert job_hash(demo) == job_hash(demo._replace(name='renamed'))
+    assert job_hash(demo) != job_hash(demo._replace(params={**demo.params, 'seed': 1}))
+
+    before = job_hash(capture)
+    write_capture(capture.inputs[0], np.arange(50) + 1)
+    assert job_hash(capture) != before
+
+    with pytest.raises(ValueError, match='Unknown renderer'):
+        job_hash(demo._replace(renderer='pie'))
+
+
+def test_only_changed_figures_are_redrawn(tmp_path, jobs):
+    output = tmp_path / 'report'
+    counts = render_report(str(output), jobs, max_workers=1)
+    assert counts == {'rendered': 2, 'skipped': 0, 'missing': 1, 'failed': 0}
+    assert (output / 'fir_kaiser.png').exists() and (output / 'capture.png').exists()
+    index = (output / 'index.html').read_text()
+    assert 'fir_kaiser.png' in index and 'absent: missing' in index
+
+    assert render_report(str(output), jobs, max_workers=1)['skipped'] == 2
+
+    # A changed input invalidates its figure only; a deleted PNG is redrawn too
+    write_capture(jobs[1].inputs[0], np.arange(50) + 1)
+    os.remove(output / 'fir_kaiser.png')
+    counts = render_report(str(output), jobs, max_workers=1)
+    assert counts['rendered'] == 2 and counts['skipped'] == 0
+
+    assert render_report(str(output), jobs, max_workers=1, force=True)['rendered'] == 2
+
+
+def test_failed_figures_are_recorded_and_retried(tmp_path, jobs):
+    broken = jobs[0]._replace(name='broken', params={**jobs[0].params, 'method': 'unknown'})
+    output = tmp_path / 'report'
+    assert render_report(str(output), [broken], max_workers=1)['failed'] == 1
+    with open(output / 'manifest.json') as f:
+        entry = json.load(f)['broken']
+    assert entry['status'] == 'failed' and 'hash' not in entry
+    assert render_report(str(output), [broken], max_workers=1)['failed'] == 1
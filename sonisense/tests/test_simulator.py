@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from sonisense.alignment import estimate_lag
+from sonisense.calibration import CalibrationProfile, ChannelCalibrator
+from sonisense.geometry import SPEED_OF_SOUND, mic_pairs, triangle_positions
+from sonisense.simulator import generate_corpus, idle_noise, load_corpus, simulate_frames
+
+SAMPLE_RATE = 48000.0
+
+
+def line_frequencies(samples, sample_rate, threshold=1e-3):
+    """
+    Frequencies of the spectral lines of a (samples,) signal, relative to the strongest.
+    """
+    spectrum = np.abs(np.fft.rfft(samples * np.hanning(len(samples))))
+    freqs = np.fft.rfftfreq(len(samples), 1.0 / sample_rate)
+    peaks = (spectrum[1:-1] > spectrum[:-2]) & (spectrum[1:-1] > spectrum[2:])
+    peaks &= spectrum[1:-1] > threshold * spectrum.max()
+    return freqs[1:-1][peaks]
+
+
+def test_harmonics_past_nyquist_are_dropped_per_frame():
+    # 4800 samples hold a whole number of periods of every tone below
+    batch = simulate_frames([[1.0, 0.0], [0.0, 1.0]], SAMPLE_RATE, 4800, 'square', [3000.0, 10000.0],
+                            noise_std=0.0, quantize=False, phase=0.0)
+    np.testing.assert_allclose(line_frequencies(batch.samples[0, 0], SAMPLE_RATE), [3000, 9000, 15000, 21000])
+    # The 30 kHz harmonic would otherwise alias to 18 kHz
+    np.testing.assert_allclose(line_frequencies(batch.samples[1, 0], SAMPLE_RATE), [10000])
+
+
+@pytest.mark.parametrize('frequency', [SAMPLE_RATE / 2, 30000.0])
+def test_fundamental_at_or_above_nyquist_is_rejected(frequency):
+    with pytest.raises(ValueError, match='Nyquist'):
+        simulate_frames([[1.0, 0.0]], SAMPLE_RATE, 256, 'sine', frequency)
+
+
+def test_tdoa_labels_match_geometry_and_samples():
+    rng = np.random.default_rng(0)
+    sources = np.array([[0.4, 0.3], [-1.2, 0.5], [0.1, -2.0]])
+    batch = simulate_frames(sources, SAMPLE_RATE, 8192, 'noise', noise_std=0.0, quantize=False, rng=rng)
+
+    positions = triangle_positions()
+    pairs = mic_pairs(len(positions))
+    arrival = np.linalg.norm(sources[:, None, :] - positions[None], axis=-1) / SPEED_OF_SOUND
+    np.testing.assert_allclose(batch.labels['tdoas'], arrival[:, pairs[:, 0]] - arrival[:, pairs[:, 1]])
+    np.testing.assert_allclose(batch.labels['azimuth'], np.rad2deg(np.arctan2(sources[:, 1], sources[:, 0])) % 360)
+    np.testing.assert_allclose(batch.labels['distance'], np.linalg.norm(sources, axis=1))
+
+    for frame, tdoas in zip(batch.samples, batch.labels['tdoas']):
+        for (i, j), tdoa in zip(pairs, tdoas):
+            lag, _ = estimate_lag(frame[j], frame[i], decimation=1, max_lag=16)
+            assert lag == pytest.approx(tdoa * SAMPLE_RATE, abs=0.2)
+
+
+def test_spreading_and_adc_codes():
+    sources = np.array([[0.5, 0.0], [-2.0, 1.0]])
+    samples = simulate_frames(sources, SAMPLE_RATE, 4800, 'sine', 1000.0, amplitude=100.0, reference_distance=0.15,
+                              noise_std=0.0, quantize=False).samples
+    distances = np.linalg.norm(sources[:, None, :] - triangle_positions()[None], axis=-1)
+    np.testing.assert_allclose(np.std(samples, axis=-1) * np.sqrt(2), 100.0 * 0.15 / distances, rtol=1e-9)
+
+    codes = simulate_frames([[0.01, 0.0]], SAMPLE_RATE, 256, amplitude=1e5).samples
+    assert codes.dtype == np.uint16 and codes.min() == 0 and codes.max() == 4095
+
+
+def test_calibrated_noise_keeps_the_recorded_level():
+    rng = np.random.default_rng(0)
+    channels = {}
+    for name, std in (('mic1', 10.0), ('mic2', 20.0)):
+        calibrator = ChannelCalibrator(1000.0)
+        calibrator.update(2000.0 + rng.normal(0.0, std, 50000))
+        channels[name] = calibrator.result()
+    calibration = CalibrationProfile(channels, 1000.0)
+
+    noise = idle_noise(rng, (50, 2, 1000), 1000.0, calibration)
+    np.testing.assert_allclose(noise.std(axis=(0, 2)), [10.0, 20.0], rtol=0.05)
+
+
+def test_corpus_is_reproducible_whatever_the_workers(tmp_path):
+    first = generate_corpus(str(tmp_path / 'a'), 50, num_samples=64, batch_size=16, seed=3, max_workers=1)
+    generate_corpus(str(tmp_path / 'b'), 50, num_samples=64, batch_size=16, seed=3, max_workers=2)
+    assert len(first) == 4
+
+    batches_a, batches_b = list(load_corpus(str(tmp_path / 'a'))), list(load_corpus(str(tmp_path / 'b')))
+    assert [len(samples) for samples, _, _ in batches_a] == [16, 16, 16, 2]
+    for (samples_a, labels_a, rate), (samples_b, labels_b, _) in zip(batches_a, batches_b):
+        assert rate == SAMPLE_RATE
+        np.testing.assert_array_equal(samples_a, samples_b)
+        np.testing.assert_array_equal(labels_a['tdoas'], labels_b['tdoas'])
+    # Batches differ from each other, and another seed gives another corpus
+    assert not np.array_equal(batches_a[0][0], batches_a[1][0])
+    generate_corpus(str(tmp_path / 'c'), 16, num_samples=64, batch_size=16, seed=4, max_workers=1)
+    assert not np.array_equal(next(load_corpus(str(tmp_path / 'c')))[0], batches_a[0][0])
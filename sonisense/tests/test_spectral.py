@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from scipy.signal import stft, welch
+
+from sonisense.spectral import analyze_sweep, response_surface, stft_batch, welch_batch
+
+SAMPLE_RATE = 1067.5
+
+
+@pytest.fixture
+def frames():
+    return np.random.default_rng(0).standard_normal((2, 3, 4000)) + 2500.0
+
+
+@pytest.mark.parametrize('nperseg, noverlap, window', [(256, None, 'hann'), (255, 100, 'hamming'), (64, 0, 'hann')])
+def test_welch_matches_scipy(frames, nperseg, noverlap, window):
+    freqs, psd = welch_batch(frames, SAMPLE_RATE, nperseg, noverlap, window)
+    expected_freqs, expected = welch(frames, SAMPLE_RATE, window, nperseg, noverlap)
+    np.testing.assert_allclose(freqs, expected_freqs)
+    np.testing.assert_allclose(psd, expected, rtol=1e-9, atol=1e-12)
+
+
+@pytest.mark.parametrize('nperseg, noverlap', [(256, None), (100, 30)])
+def test_stft_matches_scipy(frames, nperseg, noverlap):
+    freqs, times, spectra = stft_batch(frames, SAMPLE_RATE, nperseg, noverlap)
+    expected_freqs, expected_times, expected = stft(frames, SAMPLE_RATE, nperseg=nperseg, noverlap=noverlap,
+                                                    boundary=None, padded=False, detrend=False)
+    np.testing.assert_allclose(freqs, expected_freqs)
+    np.testing.assert_allclose(times, expected_times)
+    np.testing.assert_allclose(spectra, expected, rtol=1e-9, atol=1e-9)
+
+
+def test_short_signals_are_rejected():
+    with pytest.raises(ValueError, match='shorter than one segment'):
+        welch_batch(np.zeros((2, 100)), SAMPLE_RATE)
+
+
+def test_sweep_tones_are_measured_at_their_alias():
+    rng = np.random.default_rng(1)
+    t = np.arange(8000) / SAMPLE_RATE
+    signals = {}
+    for wave, harmonic in (('sine', 0.0), ('square', 1 / 3)):
+        for frequency_khz in (0.2, 5):
+            for distance, level in ((15, 100.0), (100, 10.0)):
+                phase = 2 * np.pi * frequency_khz * 1000.0 * t
+                tone = level * (np.sin(phase) + harmonic * np.sin(3 * phase))
+                signals[(wave, frequency_khz, distance)] = 2500.0 + tone + rng.normal(0.0, 1.0, len(t))
+    table = analyze_sweep(signals, SAMPLE_RATE, nperseg=1024)
+
+    assert list(table['Aliased']) == [False, False, True, True] * 2
+    observed = np.abs(table['Frequency (kHz)'] * 1000.0 - SAMPLE_RATE * np.rint(table['Frequency (kHz)'] * 1000.0
+                                                                                / SAMPLE_RATE)) / 1000.0
+    np.testing.assert_allclose(table['Observed Frequency (kHz)'], observed)
+    np.testing.assert_allclose(table['Peak Frequency (kHz)'], observed, atol=2e-3)
+    np.testing.assert_allclose(table.loc[table['Wave'] == 'sine', 'THD'], 0.0, atol=0.05)
+    np.testing.assert_allclose(table.loc[(table['Wave'] == 'square') & (table['Frequency (kHz)'] == 0.2), 'THD'],
+                               1 / 3, atol=0.02)
+    assert np.all(table['SNR (dB)'] > 15.0)
+
+    axes, surface = response_surface(table)
+    assert [len(axis) for axis in axes] == [2, 2, 2]
+    np.testing.assert_allclose(np.nanmax(surface, axis=(0, 1)), 0.0)
+    np.testing.assert_allclose(surface[0] - surface[1], 20.0, atol=0.1)
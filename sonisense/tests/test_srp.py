@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from sonisense.srp import SrpSearch
+
+from .helpers import far_field_noise
+
+SAMPLE_RATE = 48000.0
+
+
+@pytest.mark.parametrize('grid, resolution, sample_rate', [
+    ('azimuth', 0.25, SAMPLE_RATE),
+    ('azimuth', 0.1, 16000.0),
+    ('position', 0.05, SAMPLE_RATE),
+    ('position', 0.05, 16000.0),
+])
+def test_coarse_to_fine_matches_exhaustive_search(grid, resolution, sample_rate):
+    rng = np.random.default_rng(0)
+    search = SrpSearch(sample_rate=sample_rate, grid=grid, resolution=resolution)
+    assert search.levels > 1
+    frames = np.stack([far_field_noise(azimuth, 1024, sample_rate, rng, noise=noise)
+                       for azimuth, noise in zip(rng.uniform(0, 360, 24), [0.05, 1.0] * 12)])
+
+    fast = search.search(frames)
+    search.beam = None
+    exhaustive = search.search(frames)
+    np.testing.assert_array_equal(fast.point, exhaustive.point)
+    np.testing.assert_allclose(fast.power, exhaustive.power)
+
+
+def test_azimuth_is_recovered():
+    rng = np.random.default_rng(1)
+    search = SrpSearch(sample_rate=SAMPLE_RATE)
+    truth = rng.uniform(0, 360, 16)
+    found = search.search(np.stack([far_field_noise(azimuth, 2048, SAMPLE_RATE, rng) for azimuth in truth]))
+    error = (found.azimuth - truth + 180.0) % 360.0 - 180.0
+    assert np.median(np.abs(error)) < 2.0
+
+
+def _count_scored_points(monkeypatch, search):
+    """
+    Counts the grid points whose power or bound a search evaluates, per frame.
+    """
+    scored = []
+    power, bound = SrpSearch._power, SrpSearch._bound
+
+    def counting_power(self, cc, max_shift, candidates=None):
+        scored.append(len(self.table[f'points{self.levels - 1}']) if candidates is None else candidates.shape[-1])
+        return power(self, cc, max_shift, candidates)
+
+    def counting_bound(self, sparse, max_shift, level, candidates=None):
+        scored.append(len(self.table[f'points{level}']) if candidates is None else candidates.shape[-1])
+        return bound(self, sparse, max_shift, level, candidates)
+
+    monkeypatch.setattr(SrpSearch, '_power', counting_power)
+    monkeypatch.setattr(SrpSearch, '_bound', counting_bound)
+    return scored
+
+
+def test_pyramid_scores_a_fraction_of_a_large_grid(monkeypatch):
+    rng = np.random.default_rng(2)
+    search = SrpSearch(sample_rate=SAMPLE_RATE, grid='position', resolution=0.02)
+    finest = len(search.table[f'points{search.levels - 1}'])
+    frame = far_field_noise(70.0, 1024, SAMPLE_RATE, rng)
+    exhaustive = SrpSearch(sample_rate=SAMPLE_RATE, grid='position', resolution=0.02, beam=None).search(frame)
+
+    scored = _count_scored_points(monkeypatch, search)
+    found = search.search(frame)
+    np.testing.assert_array_equal(found.point, exhaustive.point)
+    assert sum(scored) < finest / 4
+
+
+def test_single_frame_on_small_grid_is_scored_exhaustively(monkeypatch):
+    rng = np.random.default_rng(3)
+    search = SrpSearch(sample_rate=SAMPLE_RATE, grid='azimuth', resolution=0.1)
+    assert search.levels > 1
+    scored = _count_scored_points(monkeypatch, search)
+    search.search(far_field_noise(200.0, 1024, SAMPLE_RATE, rng))
+    assert scored == [len(search.table[f'points{search.levels - 1}'])]
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from scipy.signal import lfilter
+
+from sonisense.filter_design import design_filter
+from sonisense.streaming import StreamingFIR
+
+from .helpers import random_splits
+
+
+@pytest.mark.parametrize('method', ['direct', 'fft'])
+@pytest.mark.parametrize('num_taps', [21, 101])
+def test_block_split_matches_one_shot_lfilter(method, num_taps):
+    rng = np.random.default_rng(num_taps)
+    taps = design_filter('kaiser', num_taps=num_taps)
+    signal = rng.standard_normal((3, 5000))
+    expected = lfilter(taps, 1.0, signal, axis=-1)
+
+    fir = StreamingFIR(taps, method=method)
+    out = np.concatenate([fir.process(signal[:, a:b]) for a, b in random_splits(signal.shape[1], rng)], axis=1)
+    np.testing.assert_allclose(out, expected, atol=1e-12)
+
+
+@pytest.mark.parametrize('method', ['direct', 'fft'])
+def test_reset_to_held_value_has_no_step(method):
+    fir = StreamingFIR(design_filter('kaiser'), method=method)
+    fir.reset(np.array([2500.0, 2400.0]))
+    out = fir.process(np.array([[2500.0] * 200, [2400.0] * 200]))
+    np.testing.assert_allclose(out, [[2500.0] * 200, [2400.0] * 200], rtol=1e-9)
+
+
+def test_channel_count_change_is_rejected():
+    fir = StreamingFIR(design_filter('kaiser'))
+    fir.process(np.zeros((2, 10)))
+    with pytest.raises(ValueError, match="Expected 2 channels, got 3"):
+        fir.process(np.zeros((3, 10)))
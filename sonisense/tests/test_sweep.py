@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pytest
+
+from sonisense.sweep import SweepDataset, default_dataset, parse_capture_path
+
+
+def write_capture(path, values):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write('A,B\nlabel,Mic Value\n')
+        f.writelines(f'{i},{value}\n' for i, value in enumerate(values))
+
+
+@pytest.fixture
+def root(tmp_path):
+    # Inconsistent folder names, as in the original sweep
+    for folder, distance in (('15 cm', 15), ('100cm', 100)):
+        for wave in ('sine', 'square'):
+            for frequency in (1, 20):
+                write_capture(str(tmp_path / 'sweep' / folder / wave / f'{wave}_wave_{frequency}k.csv'),
+                              np.full(64, distance + frequency))
+    (tmp_path / 'sweep' / '15 cm' / 'notes.txt').write_text('not a capture')
+    return str(tmp_path / 'sweep')
+
+
+def test_parse_capture_path():
+    assert parse_capture_path(os.path.join('x', '100cm', 'sine', 'sine_wave_1.5kHz.csv')) == ('sine', 1.5, 100)
+    assert parse_capture_path(os.path.join('x', '15 cm', 'Square_Wave_20k.csv')) == ('square', 20, 15)
+    assert parse_capture_path(os.path.join('x', 'sine', 'sine_wave_1k.csv')) is None
+    assert parse_capture_path(os.path.join('x', '15 cm', 'readme.csv')) is None
+
+
+def test_discover_indexes_the_tree(root):
+    dataset = SweepDataset.discover(root)
+    assert len(dataset) == 8
+    assert dataset.waves == ['sine', 'square']
+    assert dataset.frequencies == [1, 20] and dataset.distances == [15, 100]
+    assert dataset.missing() == []
+    assert sorted(dataset.files('square')) == [(1, 15), (1, 100), (20, 15), (20, 100)]
+    assert default_dataset(root).files() == dataset.files()
+
+
+def test_duplicate_captures_are_rejected(root):
+    write_capture(os.path.join(root, '15 cm', 'extra', 'sine_wave_1k.csv'), np.zeros(4))
+    with pytest.raises(ValueError, match='Two captures'):
+        SweepDataset.discover(root)
+
+
+def test_manifest_round_trip(root, tmp_path):
+    dataset = SweepDataset.discover(root)
+    manifest = os.path.join(root, 'sweep.csv')
+    dataset.save_manifest(manifest)
+    loaded = SweepDataset.from_manifest(manifest)
+    assert {key: os.path.normpath(path) for key, path in loaded.files().items()} == {
+        key: os.path.normpath(path) for key, path in dataset.files().items()}
+
+
+def test_layout_lists_the_original_grid_without_the_disk(tmp_path):
+    dataset = SweepDataset.from_layout(str(tmp_path))
+    assert len(dataset) == 3 * 5 * 7
+    assert len(dataset.missing()) == len(dataset)
+    assert dataset.files('sine')[(10, 100)] == os.path.join(str(tmp_path), '100cm', 'sine', 'sine_wave_10k.csv')
+
+
+def test_signals_are_loaded_once_for_every_wave(root, monkeypatch):
+    dataset = SweepDataset.discover(root)
+    calls = []
+    from sonisense import sweep_loader
+    load_sweep = sweep_loader.load_sweep
+    monkeypatch.setattr(sweep_loader, 'load_sweep', lambda files, **params: calls.append(files) or load_sweep(
+        files, executor=None, cache=sweep_loader.SweepCache(None)))
+
+    square = dataset.signals('square')
+    sine = dataset.signals('sine')
+    assert len(calls) == 1 and len(calls[0]) == 8
+    np.testing.assert_array_equal(square[(20, 100)], np.full(64, 120.0))
+    assert sorted(sine) == sorted(dataset.files('sine'))
+    assert list(dataset.metrics('sine')['Variance']) == [0.0] * 4
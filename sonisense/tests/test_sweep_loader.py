@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pytest
+
+from sonisense.sweep_loader import SweepCache, load_microphone_data, load_sweep
+
+
+def write_capture(path, values):
+    # The sweep layout: mic values in column B with a label row under the header
+    with open(path, 'w') as f:
+        f.write('A,B\n')
+        f.write('label,Mic Value\n')
+        for i, value in enumerate(values):
+            f.write(f'{i},{value}\n')
+
+
+@pytest.fixture
+def sweep(tmp_path):
+    files = {}
+    for frequency in (1, 5):
+        for distance in (50, 100):
+            path = tmp_path / f'{frequency}khz_{distance}cm.csv'
+            write_capture(path, np.arange(100) + frequency * 1000 + distance)
+            files[(frequency, distance)] = str(path)
+    return files
+
+
+def test_lenient_parse_of_irregular_files(tmp_path):
+    path = tmp_path / 'irregular.csv'
+    with open(path, 'w') as f:
+        f.write('A,B\nlabel,Mic Value\n0,12\n1,13.5\n')
+    np.testing.assert_array_equal(load_microphone_data(path), [12.0, 13.5])
+
+
+@pytest.mark.parametrize('executor', [None, 'thread'])
+def test_loads_every_capture_in_key_order(sweep, tmp_path, executor):
+    signals = load_sweep(sweep, executor=executor, cache=SweepCache(str(tmp_path / 'cache')))
+    assert list(signals) == list(sweep)
+    np.testing.assert_array_equal(signals[(5, 100)], np.arange(100) + 5100)
+
+
+def test_cache_is_invalidated_by_mtime(sweep, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    load_sweep(sweep, executor=None, cache=SweepCache(cache_dir))
+    assert len(os.listdir(cache_dir)) == len(sweep)
+
+    # A fresh cache serves every file from disk without parsing
+    parsed = []
+    monkeypatch.setattr('sonisense.sweep_loader.load_microphone_data',
+                        lambda path: parsed.append(path) or load_microphone_data(path))
+    cache = SweepCache(cache_dir)
+    load_sweep(sweep, executor=None, cache=cache)
+    assert parsed == []
+
+    # Rewriting one capture with a new mtime re-parses that file only, and replaces its entry
+    path = sweep[(1, 50)]
+    write_capture(path, np.zeros(100))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    signals = load_sweep(sweep, executor=None, cache=cache)
+    assert parsed == [path]
+    np.testing.assert_array_equal(signals[(1, 50)], np.zeros(100))
+    assert len(os.listdir(cache_dir)) == len(sweep)
+
+
+def test_memory_only_cache(sweep):
+    cache = SweepCache(None)
+    first = load_sweep(sweep, executor=None, cache=cache)
+    assert all(cache.get(path) is first[key] for key, path in sweep.items())
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from scipy.signal import periodogram as scipy_periodogram
+
+from sonisense.sweep_stats import compute_sweep_metrics, sweep_tensor
+from sonisense.tones import alias_frequency, periodogram
+
+SAMPLE_RATE = 1067.5
+
+
+def tone(frequency_khz, length=20000, harmonic=0.2, seed=0):
+    t = np.arange(length) / SAMPLE_RATE
+    rng = np.random.default_rng(seed)
+    return (2500.0 + 100.0 * np.sin(2 * np.pi * frequency_khz * 1000.0 * t)
+            + 100.0 * harmonic * np.sin(2 * np.pi * 2 * frequency_khz * 1000.0 * t) + rng.normal(0.0, 3.0, length))
+
+
+def test_empty_sweep_gives_an_empty_table():
+    for sample_rate in (None, SAMPLE_RATE):
+        table = compute_sweep_metrics({}, sample_rate)
+        assert len(table) == 0
+        assert "THD" in table.columns
+
+
+@pytest.mark.parametrize('frequency_khz', [1, 5, 20])
+def test_tones_above_nyquist_are_folded(frequency_khz):
+    row = compute_sweep_metrics({(frequency_khz, 10): tone(frequency_khz)}, SAMPLE_RATE).iloc[0]
+    folded = abs(frequency_khz * 1000.0 - SAMPLE_RATE * np.rint(frequency_khz * 1000.0 / SAMPLE_RATE)) / 1000.0
+    assert row["Dominant Frequency (kHz)"] == pytest.approx(folded, abs=1e-3)
+    assert abs(row["Frequency Error (kHz)"]) < 1e-3
+    assert row["THD"] == pytest.approx(0.2, abs=0.01)
+
+
+def test_ragged_moments_and_grid():
+    signals = {(1, 15): np.array([1.0, 3.0]), (1, 30): np.array([2.0, 2.0, 2.0, 6.0]), (2, 15): np.array([4.0])}
+    table = compute_sweep_metrics(signals)
+    np.testing.assert_allclose(table["Mean"], [2.0, 3.0, 4.0])
+    np.testing.assert_allclose(table["Variance"], [1.0, 3.0, 0.0])
+    axes, grid = sweep_tensor(table, "Mean")
+    np.testing.assert_array_equal(axes[0], [15, 30])
+    np.testing.assert_array_equal(grid, [[2.0, 4.0], [3.0, np.nan]])
+
+
+@pytest.mark.parametrize('length', [1000, 1001])
+def test_periodogram_matches_scipy(length):
+    frames = np.random.default_rng(0).standard_normal((3, length)) + 5.0
+    freqs, psd = periodogram(frames, SAMPLE_RATE)
+    expected_freqs, expected = scipy_periodogram(frames, SAMPLE_RATE, 'hann')
+    np.testing.assert_allclose(freqs, expected_freqs)
+    np.testing.assert_allclose(psd, expected, rtol=1e-10, atol=1e-15)
+
+
+def test_alias_frequency():
+    np.testing.assert_allclose(alias_frequency([100.0, 600.0, 1067.5, 20000.0], SAMPLE_RATE),
+                               [100.0, 467.5, 0.0, abs(20000.0 - 19 * SAMPLE_RATE)])
@@ -0,0 +1,30 @@
+import numpy as np
+
+from sonisense.timebase import find_duplicate_stamps, fit_clock, resample_uniform
+
+from .helpers import backlog_stamps
+
+
+def test_duplicate_stamps():
+    np.testing.assert_array_equal(find_duplicate_stamps([0.0, 0.0, 1.0, 2.0, 2.0, 2.0]),
+                                  [False, True, False, False, True, True])
+
+
+def test_clock_fit_ignores_the_backlog():
+    stamps = backlog_stamps(20000)
+    clock = fit_clock(stamps)
+    assert abs(clock.sample_rate - 1000.0) < 0.1
+    assert not clock.inliers[:1500].any()
+    assert (stamps[-1] - stamps[0]) > 0 and 20000 / (stamps[-1] - stamps[0]) * 1000.0 > 1050.0
+
+
+def test_resampled_grid_stays_within_the_stamps():
+    signals, stamps = [], []
+    for seed in range(3):
+        stamps.append(backlog_stamps(20000 + 100 * seed, seed=seed))
+        signals.append(np.sin(np.arange(len(stamps[-1])) * 0.01))
+    grid, resampled = resample_uniform(signals, stamps)
+    assert grid[0] >= max(t[0] for t in stamps)
+    assert grid[-1] <= min(t[-1] for t in stamps)
+    assert resampled.shape == (3, len(grid))
+    np.testing.assert_allclose(np.diff(grid), np.diff(grid)[0])
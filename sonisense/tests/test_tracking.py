@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from sonisense.tracking import BearingTracker, wrap
+
+FRAME = 0.02  # Seconds between updates
+
+
+def run(tracker, frames, start=0.0):
+    """
+    Feeds one list of azimuths per frame and returns the tracks after the last.
+    """
+    tracks = []
+    for index, azimuths in enumerate(frames):
+        tracks = tracker.update(start + index * FRAME, azimuths)
+    return tracks
+
+
+def test_wrap():
+    np.testing.assert_allclose(wrap([350.0 - 10.0, 10.0 - 350.0, 180.0, -180.0]), [-20.0, 20.0, -180.0, -180.0])
+
+
+@pytest.mark.parametrize('model', ['kalman', 'particle'])
+def test_track_is_born_confirmed_and_dies(model):
+    tracker = BearingTracker(model, confirm_hits=3, max_age=0.5, rng=np.random.default_rng(0))
+
+    assert tracker.update(0.0, [40.0]) == []
+    assert tracker.tracks(confirmed_only=False)[0].hits == 1
+    assert tracker.update(FRAME, [40.5]) == []
+    tracks = tracker.update(2 * FRAME, [39.8])
+    assert len(tracks) == 1 and tracks[0].confirmed
+    assert tracks[0].azimuth == pytest.approx(40.0, abs=2.0)
+
+    # Frames without detections: the track coasts until max_age passes without a hit
+    assert len(tracker.update(2 * FRAME + 0.4, [])) == 1
+    assert tracker.update(2 * FRAME + 0.6, []) == []
+    assert len(tracker) == 0
+
+
+def test_low_confidence_measurements_start_nothing():
+    tracker = BearingTracker(birth_confidence=0.5)
+    tracker.update(0.0, [40.0, 200.0], confidences=[0.1, 0.9])
+    assert [round(track.azimuth) for track in tracker.tracks(confirmed_only=False)] == [200]
+
+
+@pytest.mark.parametrize('model', ['kalman', 'particle'])
+def test_track_follows_a_source_across_north(model):
+    rng = np.random.default_rng(1)
+    tracker = BearingTracker(model, rng=rng)
+    # 20 deg/s through 0/360 with 2 degrees of measurement noise
+    truth = (350.0 + 20.0 * FRAME * np.arange(100)) % 360.0
+    tracks = run(tracker, [[azimuth] for azimuth in (truth + rng.normal(0.0, 2.0, len(truth))) % 360.0])
+
+    assert len(tracks) == 1 and tracks[0].id == 0
+    assert abs(wrap(tracks[0].azimuth - truth[-1])) < 3.0
+    assert tracks[0].rate == pytest.approx(20.0, abs=8.0)
+
+
+def test_converged_tracks_merge_into_the_older_one():
+    tracker = BearingTracker(merge_distance=2.0)
+    tracker.update(0.0, [100.0, 130.0])
+    assert len(tracker) == 2
+    # Both tracks are pulled onto one source until they fall within merge_distance
+    tracks = run(tracker, [[115.0, 115.5]] * 10, start=FRAME)
+    assert [track.id for track in tracks] == [0]
+
+
+def test_births_stop_at_max_tracks():
+    tracker = BearingTracker(max_tracks=2)
+    tracker.update(0.0, [0.0, 90.0, 180.0, 270.0])
+    assert len(tracker) == 2
+    tracker.update(FRAME, [0.0, 90.0, 180.0, 270.0])
+    assert sorted(round(track.azimuth) for track in tracker.tracks(confirmed_only=False)) == [0, 90]
+
+    # A slot freed by a dead track is taken by the next new source
+    tracker.update(1.5, [0.0])
+    tracker.update(1.5 + FRAME, [0.0, 180.0])
+    track, new = tracker.tracks(confirmed_only=False)
+    assert track.id == 0
+    assert new.id == 2 and new.azimuth == pytest.approx(180.0)
+
+
+def test_unknown_model_is_rejected():
+    with pytest.raises(ValueError, match='Unknown tracking model'):
+        BearingTracker('ukf')
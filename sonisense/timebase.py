@@ -0,0 +1,263 @@
+"""
+Timestamp repair and uniform resampling for the mic captures.
+
+The capture CSVs are stamped with the host's receive time: a startup
+backlog of a few thousand rows arrives in bursts of ~16 rows sharing one
+stamp, and the steady state has ~1 ms steps with jitter. `fit_clock`
+replaces these stamps with a robust clock model (a single line, or a
+continuous piecewise-linear fit to follow drift) and `resample_uniform`
+interpolates every mic onto one common uniform grid with a polyphase
+windowed-sinc interpolator, so downstream TDOA and spectral stages can
+assume a fixed sample rate.
+"""
+
+import functools
+
+import numpy as np
+from scipy.linalg import solve_banded
+
+DEFAULT_HALF_WIDTH = 16
+DEFAULT_PHASES = 256
+DEFAULT_KAISER_BETA = 8.0
+_MAD_SCALE = 1.4826  # MAD to standard deviation for Gaussian noise
+
+
+def find_duplicate_stamps(timestamps):
+    """
+    Returns a boolean mask marking samples that repeat the previous sample's stamp.
+    """
+    timestamps = np.asarray(timestamps)
+    duplicates = np.zeros(len(timestamps), dtype=bool)
+    duplicates[1:] = timestamps[1:] == timestamps[:-1]
+    return duplicates
+
+
+def _second_difference_penalty(num_knots):
+    """
+    Banded (2, 2) storage of D^T D for the second-difference operator D.
+    """
+    ab = np.zeros((5, num_knots))
+    if num_knots < 3:
+        return ab
+    coefficients = np.array([1.0, -2.0, 1.0])
+    rows = np.arange(num_knots - 2)
+    for a in range(3):
+        for b in range(3):
+            # Entry (rows + a, rows + b) lives at ab[2 + (rows + a) - (rows + b), rows + b]
+            np.add.at(ab, (2 + a - b, rows + b), coefficients[a] * coefficients[b])
+    return ab
+
+
+class ClockModel:
+    """
+    Continuous piecewise-linear map from sample index to time (ms).
+
+    Parameters:
+    - knots: Increasing sample indices of the segment boundaries.
+    - knot_times: Model time at each knot, in ms.
+    - inliers: Mask of samples that were used in the final fit.
+    """
+
+    def __init__(self, knots, knot_times, inliers=None):
+        self.knots = np.asarray(knots, dtype=float)
+        self.knot_times = np.asarray(knot_times, dtype=float)
+        self.inliers = inliers
+
+    def times(self, indices=None):
+        """
+        Model time in ms of the given sample indices (all samples by default).
+        """
+        if indices is None:
+            indices = np.arange(self.knots[-1] + 1)
+        indices = np.asarray(indices, dtype=float)
+        # Extrapolate the end segments linearly rather than clamping
+        slopes = np.diff(self.knot_times) / np.diff(self.knots)
+        out = np.interp(indices, self.knots, self.knot_times)
+        out = np.where(indices < self.knots[0], self.knot_times[0] + (indices - self.knots[0]) * slopes[0], out)
+        return np.where(indices > self.knots[-1], self.knot_times[-1] + (indices - self.knots[-1]) * slopes[-1], out)
+
+    def indices_at(self, times):
+        """
+        Fractional sample index at the given times in ms (the inverse model).
+        """
+        times = np.asarray(times, dtype=float)
+        slopes = np.diff(self.knot_times) / np.diff(self.knots)
+        out = np.interp(times, self.knot_times, self.knots)
+        out = np.where(times < self.knot_times[0], self.knots[0] + (times - self.knot_times[0]) / slopes[0], out)
+        return np.where(times > self.knot_times[-1], self.knots[-1] + (times - self.knot_times[-1]) / slopes[-1], out)
+
+    @property
+    def sample_rate(self):
+        """
+        Mean sample rate in Hz over the modelled span.
+        """
+        return 1000.0 * (self.knots[-1] - self.knots[0]) / (self.knot_times[-1] - self.knot_times[0])
+
+    def local_sample_rates(self):
+        """
+        Sample rate in Hz of every segment, to inspect clock drift.
+        """
+        return 1000.0 * np.diff(self.knots) / np.diff(self.knot_times)
+
+
+def fit_clock(timestamps, knot_spacing=None, max_iterations=6, threshold=4.0, smoothing=1e-6):
+    """
+    Fits a clock model to jittery, partly duplicated timestamps.
+
+    Each iteration solves a weighted least-squares linear spline (a banded
+    system, so the cost is linear in the number of samples) and then drops
+    samples whose residual exceeds `threshold` robust standard deviations,
+    which removes the burst-stamped startup backlog and isolated late stamps.
+
+    Parameters:
+    - timestamps: Capture timestamps in ms, one per sample.
+    - knot_spacing: Samples per linear segment to follow drift, or None for
+      a single line over the whole recording.
+    - max_iterations: Upper bound on reweighting passes.
+    - threshold: Outlier cut-off in robust standard deviations.
+    - smoothing: Relative weight of the curvature penalty that keeps
+      segments without inliers well defined.
+    """
+    timestamps = np.asarray(timestamps, dtype=float)
+    n = len(timestamps)
+    if n < 2:
+        raise ValueError("Need at least two timestamps to fit a clock")
+
+    if knot_spacing is None or knot_spacing >= n - 1:
+        knots = np.array([0, n - 1])
+    else:
+        knots = np.unique(np.append(np.arange(0, n - 1, knot_spacing), n - 1))
+    num_knots = len(knots)
+
+    index = np.arange(n)
+    segment = np.clip(np.searchsorted(knots, index, side='right') - 1, 0, num_knots - 2)
+    u = (index - knots[segment]) / (knots[segment + 1] - knots[segment])
+    left, right = 1.0 - u, u
+
+    penalty = _second_difference_penalty(num_knots)
+    if num_knots > 2:
+        # A flexible spline can bend to follow the startup backlog, so pick the
+        # inliers against a single global line first
+        weights = fit_clock(timestamps, None, max_iterations, threshold).inliers.astype(float)
+    else:
+        # A row repeating the previous stamp arrived in a burst and carries the burst's receive time,
+        # so the first pass starts without them
+        weights = (~find_duplicate_stamps(timestamps)).astype(float)
+        if weights.sum() < 2:
+            weights = np.ones(n)
+    for _ in range(max_iterations):
+        # Normal equations of the hat-function basis are tridiagonal
+        ab = np.zeros((5, num_knots))
+        ab[2, :-1] += np.bincount(segment, weights * left ** 2, num_knots - 1)
+        ab[2, 1:] += np.bincount(segment, weights * right ** 2, num_knots - 1)
+        cross = np.bincount(segment, weights * left * right, num_knots - 1)
+        ab[1, 1:] += cross
+        ab[3, :-1] += cross
+        rhs = np.zeros(num_knots)
+        rhs[:-1] += np.bincount(segment, weights * left * timestamps, num_knots - 1)
+        rhs[1:] += np.bincount(segment, weights * right * timestamps, num_knots - 1)
+        ab += smoothing * max(ab[2].mean(), 1.0) * penalty
+
+        knot_times = solve_banded((2, 2), ab, rhs)
+        residuals = timestamps - (knot_times[segment] * left + knot_times[segment + 1] * right)
+
+        inlier_residuals = residuals[weights > 0]
+        mad = np.median(np.abs(inlier_residuals - np.median(inlier_residuals)))
+        scale = max(_MAD_SCALE * mad, 1e-9)
+        new_weights = (np.abs(residuals - np.median(inlier_residuals)) <= threshold * scale).astype(float)
+        if np.array_equal(new_weights, weights):
+            break
+        weights = new_weights
+
+    return ClockModel(knots, knot_times, weights > 0)
+
+
+def repair_timestamps(timestamps, knot_spacing=None):
+    """
+    Returns reconstructed, strictly increasing timestamps (ms) for a capture.
+    """
+    return fit_clock(timestamps, knot_spacing).times(np.arange(len(timestamps)))
+
+
+@functools.lru_cache(maxsize=16)
+def _sinc_table(half_width, phases, cutoff, beta):
+    """
+    Polyphase table of Kaiser-windowed sinc taps, one row per fractional offset.
+
+    Row p holds the 2 * half_width taps for a fractional position p / phases
+    between two input samples; `cutoff` (<= 1) lowers the bandwidth when the
+    output rate is below the input rate.
+    """
+    fractions = np.arange(phases + 1) / phases
+    offsets = np.arange(-half_width + 1, half_width + 1)
+    x = offsets[None, :] - fractions[:, None]
+    window = np.kaiser(2 * half_width + 1, beta)
+    # Sample the continuous window at the (fractional) tap positions
+    window = np.interp(x, np.arange(-half_width, half_width + 1), window)
+    table = cutoff * np.sinc(cutoff * x) * window
+    table /= table.sum(axis=1, keepdims=True)  # Unity DC gain at every phase
+    table.setflags(write=False)
+    return table
+
+
+def interpolate_at(signal, positions, half_width=DEFAULT_HALF_WIDTH, phases=DEFAULT_PHASES, cutoff=1.0,
+                   beta=DEFAULT_KAISER_BETA, chunk_size=1 << 16):
+    """
+    Evaluates a band-limited signal at fractional sample positions.
+
+    Parameters:
+    - signal: 1-D input samples.
+    - positions: Fractional sample indices to evaluate at.
+    - half_width: Taps on each side of the position.
+    - phases: Resolution of the fractional offset in the polyphase table.
+    - cutoff: Bandwidth as a fraction of the input Nyquist.
+    - chunk_size: Output samples computed per vectorized gather.
+    """
+    signal = np.asarray(signal, dtype=float)
+    positions = np.asarray(positions, dtype=float)
+    table = _sinc_table(half_width, phases, float(cutoff), float(beta))
+    offsets = np.arange(-half_width + 1, half_width + 1)
+
+    out = np.empty(len(positions))
+    for start in range(0, len(positions), chunk_size):
+        pos = positions[start:start + chunk_size]
+        base = np.floor(pos).astype(np.int64)
+        phase = np.rint((pos - base) * phases).astype(np.int64)
+        # Edge samples are held, which is adequate away from the first/last half_width samples
+        indices = np.clip(base[:, None] + offsets, 0, len(signal) - 1)
+        out[start:start + chunk_size] = np.einsum('ij,ij->i', signal[indices], table[phase])
+    return out
+
+
+def resample_uniform(signals, timestamps, sample_rate=None, knot_spacing=None, half_width=DEFAULT_HALF_WIDTH):
+    """
+    Resamples several channels onto one common uniform time grid.
+
+    Parameters:
+    - signals: List of 1-D channel arrays (lengths may differ).
+    - timestamps: Matching list of raw timestamp arrays in ms.
+    - sample_rate: Output rate in Hz; defaults to the mean fitted rate.
+    - knot_spacing: Passed to `fit_clock` to follow drift.
+    - half_width: Interpolator taps on each side.
+
+    Returns (grid_times, resampled) where grid_times is in ms and resampled
+    has shape (channels, samples), covering only the span all channels share.
+    The grid stays within the observed stamps; the model extrapolates the
+    startup backlog to before the first stamp, where no channel was observed.
+    """
+    clocks = [fit_clock(t, knot_spacing) for t in timestamps]
+    rates = np.array([clock.sample_rate for clock in clocks])
+    if sample_rate is None:
+        sample_rate = float(rates.mean())
+
+    start = max(max(clock.times(0), t[0]) for clock, t in zip(clocks, timestamps))
+    stop = min(min(clock.times(len(signal) - 1), t[-1]) for clock, signal, t in zip(clocks, signals, timestamps))
+    if stop <= start:
+        raise ValueError("Channels do not overlap in time")
+    grid = start + np.arange(int(np.floor((stop - start) * sample_rate / 1000.0)) + 1) * 1000.0 / sample_rate
+
+    resampled = np.empty((len(signals), len(grid)))
+    for i, (signal, clock) in enumerate(zip(signals, clocks)):
+        cutoff = min(1.0, sample_rate / rates[i])
+        resampled[i] = interpolate_at(signal, clock.indices_at(grid), half_width, cutoff=cutoff)
+    return grid, resampled
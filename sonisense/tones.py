@@ -0,0 +1,130 @@
+"""
+Tone measurements on batched spectra of the sweep captures.
+
+The sweep tones (1-20 kHz) sit far above the ~1 kHz ADC rate, so each
+capture holds an alias of its tone rather than the tone itself.
+`alias_frequency` says where sampling folds a frequency, and
+`spectral_features` measures every capture's peak, tone, harmonics, SNR
+and THD there, from one (files, bins) array of PSDs. The PSDs come from
+`periodogram` here or from the Welch estimator in `spectral`.
+"""
+
+import numpy as np
+from scipy.fft import rfft, rfftfreq
+
+NUM_HARMONICS = 5
+PEAK_HALF_WIDTH = 2  # Bins on each side of a tone counted as its power
+MAX_STACK_LENGTH = 1 << 18
+
+
+def stack_signals(signals, length=None):
+    """
+    Stacks 1-D signals into a (files, samples) float array.
+
+    Parameters:
+    - signals: List of arrays, or a dictionary (the keys are dropped).
+    - length: Samples kept per signal; defaults to the shortest signal,
+      capped at MAX_STACK_LENGTH.
+    """
+    values = list(signals.values()) if isinstance(signals, dict) else list(signals)
+    if length is None:
+        length = min(min(len(value) for value in values), MAX_STACK_LENGTH)
+    return np.stack([np.asarray(value[:length], dtype=float) for value in values])
+
+
+def periodogram(frames, sample_rate):
+    """
+    Hann-windowed one-sided PSD of every row of `frames`, with the mean removed.
+
+    Equal to `scipy.signal.periodogram(frames, sample_rate, 'hann')`.
+    Returns (freqs, psd) with psd of shape (..., samples // 2 + 1).
+    """
+    frames = np.asarray(frames, dtype=float)
+    n = frames.shape[-1]
+    window = np.hanning(n + 1)[:-1]  # Periodic, as scipy's get_window
+    power = np.abs(rfft((frames - frames.mean(axis=-1, keepdims=True)) * window, axis=-1)) ** 2
+    psd = power / (sample_rate * np.sum(window ** 2))
+    psd[..., 1:(n + 1) // 2] *= 2  # One-sided; the Nyquist bin only exists once for even n
+    return rfftfreq(n, 1.0 / sample_rate), psd
+
+
+def alias_frequency(frequency, sample_rate):
+    """
+    Frequency at which a tone appears after sampling at `sample_rate`.
+    """
+    frequency = np.abs(np.asarray(frequency, dtype=float))
+    folded = np.mod(frequency, sample_rate)
+    return np.minimum(folded, sample_rate - folded)
+
+
+def _band_power(psd, bin_width, centres, half_width):
+    """
+    Integrated power in +-half_width bins around each centre bin, shape (files, tones).
+    """
+    offsets = np.arange(-half_width, half_width + 1)
+    bins = np.clip(centres[..., None] + offsets, 0, psd.shape[-1] - 1)
+    values = np.take_along_axis(psd[:, None, :], bins.reshape(len(psd), 1, -1), axis=2).reshape(bins.shape)
+    return values.sum(axis=-1) * bin_width
+
+
+def spectral_features(freqs, psd, sample_rate, expected=None, num_harmonics=NUM_HARMONICS,
+                      half_width=PEAK_HALF_WIDTH):
+    """
+    Per-row spectral features from a batch of PSDs.
+
+    Parameters:
+    - freqs, psd: Output of `periodogram` or `spectral.welch_batch`, psd of
+      shape (files, bins).
+    - sample_rate: Sample rate in Hz, used to fold tones above Nyquist.
+    - expected: Tone frequency in Hz per file (NaN where unknown); the
+      strongest peak is used in its place when not given.
+    - num_harmonics: Harmonics measured, including the fundamental.
+    - half_width: Bins on each side of a tone counted as its power.
+
+    Returns a dictionary of arrays, one value per file. Tones and harmonics
+    that fold onto DC or onto a lower harmonic cannot be measured and are NaN.
+    """
+    psd = np.atleast_2d(psd)
+    bin_width = freqs[1] - freqs[0]
+
+    # Strongest bin above the window's DC leakage, refined on a log-parabola
+    lowest = half_width + 1
+    peak = np.argmax(psd[:, lowest:], axis=1) + lowest
+    inner = np.clip(peak, 1, psd.shape[1] - 2)
+    log_psd = np.log(np.maximum(psd, 1e-300))
+    rows = np.arange(len(psd))
+    y0, y1, y2 = log_psd[rows, inner - 1], log_psd[rows, inner], log_psd[rows, inner + 1]
+    denom = y0 - 2 * y1 + y2
+    delta = np.where((peak == inner) & (denom < 0), 0.5 * (y0 - y2) / np.where(denom < 0, denom, -1.0), 0.0)
+    peak_frequency = (peak + delta) * bin_width
+
+    if expected is None:
+        expected = np.full(len(psd), np.nan)
+    expected = np.broadcast_to(np.asarray(expected, dtype=float), (len(psd),))
+    fundamental = np.where(np.isnan(expected), peak_frequency, expected)
+
+    # Harmonics land wherever sampling folds them
+    harmonics = alias_frequency(fundamental[:, None] * np.arange(1, num_harmonics + 1), sample_rate)
+    centres = np.rint(harmonics / bin_width).astype(int)
+    harmonic_power = _band_power(psd, bin_width, centres, half_width)
+    # A tone folded onto DC cannot be told from the offset, and a harmonic
+    # folded onto a lower one is already counted there
+    hidden = centres < lowest
+    for h in range(1, num_harmonics):
+        hidden[:, h] |= np.any(np.abs(centres[:, :h] - centres[:, h:h + 1]) <= 2 * half_width, axis=1)
+    harmonic_power[hidden] = np.nan
+
+    total_power = psd[:, lowest:].sum(axis=1) * bin_width
+    signal_power = harmonic_power[:, 0]
+    noise_power = np.maximum(total_power - np.nansum(harmonic_power, axis=1), 1e-300)
+
+    return {
+        'peak_frequency': peak_frequency,
+        'observed_frequency': harmonics[:, 0],
+        'aliased': np.abs(fundamental) > sample_rate / 2,
+        'signal_power': signal_power,
+        'harmonic_power': harmonic_power,
+        'snr_db': 10 * np.log10(np.maximum(signal_power, 1e-300) / noise_power),
+        'thd': np.sqrt(np.nansum(harmonic_power[:, 1:], axis=1) / np.maximum(signal_power, 1e-300)),
+        'noise_floor': np.median(psd[:, lowest:], axis=1),
+    }